@@ -0,0 +1,21 @@
+""" All products of two operator sets, pairwise in python vs batched integer arrays """
+
+import time
+
+from msg import spacegroups
+from msg.grouptheory.closures import closure
+from msg.operations import integer_operation_arrays, compose_integer_arrays, integer_operation_keys
+
+operations = closure(spacegroups.by_number(1651).bns.operators)
+print(f"{len(operations)} x {len(operations)} products")
+
+start = time.perf_counter()
+pairwise = [[a.and_then(b).key for b in operations] for a in operations]
+print(f"Pairwise and_then:       {time.perf_counter() - start:.3f} s")
+
+start = time.perf_counter()
+arrays = integer_operation_arrays(operations)
+batched = integer_operation_keys(*compose_integer_arrays(arrays, arrays))
+print(f"compose_integer_arrays:  {time.perf_counter() - start:.3f} s")
+
+assert batched.tolist() == pairwise
@@ -0,0 +1,27 @@
+""" Hash based closure vs the original sort and deduplicate closure, for all 1651 groups """
+
+import time
+
+from msg import spacegroups
+from msg.grouptheory.closures import closure, closure_by_sorting
+
+hash_time = 0.0
+sort_time = 0.0
+
+for group in spacegroups:
+    generators = group.bns.operators
+
+    start = time.perf_counter()
+    by_hash = closure(generators)
+    hash_time += time.perf_counter() - start
+
+    start = time.perf_counter()
+    by_sorting = closure_by_sorting(generators)
+    sort_time += time.perf_counter() - start
+
+    if by_hash != by_sorting:
+        print(group.number, "closures differ")
+
+print(f"Hash based closure:    {hash_time:.2f} s")
+print(f"Sort based closure:    {sort_time:.2f} s")
+print(f"Speedup: {sort_time / hash_time:.1f}x")
@@ -0,0 +1,47 @@
+""" Coset decomposition of Fm-3m1' (225.117, 384 operations in the unit cell) by Fm-3m (225.116),
+nested loops over MagneticOperation vs the multiplication table functions in msg.grouptheory.cosets
+"""
+
+import time
+from fractions import Fraction
+
+from msg import spacegroups
+from msg.grouptheory.cosets import operator_indices, left_cosets, double_cosets, conjugacy_classes, normalizer
+from msg.grouptheory.multiplication_tables import build_multiplication_table
+
+unit_cell = [(Fraction(1), Fraction(0), Fraction(0)),
+             (Fraction(0), Fraction(1), Fraction(0)),
+             (Fraction(0), Fraction(0), Fraction(1))]
+
+group = spacegroups.by_number(1619).bns.cell_operators
+subgroup = spacegroups.by_number(1618).bns.cell_operators
+
+start = time.perf_counter()
+cosets = []
+for operation in group:
+    if not any(operation in coset for coset in cosets):
+        cosets.append([h.and_then(operation) for h in subgroup])
+loop_time = time.perf_counter() - start
+
+start = time.perf_counter()
+table = build_multiplication_table(group, unit_cell)
+table_time = time.perf_counter() - start
+
+start = time.perf_counter()
+indices = operator_indices(group, unit_cell, subgroup)
+table_cosets = left_cosets(table, indices)
+cosets_time = time.perf_counter() - start
+
+assert len(table_cosets) == len(cosets)
+
+start = time.perf_counter()
+double_cosets(table, indices, indices)
+classes = conjugacy_classes(table)
+normalizer(table, indices)
+other_time = time.perf_counter() - start
+
+print(f"{len(group)} operations, {len(cosets)} cosets, {len(classes)} conjugacy classes")
+print(f"Nested loops, cosets:                    {loop_time * 1000:.1f} ms")
+print(f"Building the multiplication table:       {table_time * 1000:.1f} ms")
+print(f"Table, cosets (including indices):       {cosets_time * 1000:.1f} ms")
+print(f"Table, double cosets, classes, normalizer: {other_time * 1000:.1f} ms")
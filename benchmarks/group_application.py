@@ -0,0 +1,28 @@
+""" Applying a whole group to an array of points, operator by operator vs all at once """
+
+import time
+
+import numpy as np
+
+from msg import spacegroups
+
+group = spacegroups.by_number(1651).bns
+points = np.random.default_rng(1234).random((1000, 6))
+
+start = time.perf_counter()
+for i in range(100):
+    looped = np.array([op(points) for op in group.cell_operators])
+loop_time = (time.perf_counter() - start) / 100
+
+group.apply(points) # Fill the cache
+
+start = time.perf_counter()
+for i in range(100):
+    batched = group.apply(points)
+batch_time = (time.perf_counter() - start) / 100
+
+assert np.all(np.abs(looped - batched) < 1e-10)
+
+print(f"{len(group.cell_operators)} operations, {points.shape[0]} points")
+print(f"Operator loop: {1000*loop_time:.2f} ms")
+print(f"Group.apply:   {1000*batch_time:.2f} ms")
@@ -0,0 +1,41 @@
+""" All the operations in the unit cell of every group, by closure vs by combining the
+representatives with the centering translations directly (BNSGroup.cell_operators)
+"""
+
+import time
+
+from msg import spacegroups
+from msg.grouptheory.closures import closure, closure_by_lattice, lattice_expansion_arrays
+from msg.grouptheory.multiplication_tables import centering_translations
+from msg.operations import MagneticOperation
+
+closure_time = 0.0
+lattice_time = 0.0
+arrays_time = 0.0
+
+for group in spacegroups:
+    bns = group.bns
+
+    centerings = [MagneticOperation(point_operation=((1, 0, 0), (0, 1, 0), (0, 0, 1)),
+                                    translation=centering,
+                                    time_reversal=1)
+                  for centering in centering_translations(bns.lattice_vectors)]
+
+    start = time.perf_counter()
+    by_closure = closure(bns.operators + centerings)
+    closure_time += time.perf_counter() - start
+
+    start = time.perf_counter()
+    by_lattice = closure_by_lattice(bns.operators, bns.lattice_vectors)
+    lattice_time += time.perf_counter() - start
+
+    start = time.perf_counter()
+    lattice_expansion_arrays(bns.operators, bns.lattice_vectors)
+    arrays_time += time.perf_counter() - start
+
+    if by_closure != by_lattice:
+        print(group.number, "differ")
+
+print(f"closure:                  {closure_time:.2f} s")
+print(f"closure_by_lattice:       {lattice_time:.2f} s")
+print(f"lattice_expansion_arrays: {arrays_time:.2f} s")
@@ -0,0 +1,48 @@
+""" Cold import time and first access latency for the lazily loaded database """
+
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# Cold import, in a fresh interpreter each time so nothing is cached
+
+import_times = []
+for i in range(5):
+    output = subprocess.run(
+        [sys.executable, "-c",
+         "import time; t = time.perf_counter(); import msg; print(time.perf_counter() - t)"],
+        capture_output=True, text=True, check=True)
+
+    import_times.append(float(output.stdout))
+
+print(f"Cold import of msg: {1000*np.median(import_times):.2f} ms (median of {len(import_times)})")
+
+from msg import spacegroups
+
+# The first lookup also has to read the json
+
+start = time.perf_counter()
+spacegroups.by_number(1)
+print(f"First lookup (reads json): {1000*(time.perf_counter() - start):.2f} ms")
+
+# Per group, first and second access
+
+first_access = []
+second_access = []
+for index in range(len(spacegroups)):
+    start = time.perf_counter()
+    spacegroups[index]
+    first_access.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    spacegroups[index]
+    second_access.append(time.perf_counter() - start)
+
+first_access = 1e6*np.array(first_access)
+second_access = 1e6*np.array(second_access)
+
+print(f"First access per group:  median {np.median(first_access):.1f} us, max {np.max(first_access):.1f} us")
+print(f"Second access per group: median {np.median(second_access):.2f} us")
+print(f"Validating all {len(spacegroups)} groups: {np.sum(first_access)/1e3:.1f} ms")
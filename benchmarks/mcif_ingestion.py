@@ -0,0 +1,24 @@
+""" Reading the magnetic symmetry of a directory of mCIF files, one process vs a process pool """
+
+import os
+import tempfile
+import time
+
+from msg import spacegroups
+from msg.datamodel.mcif import read_mcif_directory
+
+n_files = 2000
+
+with tempfile.TemporaryDirectory() as directory:
+    for i in range(n_files):
+        group = spacegroups[i % len(spacegroups)]
+        operations = "\n".join(f"{j + 1} '{operation.text_form}'" for j, operation in enumerate(group.bns.operators))
+
+        with open(os.path.join(directory, f"{i:05d}.mcif"), "w") as file:
+            file.write(f"data_{i}\nloop_\n_space_group_symop_magn_operation.id\n"
+                       f"_space_group_symop_magn_operation.xyz\n{operations}\n")
+
+    for jobs in (1, os.cpu_count() or 1):
+        start = time.perf_counter()
+        symmetries = read_mcif_directory(directory, jobs=jobs)
+        print(f"{len(symmetries)} files, {jobs} processes: {time.perf_counter() - start:.3f} s")
@@ -0,0 +1,22 @@
+""" Closure in the OG setting vs the BNS setting, for all 1651 groups """
+
+import time
+
+from msg import spacegroups
+from msg.grouptheory.closures import closure, og_closure
+
+bns_time = 0.0
+og_time = 0.0
+
+for group in spacegroups:
+    start = time.perf_counter()
+    closure(group.bns.operators)
+    bns_time += time.perf_counter() - start
+
+    start = time.perf_counter()
+    og_closure(group.og.operators, group.og.lattice_vectors)
+    og_time += time.perf_counter() - start
+
+print(f"BNS closure:    {bns_time:.2f} s")
+print(f"OG closure:     {og_time:.2f} s")
+print(f"Ratio: {og_time / bns_time:.2f}")
@@ -0,0 +1,37 @@
+""" Merging symmetry equivalent copies of atoms, pairwise comparison vs the grid hash in msg.orbits """
+
+import time
+
+import numpy as np
+
+from msg import spacegroups
+from msg.orbits import merge_periodic_points
+
+group = spacegroups.by_number(1651).bns
+atoms = np.random.default_rng(19).random((200, 6))
+
+start = time.perf_counter()
+result = group.orbit(atoms)
+hash_time = time.perf_counter() - start
+
+# Pairwise, comparing each copy with the unique positions found so far
+copies = group.apply(atoms).reshape(-1, 6)[:, :3]
+
+start = time.perf_counter()
+unique = np.zeros((0, 3))
+for copy in copies:
+    differences = unique - copy
+    if not np.any(np.all(np.abs(differences - np.rint(differences)) < 1e-4, axis=1)):
+        unique = np.concatenate((unique, copy.reshape(1, 3)))
+pairwise_time = time.perf_counter() - start
+
+start = time.perf_counter()
+labels = merge_periodic_points(copies)
+merge_time = time.perf_counter() - start
+
+assert labels.max() + 1 == unique.shape[0]
+
+print(f"{len(group.operators)} operators, {atoms.shape[0]} atoms, {copies.shape[0]} copies, {unique.shape[0]} unique")
+print(f"Pairwise merge:        {pairwise_time:.3f} s")
+print(f"merge_periodic_points: {merge_time:.3f} s")
+print(f"Full orbit:            {hash_time:.3f} s")
@@ -0,0 +1,44 @@
+""" Parsing operator strings, substituting values and evaluating with ast (the old way) vs
+the single pass linear form parser in msg.datamodel.parse_operator
+"""
+
+import re
+import time
+from fractions import Fraction
+
+from msg import spacegroups
+from msg.datamodel.parse_operator import parse_many, parse_linear_form, _parse_space_group_operator
+from msg.datamodel.safe_expression_evaluation import evaluate_algebra
+
+strings = [operation.text_form for group in spacegroups for operation in group.bns.operators]
+components = [component.strip() for string in strings for component in string.split(",")[:3]]
+
+
+def evaluate_with_substitution(component: str, values: dict[str, str]) -> float:
+    return evaluate_algebra(re.sub("[xyz]", lambda match: values[match.group()], component))
+
+
+start = time.perf_counter()
+for component in components:
+    b = evaluate_with_substitution(component, {"x": "0", "y": "0", "z": "0"})
+    a = (evaluate_with_substitution(component, {"x": "1", "y": "0", "z": "0"}) - b,
+         evaluate_with_substitution(component, {"x": "0", "y": "1", "z": "0"}) - b,
+         evaluate_with_substitution(component, {"x": "0", "y": "0", "z": "1"}) - b)
+    Fraction(b).limit_denominator()
+ast_time = time.perf_counter() - start
+
+start = time.perf_counter()
+for component in components:
+    parse_linear_form(component)
+linear_time = time.perf_counter() - start
+
+_parse_space_group_operator.cache_clear()
+
+start = time.perf_counter()
+parse_many(strings)
+many_time = time.perf_counter() - start
+
+print(f"{len(strings)} operators ({len(set(strings))} distinct), {len(components)} components")
+print(f"ast evaluation:    {ast_time:.3f} s")
+print(f"parse_linear_form: {linear_time:.3f} s")
+print(f"parse_many:        {many_time:.3f} s")
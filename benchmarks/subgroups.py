@@ -0,0 +1,40 @@
+""" Subgroup relations between all 1651 groups, key bit masks vs checking every pair of key sets
+
+The pairwise check is only in the settings the groups are in, so it is compared with the relations
+that have the identity transform
+"""
+
+import time
+
+from msg import spacegroups
+from msg.grouptheory.subgroups import SubgroupGraph, _cell_keys
+
+groups = list(spacegroups)
+
+start = time.perf_counter()
+graph = SubgroupGraph.from_groups(groups)
+mask_time = time.perf_counter() - start
+
+start = time.perf_counter()
+key_sets = [frozenset(_cell_keys(group)[0].tolist()) for group in groups]
+keys_time = time.perf_counter() - start
+
+start = time.perf_counter()
+n_pairs = sum(1 for small in key_sets for large in key_sets if len(small) < len(large) and small <= large)
+pairs_time = time.perf_counter() - start
+
+identity = ((1, 0, 0), (0, 1, 0), (0, 0, 1))
+assert n_pairs == sum(1 for relation in graph.relations
+                      if relation.transform.matrix == identity and not any(relation.transform.origin))
+
+start = time.perf_counter()
+for group in groups:
+    graph.subgroups(group.number)
+    graph.supergroups(group.number)
+query_time = time.perf_counter() - start
+
+print(f"{len(graph)} relations, {sum(relation.translationengleiche for relation in graph.relations)} translationengleiche")
+print(f"Cell operation keys:                {keys_time:.2f} s")
+print(f"Keys and bit masks (from_groups):   {mask_time:.2f} s")
+print(f"Every pair of key sets, after keys: {pairs_time:.2f} s")
+print(f"All queries:                        {query_time * 1000:.2f} ms")
@@ -0,0 +1,40 @@
+""" Assigning Wyckoff sites to a large list of atoms, one at a time vs all at once """
+
+import time
+
+import numpy as np
+
+from msg import spacegroups
+
+group = max(spacegroups, key=lambda group: len(group.bns.wyckoff_sites)).bns
+expansions = list(group.wyckoff_expansions.values())
+
+rng = np.random.default_rng(18)
+n_atoms = 100_000
+
+# Atoms on random sites
+sites = rng.integers(0, len(expansions), size=n_atoms)
+points = np.concatenate([
+    expansions[index].positions(rng.random((np.sum(sites == index), 3)))[:, 0, :]
+    for index in range(len(expansions))])
+
+group.wyckoff_classifier # Fill the cache
+
+start = time.perf_counter()
+assignment = group.assign_wyckoff_sites(points)
+batch_time = time.perf_counter() - start
+
+# Brute force, applying every operator to each atom, for a sample
+n_sample = 1000
+start = time.perf_counter()
+for point in points[:n_sample]:
+    moved = np.array([op(np.concatenate((point, np.zeros(3))).reshape(1, 6))[0, :3] for op in group.operators])
+    differences = moved - point
+    n_fixed = np.sum(np.all(np.abs(differences - np.rint(differences)) < 1e-4, axis=1))
+loop_time = (time.perf_counter() - start) * n_atoms / n_sample
+
+assert not np.any(assignment.site_indices < 0)
+
+print(f"{group.symbol}: {len(group.wyckoff_sites)} sites, {len(group.operators)} operators, {n_atoms} atoms")
+print(f"Operator loop (estimated): {loop_time:.2f} s")
+print(f"assign_wyckoff_sites:      {batch_time:.2f} s")
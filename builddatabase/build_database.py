@@ -1,24 +1,59 @@
+""" Build the database from the crysFML data
+
+Run from this directory:
+
+    python build_database.py --jobs 8
+
+Each group record from crysfml_load is converted to a Group independently, in a process
+pool if --jobs is more than one. The records are read from crysFML.txt as they are needed,
+with only a few in flight at once, and the results are put back in their original order, so
+the output is byte for byte the same whatever the number of jobs. database.ndjson is written
+one group at a time as they come out of the conversion; the other files need every group.
+
+Converted groups are cached in .build_cache, keyed by a hash of the group's record and
+of the code that converts it, so only groups that have changed are converted again. Entries
+that weren't used by a complete build are removed at the end of it.
+"""
+
+import argparse
+import ast
+import dataclasses
+import hashlib
+import json
+import os
+import time
+import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from fractions import Fraction
+from collections.abc import Callable, Iterable, Iterator
+from functools import partial
+
+import numpy as np
 
 from msg.groups import BNSGroup, OGGroup, WyckoffSite, Group, BNSOGTransform, WyckoffPosition, \
     MagneticSpaceGroupData
 
 from formatting import latex_format_og_symbol, latex_format_bns_symbol, latex_format_uni_symbol
 from formatting import latex_dump
+from crysfml_load import iter_crysfml_groups, load_point_operations
 
-# Load in the crysfml data
-
-from crysfml_load import space_groups, point_operations, hexagonal_point_operations
 from msg.operations import MagneticOperation, OGMagneticOperation
+from msg.datamodel.parse_operator import format_coordinate_triplet
+from msg.binary_database import write_binary_database
+from msg.ndjson_database import write_ndjson
+from msg.grouptheory.multiplication_tables import write_multiplication_tables
+from msg.grouptheory.fingerprints import write_fingerprint_index
+from msg.grouptheory.subgroups import write_subgroup_graph
 
-# Augment with spglib data
 
-# print(space_groups)
+def convert_group(group_number: int, group: dict, point_operations: dict) -> Group:
+    """ Convert one group record from crysfml_load into a Group
 
-group_list = []
-for group_number in space_groups:
-    group = space_groups[group_number]
-    print(group["bns_number_string"])
+    :param group_number: group_id of the record from crysfml_load.iter_crysfml_groups (UNI number - 1)
+    :param group: the record
+    :param point_operations: from crysfml_load.load_point_operations
+    """
 
     group_type = group["group_type"]
 
@@ -55,16 +90,19 @@ for group_number in space_groups:
         multiplicity = site["multiplicity"]
         positions = []
 
-        for position_num, position_denom, position_xyz, position_mag in zip(
+        for position_num, position_denom, position_xyz, position_mag, coordinate_matrix, moment_matrix in zip(
             site["positions_num"], site["positions_denom"],
-            site["positions_xyz"], site["positions_mag"]):
+            site["positions_xyz"], site["positions_mag"],
+            site["positions_coordinate_matrix"], site["positions_moment_matrix"]):
 
             position = tuple(Fraction(num, position_denom) for num in position_num)
 
             pos = WyckoffPosition(
                 position = position,
                 xyz = position_xyz,
-                mag = position_mag
+                mag = position_mag,
+                coordinates = format_coordinate_triplet(coordinate_matrix, position),
+                moment = format_coordinate_triplet(moment_matrix, moment=True)
             )
 
             positions.append(pos)
@@ -114,15 +152,18 @@ for group_number in space_groups:
             multiplicity = site["multiplicity"]
             positions = []
 
-            for position_num, position_denom, position_xyz, position_mag in zip(
+            for position_num, position_denom, position_xyz, position_mag, coordinate_matrix, moment_matrix in zip(
                     site["positions_num"], site["positions_denom"],
-                    site["positions_xyz"], site["positions_mag"]):
+                    site["positions_xyz"], site["positions_mag"],
+                    site["positions_coordinate_matrix"], site["positions_moment_matrix"]):
                 position = tuple(Fraction(num, position_denom) for num in position_num)
 
                 pos = WyckoffPosition(
                     position=position,
                     xyz=position_xyz,
-                    mag=position_mag
+                    mag=position_mag,
+                    coordinates=format_coordinate_triplet(coordinate_matrix, position),
+                    moment=format_coordinate_triplet(moment_matrix, moment=True)
                 )
 
                 positions.append(pos)
@@ -184,25 +225,316 @@ for group_number in space_groups:
         wyckoff_sites = og_wyckoff
     )
 
-    group = Group(number=group_number+1,
-                  group_type=group_type,
-                  symbol=group["uni_label"],
-                  latex_symbol=latex_format_uni_symbol(group["uni_label"]),
-                  bns=bns,
-                  og=og,
-                  bns_og_transform=bns_og_transform)
+    return Group(number=group_number+1,
+                 group_type=group_type,
+                 symbol=group["uni_label"],
+                 latex_symbol=latex_format_uni_symbol(group["uni_label"]),
+                 bns=bns,
+                 og=og,
+                 bns_og_transform=bns_og_transform)
+
+
+# Tasks submitted to the process pool ahead of the one being waited for, per process
+_READ_AHEAD = 4
+
+
+def _iter_in_order(function: Callable, arguments: Iterable[tuple], jobs: int) -> Iterator:
+    """ function(*args) for each of the arguments, in order, using `jobs` processes
+
+    Only a few arguments are read ahead of the results, so an iterator of arguments is never all in memory
+    """
+
+    if jobs == 1:
+        for args in arguments:
+            yield function(*args)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for args in arguments:
+            pending.append(executor.submit(function, *args))
+
+            if len(pending) >= _READ_AHEAD * jobs:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+def iter_converted_groups(
+        records: Iterable[tuple[int, dict]], point_operations: dict, jobs: int = 1) -> Iterator[Group]:
+    """ Convert (group_id, record) pairs, as from crysfml_load.iter_crysfml_groups, yielding the groups in
+    order as they are done, using `jobs` processes
+    """
+    yield from _iter_in_order(partial(convert_group, point_operations=point_operations), records, jobs)
+
+
+def convert_groups(space_groups: dict[int, dict], point_operations: dict, jobs: int = 1) -> list[Group]:
+    """ Convert all the group records, in order, using `jobs` processes """
+    return list(iter_converted_groups(space_groups.items(), point_operations, jobs))
+
+
+CACHE_DIRECTORY = ".build_cache"
+
+_BUILD_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+_ROOT_DIRECTORY = os.path.dirname(_BUILD_DIRECTORY)
+
+
+def _module_file(name: str) -> str | None:
+    """ Source file of a module of this repository, either a build script or part of msg, None for anything else """
+
+    parts = name.split(".")
+    if parts[0] == "msg":
+        base = os.path.join(_ROOT_DIRECTORY, *parts)
+    elif len(parts) == 1:
+        base = os.path.join(_BUILD_DIRECTORY, name)
+    else:
+        return None
+
+    for filename in (base + ".py", os.path.join(base, "__init__.py")):
+        if os.path.isfile(filename):
+            return filename
+
+    return None
+
+
+def _converter_sources() -> list[str]:
+    """ Source files that affect how a record is converted, a change to any of them invalidates the cache
+
+    These are this file and every module of the repository it imports, directly or not, found by
+    following the import statements (including the packages that modules are in)
+    """
+
+    found = set()
+    to_check = [os.path.abspath(__file__)]
+    while to_check:
+        filename = to_check.pop()
+        if filename in found:
+            continue
+        found.add(filename)
+
+        # Only the import statements matter, so any warnings about the rest of the file are ignored
+        with open(filename, "rb") as file, warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            tree = ast.parse(file.read())
+
+        names = []
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names += [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module is not None and node.level == 0:
+                # The imported names might be modules too
+                names += [node.module] + [f"{node.module}.{alias.name}" for alias in node.names]
+
+        for name in names:
+            # Importing a module runs the __init__ of each package it is in
+            parts = name.split(".")
+            for i in range(1, len(parts) + 1):
+                module_file = _module_file(".".join(parts[:i]))
+                if module_file is not None:
+                    to_check.append(module_file)
+
+    return sorted(found)
+
+
+def _json_default(value):
+    """ Make numpy values in the records json serialisable, for hashing """
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if dataclasses.is_dataclass(value):
+        return dataclasses.asdict(value) # crysfml_load.PointOperation
+
+    raise TypeError(f"Can't hash a {type(value).__name__}")
+
+
+def converter_version(point_operations: dict) -> str:
+    """ Hash of everything, apart from the group record itself, that goes into converting a group """
+
+    hasher = hashlib.sha256()
+
+    for filename in _converter_sources():
+        hasher.update(os.path.relpath(filename, _ROOT_DIRECTORY).replace(os.sep, "/").encode())
+        with open(filename, "rb") as file:
+            hasher.update(file.read())
+
+    hasher.update(json.dumps(point_operations, default=_json_default, sort_keys=True).encode())
+
+    return hasher.hexdigest()
+
+
+def record_hash(group_number: int, group: dict, version: str) -> str:
+    """ Cache key for a group record """
+
+    hasher = hashlib.sha256(version.encode())
+    hasher.update(json.dumps([group_number, group], default=_json_default, sort_keys=True).encode())
+
+    return hasher.hexdigest()
+
+
+def _convert_cached(group_number: int, group: dict, filename: str, point_operations: dict) -> tuple[Group, bool]:
+    """ Group from its cache file if it is there, otherwise converted and written to the cache
+
+    :returns: the group, and whether it had to be converted
+    """
+
+    if os.path.exists(filename):
+        with open(filename, "r") as file:
+            return Group.model_validate_json(file.read()), False
+
+    converted = convert_group(group_number, group, point_operations)
+
+    # Write then rename, so an interrupted build never leaves a partial fragment
+    with open(filename + ".tmp", "w") as file:
+        file.write(converted.model_dump_json())
+    os.replace(filename + ".tmp", filename)
+
+    return converted, True
+
+
+def iter_groups_cached(
+        records: Iterable[tuple[int, dict]],
+        point_operations: dict,
+        jobs: int = 1,
+        cache_directory: str = CACHE_DIRECTORY) -> Iterator[tuple[Group, bool]]:
+    """ Same as iter_converted_groups, but taking groups from the cache where their inputs haven't changed
+
+    Once all the groups have been yielded, any other entries in the cache (for records that have
+    changed, or from an older version of the converter) are removed.
+
+    :returns: iterator of (group, whether it had to be converted), in order
+    """
+
+    os.makedirs(cache_directory, exist_ok=True)
+
+    version = converter_version(point_operations)
+    used = set()
+
+    def arguments():
+        for number, group in records:
+            filename = record_hash(number, group, version) + ".json"
+            used.add(filename)
+
+            yield number, group, os.path.join(cache_directory, filename)
+
+    yield from _iter_in_order(partial(_convert_cached, point_operations=point_operations), arguments(), jobs)
+
+    for filename in os.listdir(cache_directory):
+        if filename not in used:
+            os.remove(os.path.join(cache_directory, filename))
+
+
+def convert_groups_cached(
+        space_groups: dict[int, dict],
+        point_operations: dict,
+        jobs: int = 1,
+        cache_directory: str = CACHE_DIRECTORY) -> tuple[list[Group], int]:
+    """ Same as convert_groups, but taking groups from the cache where their inputs haven't changed
+
+    :returns: the groups, and how many of them had to be converted
+    """
+
+    groups, converted = zip(*iter_groups_cached(space_groups.items(), point_operations, jobs, cache_directory)) \
+        if space_groups else ((), ())
+
+    return list(groups), sum(converted)
+
+
+def write_outputs(database: MagneticSpaceGroupData, timings: dict[str, float]):
+    """ Write all the database files apart from database.ndjson (see main), recording how long each takes """
+
+    def timed(name, function, *args):
+        start = time.perf_counter()
+        function(*args)
+        timings[name] = time.perf_counter() - start
+
+    json_string = database.model_dump_json(indent=2)
+
+    def write_json(filename):
+        with open(filename, 'w') as fid:
+            fid.write(json_string)
+
+    timed("database_dump.json", write_json, "database_dump.json")
+
+    # For manually checking symbols
+    timed("symbol_table.tex", latex_dump, database, "symbol_table.tex")
+
+    timed("database.json", write_json, "../msg/data/database.json")
+
+    # Compact form for memory mapped access
+    timed("database.bin", write_binary_database, database.groups, "../msg/data/database.bin")
+
+    # Optional precomputed multiplication tables
+    timed("multiplication_tables.bin", write_multiplication_tables,
+          database.groups, "../msg/data/multiplication_tables.bin")
+
+    # Index for identifying groups from their operators
+    timed("fingerprints.bin", write_fingerprint_index, database.groups, "../msg/data/fingerprints.bin")
+
+    # Subgroup and supergroup relations
+    timed("subgroups.bin", write_subgroup_graph, database.groups, "../msg/data/subgroups.bin")
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Build the magnetic space group database from the crysFML data")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1,
+                        help="number of processes used to convert groups (default: number of CPUs)")
+    parser.add_argument("--compare-serial", action="store_true",
+                        help="also convert serially, check the output is identical and report the speedup")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"convert every group, without using or updating the cache in {CACHE_DIRECTORY}")
+    args = parser.parse_args(args)
+
+    timings = {}
+
+    # Group records are read from crysFML.txt as the conversion needs them
+    start = time.perf_counter()
+    point_operations, _ = load_point_operations()
+
+    if args.no_cache:
+        converted = ((group, True) for group in
+                     iter_converted_groups(iter_crysfml_groups(), point_operations, args.jobs))
+    else:
+        converted = iter_groups_cached(iter_crysfml_groups(), point_operations, args.jobs)
+
+    groups = []
+    n_converted = 0
+
+    def collect():
+        nonlocal n_converted
+        for group, was_converted in converted:
+            groups.append(group)
+            n_converted += was_converted
+            yield group
+
+    # One group per line, for streaming, written as the groups are converted
+    write_ndjson(collect(), "../msg/data/database.ndjson")
+
+    if not args.no_cache:
+        print(f"Converted {n_converted} groups, {len(groups) - n_converted} from the cache")
+
+    database = MagneticSpaceGroupData(groups=groups)
+    # Includes reading crysFML.txt and writing database.ndjson, which happen as the groups are converted
+    timings[f"convert groups ({args.jobs} jobs)"] = time.perf_counter() - start
+
+    if args.compare_serial and args.jobs != 1:
+        start = time.perf_counter()
+        serial = MagneticSpaceGroupData(groups=list(iter_converted_groups(iter_crysfml_groups(), point_operations, 1)))
+        timings["convert groups (serial)"] = serial_time = time.perf_counter() - start
+
+        if serial.model_dump_json(indent=2) != database.model_dump_json(indent=2):
+            raise RuntimeError("Parallel and serial builds differ")
 
-    group_list.append(group)
+        print(f"Parallel output identical to serial, speedup {serial_time / timings[f'convert groups ({args.jobs} jobs)']:.1f}x")
 
-database = MagneticSpaceGroupData(groups=group_list)
+    write_outputs(database, timings)
 
-with open("database_dump.json", 'w') as fid:
-    s = database.model_dump_json(indent=2)
-    fid.write(s)
+    print("Timings:")
+    for name, duration in timings.items():
+        print(f"  {name:<32} {duration:8.2f} s")
+    print(f"  {'total':<32} {sum(timings.values()):8.2f} s")
 
-# For manually checking symbols
-latex_dump(database, "symbol_table.tex")
 
-with open("../msg/data/database.json", 'w') as fid:
-    s = database.model_dump_json(indent=2)
-    fid.write(s)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,23 @@
-""" Load the data from crysFML"""
+""" Load the data from crysFML
 
-from importlib import resources
+iter_crysfml_groups reads the file one group at a time, so nothing is parsed until it is
+asked for. The module level point_operations, hexagonal_point_operations and space_groups
+dictionaries are still available, but are only read from the file the first time they are used.
+"""
+
+import os
+from collections.abc import Iterator
 from dataclasses import dataclass
+from typing import TextIO
 
 import numpy as np
 import re
 
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "crysFML.txt")
+
+N_POINT_OPERATIONS = 48
+N_HEXAGONAL_POINT_OPERATIONS = 24
+
 
 @dataclass
 class PointOperation:
@@ -16,14 +28,14 @@ class PointOperation:
 
 
 def parse_point_operation(line: str) -> PointOperation:
-    parts = [s for s in line.split(" ") if s != ""]
+    parts = line.split()
 
     try:
         n = int(parts[0])
 
         point_op_label = parts[1]
         point_op_string = parts[2]
-        point_op_matrix = np.array([int(x) for x in parts[3:12]]).reshape(3, 3)
+        point_op_matrix = np.array(parts[3:12], dtype=int).reshape(3, 3)
 
         return PointOperation(
             number=n,
@@ -44,255 +56,174 @@ def split_stringy_line(line: str) -> list[str]:
     return matches
 
 
-point_operations = {}
-hexagonal_point_operations = {}
-space_groups = {}
+def _read_integers(file: TextIO, n_lines: int = 1) -> np.ndarray:
+    """ All the integers on the next n lines, converted in one go by numpy """
+    return np.array(" ".join(file.readline() for _ in range(n_lines)).split(), dtype=np.int64)
 
 
-with open("data/crysFML.txt", 'r') as file:
+def _read_operations(file: TextIO, prefix: str) -> dict:
+    """ Operation count line, then the operations, four to a line with six integers each """
 
+    n_operations = int(file.readline())
+    n_lines = (n_operations + 3) // 4
 
-    # Read the square operations
-    for i in range(48):
-        line = file.readline().strip()
-        op = parse_point_operation(line)
-        point_operations[op.number] = op
+    operations = _read_integers(file, n_lines).reshape(n_operations, 6)
+
+    return {
+        f"{prefix}point_op": operations[:, 0].tolist(), # 6n + 0
+        f"{prefix}translation_num": operations[:, 1:4].tolist(), # 6n + 1,2,3
+        f"{prefix}translation_denom": operations[:, 4].tolist(), # 6n + 4
+        f"{prefix}time_inversion": operations[:, 5].tolist()} # 6n + 5
+
+
+def _read_lattice_vectors(file: TextIO, prefix: str) -> dict:
+    """ Lattice vector count line, then one line with four integers per vector """
+
+    n_lattice_vectors = int(file.readline())
+    vectors = _read_integers(file)[:4 * n_lattice_vectors].reshape(n_lattice_vectors, 4)
+
+    return {
+        f"{prefix}lattice_vectors_num": vectors[:, :3].tolist(),
+        f"{prefix}lattice_vectors_denom": vectors[:, 3].tolist()}
 
-    # Read the hexagonal operations
-    for i in range(24):
-        line = file.readline().strip()
-        op = parse_point_operation(line)
-        hexagonal_point_operations[op.number] = op
 
-    for group_id in range(1651):
-        # print(group_id)
+def _read_wyckoff_sites(file: TextIO) -> list[dict]:
+    """ Site count line, then for each site a header line and one line of 22 integers per position
 
-        group_data = {}
+    Each position is the constant part (three numerators and a denominator), then the coefficients of
+    x, y and z in the coordinates and of mx, my and mz in the moment, as 3x3 matrices stored column by
+    column. The xyz and mag fields are the first six coefficients, which is all the original loader read.
+    """
 
-        # First line, names and numbers
-        line = file.readline().strip()
+    n_wyckoff = int(file.readline())
 
-        parts = split_stringy_line(line)
+    wyckoff_sites = []
+    for i in range(n_wyckoff):
 
-        group_data["bns_number_part_1"] = int(parts[0])
-        group_data["bns_number_part_2"] = int(parts[1])
-        group_data["bns_number_string"] = parts[2][1:-1]
+        # Wyckoff outer loop
+        parts = split_stringy_line(file.readline())
 
+        n_positions = int(parts[0])
+        multiplicity = int(parts[1])
+        label = parts[2][1:-1].strip()
 
-        group_data["uni_label"] = parts[3][1:-1]
-        group_data["bns_label"] = parts[4][1:-1]
+        # Wyckoff inner loop, all positions at once
+        positions = _read_integers(file, n_positions).reshape(n_positions, 22)
 
-        group_data["og_number_part_1"] = int(parts[5])
-        group_data["og_number_part_2"] = int(parts[6])
-        group_data["og_number_part_3"] = int(parts[7])
+        wyckoff_sites.append({
+            "label": label,
+            "multiplicity": multiplicity,
+            "positions_num": positions[:, 0:3].tolist(), # 22n + 0,1,2
+            "positions_denom": positions[:, 3].tolist(), # 22n + 3
+            "positions_xyz": positions[:, 4:7].tolist(), # 22n + 4,5,6
+            "positions_mag": positions[:, 7:10].tolist(), # 22n + 7,8,9
+            "positions_coordinate_matrix": positions[:, 4:13].reshape(n_positions, 3, 3).transpose(0, 2, 1).tolist(),
+            "positions_moment_matrix": positions[:, 13:22].reshape(n_positions, 3, 3).transpose(0, 2, 1).tolist()})
 
-        group_data["og_number_string"] = parts[8][1:-1]
-        group_data["og_label"] = parts[9][1:-1]
+    return wyckoff_sites
 
-        # Second line, the type
-        line = file.readline().strip()
-        group_type = int(line)
-        group_data["group_type"] = group_type
 
-        # Now we have group type dependent parsing, type 4 is exceptional
-        if group_type == 4:
+def _read_group(header: str, file: TextIO) -> dict:
+    """ Read a group record, given its first line """
 
-            # Type 4 parsing
-            line = file.readline().strip()
-            parts = [s for s in line.split(" ") if s != ""]
+    group_data = {}
 
-            group_data["bnsog_point_op"] = np.array([int(x) for x in parts[:9]]).reshape(3, 3)
-            group_data["bnsog_origin_num"] = np.array([int(x) for x in parts[9:12]])
-            group_data["bnsog_origin_denom"] = int(parts[12])
+    # First line, names and numbers
+    parts = split_stringy_line(header)
 
-        #
-        # Next section, operations
-        #
+    group_data["bns_number_part_1"] = int(parts[0])
+    group_data["bns_number_part_2"] = int(parts[1])
+    group_data["bns_number_string"] = parts[2][1:-1]
 
-        # Operations 1, number of operations
-        line = file.readline().strip()
-        n_operations = int(line)
+    group_data["uni_label"] = parts[3][1:-1]
+    group_data["bns_label"] = parts[4][1:-1]
 
-        # Operations 2, operations details, multiple operations in one line
+    group_data["og_number_part_1"] = int(parts[5])
+    group_data["og_number_part_2"] = int(parts[6])
+    group_data["og_number_part_3"] = int(parts[7])
 
+    group_data["og_number_string"] = parts[8][1:-1]
+    group_data["og_label"] = parts[9][1:-1]
 
-        bns_point_op = []
-        bns_translation_num = []
-        bns_translation_denom = []
-        bns_time_inversion = []
+    # Second line, the type
+    group_type = int(file.readline())
+    group_data["group_type"] = group_type
 
-        operation_lines = n_operations // 4
-        operation_sizes = [4]*operation_lines + [n_operations % 4]
-        operation_sizes = [s for s in operation_sizes if s > 0]
+    # Now we have group type dependent parsing, type 4 is exceptional
+    if group_type == 4:
+        parts = _read_integers(file)
+
+        group_data["bnsog_point_op"] = parts[:9].reshape(3, 3)
+        group_data["bnsog_origin_num"] = parts[9:12]
+        group_data["bnsog_origin_denom"] = int(parts[12])
+
+    # Operations, lattice vectors and Wyckoff sites
+    group_data.update(_read_operations(file, "bns_"))
+    group_data.update(_read_lattice_vectors(file, ""))
+    group_data["bns_wyckoff"] = _read_wyckoff_sites(file)
+
+    # Last part, more type 4 dependent stuff, OG representations
+    if group_type == 4:
+        group_data.update(_read_operations(file, "og_"))
+        group_data.update(_read_lattice_vectors(file, "og_"))
+        group_data["og_wyckoff"] = _read_wyckoff_sites(file)
+
+    return group_data
+
+
+def _read_point_operations(file: TextIO) -> tuple[dict[int, PointOperation], dict[int, PointOperation]]:
+    """ The square and hexagonal point operation tables at the start of the file """
+
+    point_operations = {}
+    for i in range(N_POINT_OPERATIONS):
+        op = parse_point_operation(file.readline())
+        point_operations[op.number] = op
+
+    hexagonal_point_operations = {}
+    for i in range(N_HEXAGONAL_POINT_OPERATIONS):
+        op = parse_point_operation(file.readline())
+        hexagonal_point_operations[op.number] = op
 
-        for line_length in operation_sizes:
-            line = file.readline().strip()
-            parts = [s for s in line.split(" ") if s != ""]
-            for i in range(line_length):
-                bns_point_op.append(int(parts[6*i])) # 6n + 0
-                bns_translation_num.append([int(parts[6*i + j + 1]) for j in range(3)]) # 6n + 1,2,3
-                bns_translation_denom.append(int(parts[6*i+4])) # 6n + 4
-                bns_time_inversion.append(int(parts[6*i+5])) # 6n + 5
+    return point_operations, hexagonal_point_operations
 
-        group_data["bns_point_op"] = bns_point_op
-        group_data["bns_translation_num"] = bns_translation_num
-        group_data["bns_translation_denom"] = bns_translation_denom
-        group_data["bns_time_inversion"] = bns_time_inversion
 
-        # Lattice Vectors 1, number of lattice vectors
-        line = file.readline().strip()
-        n_lattice_vectors = int(line)
+def load_point_operations(path: str = DEFAULT_PATH) -> tuple[dict[int, PointOperation], dict[int, PointOperation]]:
+    """ Read just the square and hexagonal point operations """
+    with open(path, 'r') as file:
+        return _read_point_operations(file)
 
-        # Lattice Vectors 2, actual lattice vectors
-        line = file.readline().strip()
-        parts = [s for s in line.split(" ") if s != ""]
 
-        lattice_vectors_num = []
-        lattice_vectors_denom = []
+def iter_crysfml_groups(path: str = DEFAULT_PATH) -> Iterator[tuple[int, dict]]:
+    """ Read the groups from a crysFML file one at a time, up to the end of the file
 
-        for i in range(n_lattice_vectors):
-            lattice_vectors_num.append([int(parts[4*i + j]) for j in range(3)])
-            lattice_vectors_denom.append(int(parts[4*i + 3]))
+    :returns: iterator of (group_id, record), group_id counting from 0 in the order of the file
+    """
 
-        group_data["lattice_vectors_num"] = lattice_vectors_num
-        group_data["lattice_vectors_denom"] = lattice_vectors_denom
+    with open(path, 'r') as file:
+        _read_point_operations(file)
 
-        # Wyckoff sites 1, number of sites
-        line = file.readline().strip()
-        n_wyckoff = int(line)
+        group_id = 0
+        for header in file:
+            if not header.strip():
+                continue # Blank lines at the end
 
-        # Wyckoff loop
-        wyckoff_sites = []
-        for i in range(n_wyckoff):
+            yield group_id, _read_group(header, file)
+            group_id += 1
 
-            # Wyckoff outer loop
-            line = file.readline().strip()
-            parts = split_stringy_line(line)
 
-            n_positions = int(parts[0])
-            multiplicity = int(parts[1])
-            label = parts[2][1:-1].strip()
+_loaded: dict[str, dict] = {}
 
-            # Wyckoff inner loop
-            positions_num = []
-            positions_denom = []
-            positions_xyz = []
-            positions_mag = []
-            for j in range(n_positions):
-                line = file.readline().strip()
-                parts = [s for s in line.split(" ") if s != ""]
-
-                positions_num.append([int(parts[k]) for k in range(3)]) # 10n + 0,1,2
-                positions_denom.append(int(parts[3])) # 10n + 3
-                positions_xyz.append([int(parts[k + 4]) for k in range(3)]) # 10n + 4,5,6
-                positions_mag.append([int(parts[k + 7]) for k in range(3)]) # 10n + 7,8,9
-
-            wyckoff_site = {
-                "label": label,
-                "multiplicity": multiplicity,
-                "positions_num": positions_num,
-                "positions_denom": positions_denom,
-                "positions_xyz": positions_xyz,
-                "positions_mag": positions_mag
-            }
-
-            wyckoff_sites.append(wyckoff_site)
-
-        group_data["bns_wyckoff"] = wyckoff_sites
-
-        # Last part, more type 4 dependent stuff, OG representations
-
-        if group_type == 4:
-            # OG line 1, number of sites
-            line = file.readline().strip()
-            n_og_operations = int(line)
-
-            operation_lines = n_og_operations // 4
-            operation_sizes = [4] * operation_lines + [n_og_operations % 4]
-            operation_sizes = [s for s in operation_sizes if s > 0]
-
-            # OG operators line
-
-            og_point_op = []
-            og_translation_num = []
-            og_translation_denom = []
-            og_time_inversion = []
-
-            for line_length in operation_sizes:
-                line = file.readline().strip()
-                parts = [s for s in line.split(" ") if s != ""]
-
-                for i in range(line_length):
-
-                    og_point_op.append(int(parts[6 * i]))  # 6n + 0
-                    og_translation_num.append([int(parts[6 * i + j + 1]) for j in range(3)])  # 6n + 1,2,3
-                    og_translation_denom.append(int(parts[6 * i + 4]))  # 6n + 4
-                    og_time_inversion.append(int(parts[6 * i + 5]))  # 6n + 5
-
-            group_data["og_point_op"] = og_point_op
-            group_data["og_translation_num"] = og_translation_num
-            group_data["og_translation_denom"] = og_translation_denom
-            group_data["og_time_inversion"] = og_time_inversion
-
-            # OG Lattice Vectors 1, number of lattice vectors
-            line = file.readline().strip()
-            n_og_lattice_vectors = int(line)
-
-            # OG Lattice Vectors, actual lattice vectors
-            line = file.readline().strip()
-            parts = [s for s in line.split(" ") if s != ""]
-
-            og_lattice_vectors_num = []
-            og_lattice_vectors_denom = []
-
-            for i in range(n_og_lattice_vectors):
-                og_lattice_vectors_num.append([int(parts[4 * i + j]) for j in range(3)])
-                og_lattice_vectors_denom.append(int(parts[4 * i + 3]))
-
-            group_data["og_lattice_vectors_num"] = og_lattice_vectors_num
-            group_data["og_lattice_vectors_denom"] = og_lattice_vectors_denom
-
-            # Wyckoff sites 1, number of sites
-            line = file.readline().strip()
-            n_og_wyckoff = int(line)
-
-            # Wyckoff loop
-            og_wyckoff_sites = []
-            for i in range(n_og_wyckoff):
-
-                # Wyckoff outer loop
-                line = file.readline().strip()
-                parts = split_stringy_line(line)
-
-                n_positions = int(parts[0])
-                multiplicity = int(parts[1])
-                label = parts[2][1:-1].strip()
-
-                # Wyckoff inner loop
-                positions_num = []
-                positions_denom = []
-                positions_xyz = []
-                positions_mag = []
-                for j in range(n_positions):
-                    line = file.readline().strip()
-                    parts = [s for s in line.split(" ") if s != ""]
-
-                    positions_num.append([int(parts[k]) for k in range(3)])  # 10n + 0,1,2
-                    positions_denom.append(int(parts[3]))  # 10n + 3
-                    positions_xyz.append([int(parts[k + 4]) for k in range(3)])  # 10n + 4,5,6
-                    positions_mag.append([int(parts[k + 7]) for k in range(3)])  # 10n + 7,8,9
 
-                wyckoff_site = {
-                    "label": label,
-                    "multiplicity": multiplicity,
-                    "positions_num": positions_num,
-                    "positions_denom": positions_denom,
-                    "positions_xyz": positions_xyz,
-                    "positions_mag": positions_mag
-                }
+def __getattr__(name: str):
+    # Old interface, the whole file read into dictionaries, but only when asked for
+    if name in ("point_operations", "hexagonal_point_operations", "space_groups"):
+        if not _loaded:
+            point_operations, hexagonal_point_operations = load_point_operations(DEFAULT_PATH)
 
-                og_wyckoff_sites.append(wyckoff_site)
+            _loaded["point_operations"] = point_operations
+            _loaded["hexagonal_point_operations"] = hexagonal_point_operations
+            _loaded["space_groups"] = dict(iter_crysfml_groups(DEFAULT_PATH))
 
-            group_data["og_wyckoff"] = og_wyckoff_sites
+        return _loaded[name]
 
-        space_groups[group_id] = group_data
\ No newline at end of file
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
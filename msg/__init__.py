@@ -1,4 +1,10 @@
-from load_database import database as spacegroup_database
+from msg.load_database import spacegroups
 
-spacegroups = spacegroup_database.groups
 
+def __getattr__(name: str):
+    # Building the full database validates every group, so only do it on request
+    if name == "spacegroup_database":
+        from msg.load_database import database
+        return database
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,74 @@
+""" Simple file format for named numpy arrays, read back by memory mapping
+
+Used for the binary database and other precomputed tables
+"""
+
+import json
+import mmap
+
+import numpy as np
+
+_magic = b"MSGBIN01"
+_alignment = 64
+
+
+def write_arrays(filename: str, arrays: dict[str, np.ndarray], metadata: dict | None = None):
+    """ Write named arrays to a file that can be read back with read_arrays
+
+    Layout: magic, 8 byte header length, json header, then each array aligned to 64 bytes
+    """
+
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+
+    directory = {}
+    offset = 0
+    for name, array in arrays.items():
+        directory[name] = {
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": offset}
+
+        offset += array.nbytes
+        offset += (-offset) % _alignment
+
+    header = json.dumps({"arrays": directory, "metadata": metadata or {}}).encode("utf-8")
+
+    data_start = len(_magic) + 8 + len(header)
+    padding = (-data_start) % _alignment
+
+    with open(filename, "wb") as file:
+        file.write(_magic)
+        file.write((len(header) + padding).to_bytes(8, "little"))
+        file.write(header)
+        file.write(b" " * padding)
+
+        position = 0
+        for name, array in arrays.items():
+            file.write(b"\0" * (directory[name]["offset"] - position))
+            file.write(array.tobytes())
+            position = directory[name]["offset"] + array.nbytes
+
+
+def read_arrays(filename: str) -> tuple[dict[str, np.ndarray], dict]:
+    """ Memory map a file written by write_arrays, returns read only arrays and the metadata """
+
+    with open(filename, "rb") as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if buffer[:len(_magic)] != _magic:
+        raise ValueError(f"{filename} is not a magnetic space group binary file")
+
+    header_length = int.from_bytes(buffer[len(_magic):len(_magic) + 8], "little")
+    data_start = len(_magic) + 8 + header_length
+
+    header = json.loads(bytes(buffer[len(_magic) + 8:data_start]))
+
+    arrays = {}
+    for name, entry in header["arrays"].items():
+        dtype = np.dtype(entry["dtype"])
+        shape = tuple(entry["shape"])
+        arrays[name] = np.frombuffer(
+            buffer, dtype=dtype, count=int(np.prod(shape)),
+            offset=data_start + entry["offset"]).reshape(shape)
+
+    return arrays, header["metadata"]
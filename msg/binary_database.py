@@ -0,0 +1,320 @@
+""" Compact binary form of the database, for memory mapped access
+
+The file is a small json header followed by flat numeric arrays. Per-group data is stored
+in "offset" form: e.g. the BNS operators of group i are entries
+bns_op_offsets[i] to bns_op_offsets[i+1] of the bns_op_* arrays. Point operations are stored
+as indices into a 3x3 matrix table, and all strings are stored once in a shared table.
+
+Reading a group only slices the memory mapped arrays, so there is no text parsing, and
+processes that map the same file share the same pages.
+"""
+
+from collections.abc import Sequence
+from fractions import Fraction
+from importlib import resources
+from math import lcm
+
+import numpy as np
+
+from msg.array_file import write_arrays, read_arrays
+from msg.groups import Group, BNSGroup, OGGroup, BNSOGTransform, WyckoffSite, WyckoffPosition
+from msg.operations import MagneticOperation, OGMagneticOperation
+from msg.point_operations import POINT_OPERATIONS, point_operation_index, point_operation_from_index
+
+
+#
+# Encoding of the database
+#
+
+class _StringTable:
+    """ Deduplicated strings, referred to by index """
+    def __init__(self):
+        self.strings: list[str] = []
+        self._lookup: dict[str, int] = {}
+
+    def index(self, string: str | None) -> int:
+        if string is None:
+            return -1
+
+        if string not in self._lookup:
+            self._lookup[string] = len(self.strings)
+            self.strings.append(string)
+
+        return self._lookup[string]
+
+    def arrays(self) -> tuple[np.ndarray, np.ndarray]:
+        encoded = [s.encode("utf-8") for s in self.strings]
+        offsets = np.cumsum([0] + [len(s) for s in encoded], dtype=np.int64)
+        return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _fractions_to_integers(values) -> tuple[list[int], int]:
+    """ Numerators over a common denominator """
+    denominator = lcm(*[Fraction(value).denominator for value in values])
+    return [int(Fraction(value) * denominator) for value in values], denominator
+
+
+def _encode_setting(prefix: str, settings: list[BNSGroup | OGGroup], strings: _StringTable) -> dict[str, np.ndarray]:
+    """ Arrays for the operators, lattice vectors and wyckoff sites of either the BNS or OG settings """
+
+    op_offsets = [0]
+    op_point, op_translation_num, op_translation_denom, op_time_reversal, op_name = [], [], [], [], []
+
+    lattice_offsets = [0]
+    lattice_num, lattice_denom = [], []
+
+    site_offsets = [0]
+    site_name, site_unicode_name, site_latex_name, site_multiplicity = [], [], [], []
+
+    position_offsets = [0]
+    position_num, position_denom, position_xyz, position_mag = [], [], [], []
+    position_coordinates, position_moment = [], []
+
+    for setting in settings:
+        for op in setting.operators:
+            numerators, denominator = _fractions_to_integers(op.translation)
+
+            op_point.append(point_operation_index(op.point_operation))
+            op_translation_num.append(numerators)
+            op_translation_denom.append(denominator)
+            op_time_reversal.append(op.time_reversal)
+            op_name.append(strings.index(op.name))
+
+        op_offsets.append(len(op_point))
+
+        for vector in setting.lattice_vectors:
+            numerators, denominator = _fractions_to_integers(vector)
+            lattice_num.append(numerators)
+            lattice_denom.append(denominator)
+
+        lattice_offsets.append(len(lattice_num))
+
+        for site in setting.wyckoff_sites:
+            site_name.append(strings.index(site.name))
+            site_unicode_name.append(strings.index(site.unicode_name))
+            site_latex_name.append(strings.index(site.latex_name))
+            site_multiplicity.append(site.multiplicity)
+
+            for position in site.positions:
+                numerators, denominator = _fractions_to_integers(position.position)
+                position_num.append(numerators)
+                position_denom.append(denominator)
+                position_xyz.append(position.xyz)
+                position_mag.append(position.mag)
+                position_coordinates.append(strings.index(position.coordinates))
+                position_moment.append(strings.index(position.moment))
+
+            position_offsets.append(len(position_num))
+
+        site_offsets.append(len(site_name))
+
+    arrays = {
+        "op_offsets": np.array(op_offsets, dtype=np.int32),
+        "op_point": np.array(op_point, dtype=np.int8),
+        "op_translation_num": np.array(op_translation_num, dtype=np.int16).reshape(-1, 3),
+        "op_translation_denom": np.array(op_translation_denom, dtype=np.int16),
+        "op_time_reversal": np.array(op_time_reversal, dtype=np.int8),
+        "op_name": np.array(op_name, dtype=np.int32),
+
+        "lattice_offsets": np.array(lattice_offsets, dtype=np.int32),
+        "lattice_num": np.array(lattice_num, dtype=np.int16).reshape(-1, 3),
+        "lattice_denom": np.array(lattice_denom, dtype=np.int16),
+
+        "site_offsets": np.array(site_offsets, dtype=np.int32),
+        "site_name": np.array(site_name, dtype=np.int32),
+        "site_unicode_name": np.array(site_unicode_name, dtype=np.int32),
+        "site_latex_name": np.array(site_latex_name, dtype=np.int32),
+        "site_multiplicity": np.array(site_multiplicity, dtype=np.int16),
+
+        "position_offsets": np.array(position_offsets, dtype=np.int32),
+        "position_num": np.array(position_num, dtype=np.int16).reshape(-1, 3),
+        "position_denom": np.array(position_denom, dtype=np.int16),
+        "position_xyz": np.array(position_xyz, dtype=np.int16).reshape(-1, 3),
+        "position_mag": np.array(position_mag, dtype=np.int16).reshape(-1, 3),
+        "position_coordinates": np.array(position_coordinates, dtype=np.int32),
+        "position_moment": np.array(position_moment, dtype=np.int32),
+    }
+
+    return {prefix + name: array for name, array in arrays.items()}
+
+
+def write_binary_database(groups: Sequence[Group], filename: str):
+    """ Write groups in the compact binary format """
+
+    strings = _StringTable()
+
+    arrays = {
+        "point_operations": POINT_OPERATIONS,
+
+        "number": np.array([group.number for group in groups], dtype=np.int16),
+        "group_type": np.array([group.group_type for group in groups], dtype=np.int8),
+        "symbol": np.array([strings.index(group.symbol) for group in groups], dtype=np.int32),
+        "latex_symbol": np.array([strings.index(group.latex_symbol) for group in groups], dtype=np.int32),
+
+        "bns_number": np.array([group.bns.number for group in groups], dtype=np.int16).reshape(-1, 2),
+        "bns_symbol": np.array([strings.index(group.bns.symbol) for group in groups], dtype=np.int32),
+        "bns_latex_symbol": np.array([strings.index(group.bns.latex_symbol) for group in groups], dtype=np.int32),
+
+        "og_number": np.array([group.og.number for group in groups], dtype=np.int16).reshape(-1, 3),
+        "og_symbol": np.array([strings.index(group.og.symbol) for group in groups], dtype=np.int32),
+        "og_latex_symbol": np.array([strings.index(group.og.latex_symbol) for group in groups], dtype=np.int32),
+    }
+
+    arrays |= _encode_setting("bns_", [group.bns for group in groups], strings)
+    arrays |= _encode_setting("og_", [group.og for group in groups], strings)
+
+    transform_origins = [_fractions_to_integers(group.bns_og_transform.origin) for group in groups]
+    arrays["bnsog_rotation"] = np.array(
+        [group.bns_og_transform.rotation for group in groups], dtype=np.int8).reshape(-1, 3, 3)
+    arrays["bnsog_origin_num"] = np.array(
+        [numerators for numerators, _ in transform_origins], dtype=np.int16).reshape(-1, 3)
+    arrays["bnsog_origin_denom"] = np.array(
+        [denominator for _, denominator in transform_origins], dtype=np.int16)
+
+    arrays["strings"], arrays["string_offsets"] = strings.arrays()
+
+    write_arrays(filename, arrays, metadata={"n_groups": len(groups)})
+
+
+#
+# Decoding
+#
+
+class BinaryDatabase(Sequence):
+    """ Memory mapped binary database, groups are built from the arrays when accessed """
+
+    def __init__(self, filename: str | None = None):
+        if filename is None:
+            with resources.as_file(resources.files("msg.data").joinpath("database.bin")) as path:
+                self.arrays, self.metadata = read_arrays(str(path))
+        else:
+            self.arrays, self.metadata = read_arrays(filename)
+
+        self._by_number = {int(number): index for index, number in enumerate(self.arrays["number"])}
+
+    def __len__(self) -> int:
+        return self.metadata["n_groups"]
+
+    def _string(self, index: int) -> str | None:
+        if index < 0:
+            return None
+
+        start, end = self.arrays["string_offsets"][index:index+2]
+        return self.arrays["strings"][start:end].tobytes().decode("utf-8")
+
+    def _slice(self, name: str, index: int) -> slice:
+        offsets = self.arrays[name]
+        return slice(int(offsets[index]), int(offsets[index+1]))
+
+    def operator_arrays(self, index: int, setting: str = "bns") -> \
+            tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """ Views of the operators for one group, without building any models
+
+        :returns: (n, 3, 3) point operations, (n, 3) translation numerators,
+                  (n,) translation denominators and (n,) time reversals
+        """
+
+        ops = self._slice(setting + "_op_offsets", index)
+        arrays = self.arrays
+
+        return (arrays["point_operations"][arrays[setting + "_op_point"][ops]],
+                arrays[setting + "_op_translation_num"][ops],
+                arrays[setting + "_op_translation_denom"][ops],
+                arrays[setting + "_op_time_reversal"][ops])
+
+    def _decode_setting(self, index: int, setting: str, operation_type: type):
+        arrays = self.arrays
+
+        operators = []
+        ops = self._slice(setting + "_op_offsets", index)
+        for point, num, denom, time_reversal, name in zip(
+                arrays[setting + "_op_point"][ops],
+                arrays[setting + "_op_translation_num"][ops],
+                arrays[setting + "_op_translation_denom"][ops],
+                arrays[setting + "_op_time_reversal"][ops],
+                arrays[setting + "_op_name"][ops]):
+
+            operators.append(operation_type(
+                point_operation=point_operation_from_index(point),
+                translation=tuple(Fraction(int(n), int(denom)) for n in num),
+                time_reversal=int(time_reversal),
+                name=self._string(name)))
+
+        lattice = self._slice(setting + "_lattice_offsets", index)
+        lattice_vectors = [
+            tuple(Fraction(int(n), int(denom)) for n in num)
+            for num, denom in zip(arrays[setting + "_lattice_num"][lattice],
+                                  arrays[setting + "_lattice_denom"][lattice])]
+
+        sites = []
+        site_slice = self._slice(setting + "_site_offsets", index)
+        for site_index in range(site_slice.start, site_slice.stop):
+            positions = self._slice(setting + "_position_offsets", site_index)
+
+            sites.append(WyckoffSite(
+                name=self._string(arrays[setting + "_site_name"][site_index]),
+                unicode_name=self._string(arrays[setting + "_site_unicode_name"][site_index]),
+                latex_name=self._string(arrays[setting + "_site_latex_name"][site_index]),
+                multiplicity=int(arrays[setting + "_site_multiplicity"][site_index]),
+                positions=[
+                    WyckoffPosition(
+                        position=tuple(Fraction(int(n), int(denom)) for n in num),
+                        xyz=tuple(int(x) for x in xyz),
+                        mag=tuple(int(x) for x in mag),
+                        coordinates=self._string(coordinates),
+                        moment=self._string(moment))
+                    for num, denom, xyz, mag, coordinates, moment in zip(
+                        arrays[setting + "_position_num"][positions],
+                        arrays[setting + "_position_denom"][positions],
+                        arrays[setting + "_position_xyz"][positions],
+                        arrays[setting + "_position_mag"][positions],
+                        arrays[setting + "_position_coordinates"][positions],
+                        arrays[setting + "_position_moment"][positions])]))
+
+        return operators, lattice_vectors, sites
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+
+        arrays = self.arrays
+
+        bns_operators, bns_lattice, bns_sites = self._decode_setting(index, "bns", MagneticOperation)
+        og_operators, og_lattice, og_sites = self._decode_setting(index, "og", OGMagneticOperation)
+
+        bns = BNSGroup(
+            number=tuple(int(x) for x in arrays["bns_number"][index]),
+            symbol=self._string(arrays["bns_symbol"][index]),
+            latex_symbol=self._string(arrays["bns_latex_symbol"][index]),
+            operators=bns_operators,
+            lattice_vectors=bns_lattice,
+            wyckoff_sites=bns_sites)
+
+        og = OGGroup(
+            number=tuple(int(x) for x in arrays["og_number"][index]),
+            symbol=self._string(arrays["og_symbol"][index]),
+            latex_symbol=self._string(arrays["og_latex_symbol"][index]),
+            operators=og_operators,
+            lattice_vectors=og_lattice,
+            wyckoff_sites=og_sites)
+
+        origin_denom = int(arrays["bnsog_origin_denom"][index])
+        transform = BNSOGTransform(
+            rotation=tuple(tuple(int(x) for x in row) for row in arrays["bnsog_rotation"][index]),
+            origin=tuple(Fraction(int(n), origin_denom) for n in arrays["bnsog_origin_num"][index]))
+
+        return Group(
+            number=int(arrays["number"][index]),
+            group_type=int(arrays["group_type"][index]),
+            symbol=self._string(arrays["symbol"][index]),
+            latex_symbol=self._string(arrays["latex_symbol"][index]),
+            bns=bns,
+            og=og,
+            bns_og_transform=transform)
+
+    def by_number(self, number: int) -> Group:
+        """ Get a group by its sequential (UNI) number, 1 to 1651 """
+        return self[self._by_number[number]]
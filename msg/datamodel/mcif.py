@@ -0,0 +1,328 @@
+""" Reading the magnetic symmetry out of mCIF files
+
+Only the magnetic operation and centering loops are kept, everything else in the file is
+skipped over as it is read. The operator strings of each data block are parsed (with the
+cached parser in msg.datamodel.parse_operator) and combined into stacks of arrays, in the
+same form as msg.operations.operation_arrays, so many files can be read quickly, and in
+parallel with a process pool.
+"""
+
+import os
+import re
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from functools import partial
+from glob import glob
+from typing import TextIO
+
+import numpy as np
+
+from msg.datamodel.parse_operator import _parse_space_group_operator, parse_many
+from msg.operations import operations_from_integer_arrays, TRANSLATION_DENOMINATOR
+
+# Both the current (dREL style) and older (DDL1 style) tag names
+OPERATION_TAGS = ("_space_group_symop_magn_operation.xyz", "_space_group_symop.magn_operation_xyz")
+CENTERING_TAGS = ("_space_group_symop_magn_centering.xyz", "_space_group_symop.magn_centering_xyz")
+
+_cif_token_regex = re.compile(r"""'[^']*'(?=\s|$)|"[^"]*"(?=\s|$)|\S+""")
+
+
+@dataclass(frozen=True)
+class MCIFSymmetry:
+    """ Magnetic symmetry of one data block of an mCIF file
+
+    operations and centerings are the operator strings as they are in the file. The arrays are
+    every operation combined with every centering, (G, 3, 3) rotations, (G, 3) translations in
+    [0, 1) and (G,) time reversals, in the order [centering, operation].
+    """
+
+    filename: str | None
+    block: str | None
+    operations: tuple[str, ...]
+    centerings: tuple[str, ...]
+    rotations: np.ndarray
+    translations: np.ndarray
+    time_reversals: np.ndarray
+
+    group_numbers: tuple[int, ...] | None = None
+
+    def __len__(self) -> int:
+        return self.rotations.shape[0]
+
+    def operators(self) -> list:
+        """ The operations as MagneticOperation objects """
+        return parse_many(self.operations)
+
+    def centering_operators(self) -> list:
+        """ The centerings as MagneticOperation objects """
+        return parse_many(self.centerings)
+
+    def identify(self) -> tuple[int, ...]:
+        """ Numbers of the groups in the database with these operations and centerings, which will
+        only be found if the file uses the same setting as the database
+
+        :raises ValueError: if the operations are not magnetic space group operations
+        """
+
+        from msg.grouptheory.fingerprints import identify_group
+
+        # The arrays already have their translations reduced to [0, 1), unlike the strings
+        numerators = self.translations * TRANSLATION_DENOMINATOR
+        rounded = np.rint(numerators)
+        if not np.allclose(numerators, rounded, atol=1e-6):
+            # No group in the database has translations that aren't multiples of 1/TRANSLATION_DENOMINATOR
+            return ()
+
+        operators = operations_from_integer_arrays(
+            np.rint(self.rotations).astype(np.int64),
+            rounded.astype(np.int64) % TRANSLATION_DENOMINATOR,
+            np.rint(self.time_reversals).astype(np.int64))
+
+        return tuple(identify_group(operators))
+
+
+def _cif_tokens(file: TextIO) -> Iterator[tuple[str, bool]]:
+    """ Tokens of a CIF file, and whether each one is a value (rather than a tag or keyword)
+
+    Quotes are removed from quoted values, and semicolon delimited text fields are single values
+    """
+
+    lines = iter(file)
+    for line in lines:
+        if line.startswith(";"):
+            text = [line[1:].rstrip("\n")]
+            for line in lines:
+                if line.startswith(";"):
+                    break
+                text.append(line.rstrip("\n"))
+
+            yield "\n".join(text), True
+            continue
+
+        for token in _cif_token_regex.findall(line):
+            if token.startswith("#"):
+                break
+
+            if token[0] in "'\"" and len(token) > 1 and token[-1] == token[0]:
+                yield token[1:-1], True
+
+            else:
+                lower = token.lower()
+                is_value = not (token.startswith("_") or lower == "loop_" or lower.startswith("data_") or
+                                lower.startswith("save_") or lower == "global_" or lower == "stop_")
+
+                yield token, is_value
+
+
+def iter_mcif_blocks(file: TextIO) -> Iterator[tuple[str | None, list[str], list[str]]]:
+    """ Magnetic operation and centering strings of each data block, without parsing them
+
+    :returns: iterator of (block name, operation strings, centering strings)
+    """
+
+    block = None
+    operations: list[str] = []
+    centerings: list[str] = []
+
+    loop_tags: list[str] | None = None # Tags of the loop being read
+    loop_values: list[str] = []
+    reading_header = False
+
+    pending_tag = None # A tag outside a loop, waiting for its value
+
+    def finish_loop():
+        for i, tag in enumerate(loop_tags):
+            if tag in OPERATION_TAGS:
+                operations.extend(loop_values[i::len(loop_tags)])
+            elif tag in CENTERING_TAGS:
+                centerings.extend(loop_values[i::len(loop_tags)])
+
+    def wanted(tag: str) -> bool:
+        return tag in OPERATION_TAGS or tag in CENTERING_TAGS
+
+    for token, is_value in _cif_tokens(file):
+
+        if is_value:
+            if pending_tag is not None:
+                if pending_tag in OPERATION_TAGS:
+                    operations.append(token)
+                elif pending_tag in CENTERING_TAGS:
+                    centerings.append(token)
+
+                pending_tag = None
+
+            elif loop_tags is not None:
+                reading_header = False
+
+                # Only store the values of the loops we want
+                if any(wanted(tag) for tag in loop_tags):
+                    loop_values.append(token)
+
+            continue
+
+        tag = token.lower()
+
+        if reading_header and tag.startswith("_"):
+            loop_tags.append(tag)
+            continue
+
+        if loop_tags is not None:
+            finish_loop()
+            loop_tags = None
+            loop_values = []
+            reading_header = False
+
+        if tag == "loop_":
+            loop_tags = []
+            reading_header = True
+
+        elif tag.startswith("data_"):
+            if operations or centerings:
+                yield block, operations, centerings
+
+            block = token[5:]
+            operations = []
+            centerings = []
+
+        elif tag.startswith("_"):
+            pending_tag = tag
+
+    if loop_tags is not None:
+        finish_loop()
+
+    if operations or centerings:
+        yield block, operations, centerings
+
+
+def _symmetry_arrays(
+        operations: list[str],
+        centerings: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ All the operations combined with all the centerings, as arrays """
+
+    def arrays(strings: list[str]):
+        parsed = [_parse_space_group_operator(string) for string in strings]
+
+        rotations = np.array([rows for rows, _, _ in parsed], dtype=float).reshape(-1, 3, 3)
+        translations = np.array([[float(t) for t in constants] for _, constants, _ in parsed]).reshape(-1, 3)
+        time_reversals = np.array([time_reversal for _, _, time_reversal in parsed], dtype=float)
+
+        return rotations, translations, time_reversals
+
+    rotations, translations, time_reversals = arrays(operations)
+
+    if not centerings:
+        centerings = ["x,y,z,+1"]
+
+    centering_rotations, centering_translations, centering_time_reversals = arrays(centerings)
+
+    # Operation followed by centering, for every pair
+    all_rotations = centering_rotations[:, np.newaxis, :, :] @ rotations[np.newaxis, :, :, :]
+    all_translations = np.einsum("cab,gb->cga", centering_rotations, translations)
+    all_translations += centering_translations[:, np.newaxis, :]
+    all_translations -= np.floor(all_translations + 1e-10)
+    all_time_reversals = centering_time_reversals[:, np.newaxis] * time_reversals[np.newaxis, :]
+
+    return all_rotations.reshape(-1, 3, 3), all_translations.reshape(-1, 3), all_time_reversals.reshape(-1)
+
+
+def read_mcif_symmetry(file: str | TextIO, identify: bool = False) -> list[MCIFSymmetry]:
+    """ Magnetic symmetry of each data block of an mCIF file that has some
+
+    :param file: filename, or open file
+    :param identify: look the group up in the database (see MCIFSymmetry.identify)
+    :raises ValueError: if an operator string can't be parsed
+    """
+
+    if isinstance(file, str):
+        with open(file, "r") as opened:
+            return _read_mcif_symmetry(opened, file, identify)
+
+    return _read_mcif_symmetry(file, getattr(file, "name", None), identify)
+
+
+def _read_mcif_symmetry(file: TextIO, filename: str | None, identify: bool) -> list[MCIFSymmetry]:
+
+    output = []
+    for block, operations, centerings in iter_mcif_blocks(file):
+        rotations, translations, time_reversals = _symmetry_arrays(operations, centerings)
+
+        symmetry = MCIFSymmetry(
+            filename=filename,
+            block=block,
+            operations=tuple(operations),
+            centerings=tuple(centerings),
+            rotations=rotations,
+            translations=translations,
+            time_reversals=time_reversals)
+
+        if identify:
+            symmetry = replace(symmetry, group_numbers=symmetry.identify())
+
+        output.append(symmetry)
+
+    return output
+
+
+def _read_or_error(filename: str, identify: bool) -> list[MCIFSymmetry] | ValueError:
+    # Exceptions are returned rather than raised, so that one bad file doesn't stop the others
+    try:
+        return read_mcif_symmetry(filename, identify)
+    except ValueError as error:
+        return ValueError(f"{filename}: {error}")
+
+
+def read_many_mcif_symmetries(
+        filenames: Iterable[str],
+        identify: bool = False,
+        jobs: int = 1,
+        skip_errors: bool = False) -> list[MCIFSymmetry]:
+    """ Magnetic symmetry of all the data blocks of many mCIF files, in the order of the files
+
+    :param jobs: number of processes to use
+    :param skip_errors: leave out files that can't be parsed, rather than raising the error
+    """
+
+    filenames = list(filenames)
+    read = partial(_read_or_error, identify=identify)
+
+    if jobs == 1:
+        return _collect_results(map(read, filenames), skip_errors)
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(read, filenames, chunksize=max(1, len(filenames) // (4 * jobs)))
+        return _collect_results(results, skip_errors)
+
+
+def _collect_results(results: Iterable[list[MCIFSymmetry] | ValueError], skip_errors: bool) -> list[MCIFSymmetry]:
+    """ All the symmetries from the results of _read_or_error, raising the first error unless skipping them """
+
+    output = []
+    for result in results:
+        if isinstance(result, ValueError):
+            if skip_errors:
+                continue
+            raise result
+
+        output.extend(result)
+
+    return output
+
+
+def read_mcif_directory(
+        directory: str,
+        pattern: str = "*.mcif",
+        identify: bool = False,
+        jobs: int | None = None,
+        skip_errors: bool = False) -> list[MCIFSymmetry]:
+    """ Magnetic symmetry of all the mCIF files in a directory, and its subdirectories, sorted by filename
+
+    :param jobs: number of processes to use, defaults to one per CPU
+    """
+
+    filenames = sorted(glob(os.path.join(directory, "**", pattern), recursive=True))
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    return read_many_mcif_symmetries(filenames, identify=identify, jobs=jobs, skip_errors=skip_errors)
@@ -1,47 +1,175 @@
+""" Parsing of operator strings, e.g. '-x,y,-z+1/2' or 'x+1/2,y+1/2,z,-1'
+
+Each component is a linear form in x, y and z, which is read in a single pass over its
+tokens, giving the row of the point operation and an exact constant directly. Files tend to
+contain the same few operators over and over, so parsed strings are also cached.
+"""
+
 import re
+from collections.abc import Iterable
 from fractions import Fraction
+from functools import lru_cache
+from math import gcd
 
-from msgmodels.operations import (
-    MagneticOperation, OGMagneticOperation,
+from msg.operations import (
+    BaseMagneticOperation, MagneticOperation, OGMagneticOperation,
     PointOperationType, TranslationType)
 
-from msgmodels.datamodel.safe_expression_evaluation import evaluate_algebra
+_token_regex = re.compile(r"\s*(?:(\d+(?:\.\d+)?)|([xyz])|([-+*/]))")
+
+_variable_index = {"x": 0, "y": 1, "z": 2}
+_coefficient_regex = re.compile(r"(\d)\s*([xyz])")
 
-_number_regex = r"\d+(?:\.\d+)?"
-_symbol_regex = r"x|y|z|\-|\+|/|\*"
-_number_symbol_regex = "("+_number_regex+"|"+_symbol_regex+"|\s+)"
+LinearForm = tuple[tuple[int, int, int], Fraction]
 
-def _convert_token_to_number(token: str, to_zero: str, to_one: str) -> str:
-    """ Helper function, converts a token to "0" or "1" based on whether it is in each of the given strings
 
-    e.g. _convert_token_to_number("y", "xy", "z") yields "0"
-         _convert_token_to_number("z", "xy", "z") yields "1"
+def parse_linear_form(component: str) -> LinearForm:
+    """ Parse one component of an operator string, e.g. '-z + 1/2'
 
-    :param token: the token to be potentially converted
-    :param to_zero: tokens in this string will yield "0", this has priority
-    :param to_one: tokens in this string will yield "1"
-    :returns: "0", "1" or the input token
+    Components are sums of terms, each of which is a product or quotient of numbers and at
+    most one of x, y or z (which can't be divided by).
+
+    :returns: integer coefficients of x, y and z, and the constant
+    :raises ValueError: if the component is not a linear form with integer coefficients
     """
 
-    if token in to_zero:
-        return "0"
-    elif token in to_one:
-        return "1"
-    else:
-        return token
+    # Sums are kept as integer numerators over a common denominator, and each term as an
+    # integer numerator and denominator, which is a lot quicker than using Fractions throughout
+    coefficients = [0, 0, 0, 0] # x, y, z and constant
+    denominator = 1
+
+    # State of the term being read
+    numerator = 1
+    term_denominator = 1
+    variable = 3
+    operator = None # "*" or "/" waiting for a factor
+    expecting_factor = True
+
+    position = 0
+    component = component.rstrip()
+    at_end = False
+    while not at_end:
+        if position == len(component):
+            if expecting_factor:
+                raise ValueError(f"Invalid operator component '{component}' (incomplete)")
+
+            # Finish the last term as if there was another one
+            at_end = True
+            operation = "+"
+
+        else:
+            match = _token_regex.match(component, position)
+            if match is None:
+                raise ValueError(f"Invalid operator component '{component}' (unexpected '{component[position:]}')")
+
+            position = match.end()
+            number, symbol, operation = match.groups()
+
+            if operation is None:
+                if not expecting_factor:
+                    raise ValueError(f"Invalid operator component '{component}' (missing operator)")
+
+                if symbol is not None:
+                    if variable != 3:
+                        raise ValueError(f"Invalid operator component '{component}' (not linear)")
+                    if operator == "/":
+                        raise ValueError(f"Invalid operator component '{component}' (division by {symbol})")
+
+                    variable = _variable_index[symbol]
+
+                else:
+                    if "." in number:
+                        whole, fractional = number.split(".")
+                        factor_numerator, factor_denominator = int(whole + fractional), 10 ** len(fractional)
+                    else:
+                        factor_numerator, factor_denominator = int(number), 1
+
+                    if operator == "/":
+                        if factor_numerator == 0:
+                            raise ValueError(f"Invalid operator component '{component}' (division by zero)")
+                        factor_numerator, factor_denominator = factor_denominator, factor_numerator
+
+                    numerator *= factor_numerator
+                    term_denominator *= factor_denominator
+
+                operator = None
+                expecting_factor = False
+                continue
+
+        if operation in "+-":
+            if expecting_factor:
+                # Unary sign, at the start of a term or of a factor, e.g. 'x*-1'
+                if operation == "-":
+                    numerator = -numerator
+
+            else:
+                # Add the finished term to the sums
+                if denominator % term_denominator != 0:
+                    scale = term_denominator // gcd(denominator, term_denominator)
+                    coefficients = [coefficient * scale for coefficient in coefficients]
+                    denominator *= scale
+
+                coefficients[variable] += numerator * (denominator // term_denominator)
+
+                numerator = -1 if operation == "-" else 1
+                term_denominator = 1
+                variable = 3
+
+            expecting_factor = True
+
+        else:
+            if expecting_factor:
+                raise ValueError(f"Invalid operator component '{component}' (unexpected '{operation}')")
 
-def _evaluate_generator_with_subsitution(tokens: list[str], to_zero: str, to_one: str):
-    """ Helper function: Evaluate a tokenised (see parse_space_group_generator) list
+            operator = operation
+            expecting_factor = True
 
+    if any(coefficient % denominator != 0 for coefficient in coefficients[:3]):
+        raise ValueError(f"Invalid operator component '{component}' (non-integer coefficients)")
 
-    :param tokens: list of tokens representing the generator
-    :param to_zero: tokens in this string will become zeros
-    :param to_one: tokens in this string will become ones
-    :returns: the value of the function evaluated with the specified substitutions
+    row = (coefficients[0] // denominator, coefficients[1] // denominator, coefficients[2] // denominator)
+
+    return row, Fraction(coefficients[3], denominator)
+
+
+def parse_coordinate_triplet(triplet: str) -> tuple[PointOperationType, TranslationType]:
+    """ Parse a coordinate triplet of a Wyckoff position, e.g. 'x,-x,1/2', or of its moment, e.g. 'mx,-mx,0'
+
+    :returns: matrix and constant, so the point is matrix @ (x, y, z) + constant
     """
 
-    with_numbers = "".join([_convert_token_to_number(token, to_zero, to_one) for token in tokens])
-    return evaluate_algebra(with_numbers)
+    # Coefficients are written next to the variables, e.g. '2x'
+    components = _coefficient_regex.sub(r"\1*\2", triplet.replace("m", "")).split(",")
+    if len(components) != 3:
+        raise ValueError(f"Expected three comma separated values in '{triplet}'")
+
+    rows, constants = zip(*(parse_linear_form(component) for component in components))
+
+    return rows, constants
+
+
+def format_coordinate_triplet(
+        matrix: PointOperationType, constant: TranslationType = (0, 0, 0), moment: bool = False) -> str:
+    """ Inverse of parse_coordinate_triplet, e.g. 'x,-x,1/2', or 'mx,-mx,0' for a moment """
+
+    variables = ("mx", "my", "mz") if moment else ("x", "y", "z")
+
+    components = []
+    for row, offset in zip(matrix, constant):
+        component = ""
+        for coefficient, variable in zip(row, variables):
+            if coefficient != 0:
+                sign = "-" if coefficient < 0 else ("+" if component else "")
+                component += sign + ("" if abs(coefficient) == 1 else str(abs(coefficient))) + variable
+
+        offset = Fraction(offset)
+        if offset != 0 or not component:
+            component += ("+" if component and offset > 0 else "") + str(offset)
+
+        components.append(component)
+
+    return ",".join(components)
+
 
 def parse_space_group_operator(
         generator_string: str,
@@ -65,6 +193,7 @@ def parse_space_group_operator_og(
         translation=translation,
         time_reversal=time_reversal)
 
+@lru_cache(maxsize=4096)
 def _parse_space_group_operator(
         generator_string: str,
         time_reversed: bool | None = None) -> tuple[PointOperationType, TranslationType, int]:
@@ -72,10 +201,12 @@ def _parse_space_group_operator(
     """ Parse a space group generator string, e.g. '-x,y,-z+1/2' (three components)
     or 'x+1/2,y+1/2,z,-1' (four components, magnetic)
 
+    Results are cached, they are all immutable
+
     :returns: 'rotation' matrix, translation, and time reversal
     """
 
-    components = [x.strip() for x in generator_string.split(",")]
+    components = generator_string.split(",")
 
     if time_reversed is None:
         if len(components) == 3:
@@ -91,38 +222,42 @@ def _parse_space_group_operator(
 
         time_reversal = -1 if time_reversed else 1
 
-    # parse the linear equations specifying the magnetic space group
-    # general strategy is to just use pythons abstract syntax tree to evaluate the linear
-    # expression at different x,y,z values to deduce the constants in a.(x,y,z) + b for each one,
-    # then build the appropriate matrix
+    rows, constants = zip(*(parse_linear_form(component) for component in components[:3]))
 
-    quadratic = []
-    linear = []
+    return rows, constants, time_reversal
 
-    # Tokenise to check its sanitary
-    for component in components[:3]:
-        tokens = re.findall(_number_symbol_regex, component)
-        sanitised = "".join(tokens)
 
-        if component != sanitised:
-            raise ValueError(f"Invalid generator string ('{component}' does not match sanitised '{sanitised}')")
+def parse_many(
+        generator_strings: Iterable[str],
+        time_reversed: bool | None = None,
+        operation_type: type[BaseMagneticOperation] = MagneticOperation) -> list[BaseMagneticOperation]:
 
-        # Find constant by substituting 0 for x,y and z
-        b = _evaluate_generator_with_subsitution(tokens, "xyz", "")
+    """ Parse a list of operator strings (see parse_space_group_operator)
 
-        # Same for each of x,y and z, but subtracting the constant
-        a_x = _evaluate_generator_with_subsitution(tokens, "yz", "x") - b
-        a_y = _evaluate_generator_with_subsitution(tokens, "xz", "y") - b
-        a_z = _evaluate_generator_with_subsitution(tokens, "xy", "z") - b
+    Each distinct string is only parsed, and made into an operation, once
 
-        a = (int(a_x), int(a_y), int(a_z))
+    :param operation_type: MagneticOperation or OGMagneticOperation
+    """
 
-        b = Fraction(b).limit_denominator()
+    operations: dict[str, BaseMagneticOperation] = {}
+    output = []
 
-        quadratic.append(a)
-        linear.append(b)
+    for string in generator_strings:
+        operation = operations.get(string)
 
-    return tuple(quadratic), tuple(linear), 1 if time_reversal is None else time_reversal
+        if operation is None:
+            point_op, translation, time_reversal = _parse_space_group_operator(string, time_reversed)
+
+            operation = operation_type(
+                point_operation=point_op,
+                translation=translation,
+                time_reversal=time_reversal)
+
+            operations[string] = operation
+
+        output.append(operation)
+
+    return output
 
 
 def parse_one_line_generators(generator_string: str):
@@ -155,4 +290,4 @@ if __name__ == "__main__":
     string = "-x, y, -z + 1 / 2"
     op = parse_space_group_operator_og(string, False)
 
-    print(op)
\ No newline at end of file
+    print(op)
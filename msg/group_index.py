@@ -0,0 +1,145 @@
+""" Lookup indices for finding groups by number or symbol
+
+The indices only store positions in the list of groups, so they can be built from the raw
+json data without validating anything.
+"""
+
+import difflib
+from bisect import bisect_left
+from collections.abc import Iterable
+
+
+def normalise_symbol(symbol: str) -> str:
+    """ Symbol with whitespace and underscores removed, so that e.g. "P 2_1" and "P21" are the same
+
+    Case is kept, because it matters in magnetic space group symbols (e.g. P_a and P_A)
+    """
+    return "".join(character for character in symbol if not character.isspace() and character != "_")
+
+
+class GroupIndex:
+    """ Dictionaries from numbers and symbols to positions in a list of groups
+
+    Symbols are the UNI symbol and the BNS and OG symbols, each stored both as is and normalised
+    """
+
+    def __init__(self):
+        self.by_number: dict[int, int] = {}
+        self.by_bns_number: dict[tuple[int, int], int] = {}
+        self.by_og_number: dict[tuple[int, int, int], int] = {}
+        self.by_parent_number: dict[int, list[int]] = {}
+        self.by_symbol: dict[str, int] = {}
+        self.by_normalised_symbol: dict[str, list[int]] = {}
+
+        self._sorted_symbols: list[str] = []
+
+    def add(self,
+            index: int,
+            number: int,
+            bns_number: Iterable[int],
+            og_number: Iterable[int],
+            symbols: Iterable[str]):
+        """ Add a group, at position `index` in the list """
+
+        bns_number = tuple(bns_number)
+
+        self.by_number[number] = index
+        self.by_bns_number[bns_number] = index
+        self.by_og_number[tuple(og_number)] = index
+        self.by_parent_number.setdefault(bns_number[0], []).append(index)
+
+        for symbol in symbols:
+            self.by_symbol.setdefault(symbol, index)
+
+            indices = self.by_normalised_symbol.setdefault(normalise_symbol(symbol), [])
+            if index not in indices:
+                indices.append(index)
+
+        self._sorted_symbols = []
+
+    @staticmethod
+    def from_raw(raw_groups: list[dict]) -> "GroupIndex":
+        """ Index of groups as they are in the json database """
+
+        index = GroupIndex()
+        for i, raw in enumerate(raw_groups):
+            index.add(i, raw["number"], raw["bns"]["number"], raw["og"]["number"],
+                      (raw["symbol"], raw["bns"]["symbol"], raw["og"]["symbol"]))
+
+        return index
+
+    @staticmethod
+    def from_groups(groups: Iterable) -> "GroupIndex":
+        """ Index of a list of Group objects """
+
+        index = GroupIndex()
+        for i, group in enumerate(groups):
+            index.add(i, group.number, group.bns.number, group.og.number,
+                      (group.symbol, group.bns.symbol, group.og.symbol))
+
+        return index
+
+    def lookup_symbol(self, symbol: str) -> int | None:
+        """ Position of the group with this symbol, trying an exact match first, then the normalised one """
+
+        index = self.by_symbol.get(symbol)
+        if index is not None:
+            return index
+
+        indices = self.by_normalised_symbol.get(normalise_symbol(symbol))
+        if indices:
+            return indices[0]
+
+        return None
+
+    def prefix_search(self, prefix: str, limit: int | None = None) -> list[int]:
+        """ Positions of groups with a (normalised) symbol starting with `prefix`, in symbol order
+
+        :param limit: stop once this many have been found
+        """
+
+        if not self._sorted_symbols:
+            self._sorted_symbols = sorted(self.by_normalised_symbol)
+
+        prefix = normalise_symbol(prefix)
+
+        output = {} # Used as an ordered set
+        for symbol in self._sorted_symbols[bisect_left(self._sorted_symbols, prefix):]:
+            if not symbol.startswith(prefix):
+                break
+
+            output.update(dict.fromkeys(self.by_normalised_symbol[symbol]))
+
+            if limit is not None and len(output) >= limit:
+                return list(output)[:limit]
+
+        return list(output)
+
+    def fuzzy_search(self, symbol: str, limit: int = 10, cutoff: float = 0.6) -> list[int]:
+        """ Positions of groups with symbols similar to `symbol`, best matches first (uses difflib) """
+
+        matches = difflib.get_close_matches(
+            normalise_symbol(symbol), self.by_normalised_symbol, n=limit, cutoff=cutoff)
+
+        output = {}
+        for match in matches:
+            output.update(dict.fromkeys(self.by_normalised_symbol[match]))
+
+        return list(output)[:limit]
+
+    def search(self, text: str, limit: int = 10) -> list[int]:
+        """ Positions of groups matching some user input: exact symbol matches, then prefix matches,
+        then fuzzy matches, without repeats
+        """
+
+        exact = self.lookup_symbol(text)
+
+        output = {} if exact is None else {exact: None} # Used as an ordered set
+        # One more, in case the exact match is one of them
+        output.update(dict.fromkeys(self.prefix_search(text, limit + len(output))))
+
+        # The fuzzy search is much slower, and only needed if there aren't enough matches already
+        if len(output) < limit:
+            output.update(dict.fromkeys(self.fuzzy_search(text, limit)))
+
+        return list(output)[:limit]
@@ -1,14 +1,45 @@
 from fractions import Fraction
+from functools import cached_property
+
+import numpy as np
+from numpy.typing import ArrayLike
 from pydantic import BaseModel
 
-from msg.operations import MagneticOperation, OGMagneticOperation, PointOperationType, TranslationType
+from msg.operations import MagneticOperation, OGMagneticOperation, PointOperationType, TranslationType, \
+    TRANSLATION_DENOMINATOR, OG_TRANSLATION_PERIOD, operation_arrays, apply_operation_arrays
+from msg.grouptheory.closures import lattice_expansion_arrays, closure_by_lattice
+from msg.grouptheory.multiplication_tables import MultiplicationTable, \
+    build_multiplication_table, precomputed_multiplication_table
+from msg.setting_transforms import SettingTransform
+from msg.moments import site_moment_projectors, point_moment_projectors, apply_projectors
+from msg.orbits import Orbit, orbit
+from msg.wyckoff import WyckoffExpansion, WyckoffClassifier, WyckoffAssignment, SiteMapping, wyckoff_expansion, \
+    expand_sites
+
+
+class _CachingModel(BaseModel):
+    """ Model with cached properties, which are worked out again for copies """
 
+    def model_copy(self, *, update=None, deep=False):
+        copy = super().model_copy(update=update, deep=deep)
+
+        # Cached values depend on the fields, so don't keep the ones from the original
+        for cls in type(self).__mro__:
+            for name, value in vars(cls).items():
+                if isinstance(value, cached_property):
+                    copy.__dict__.pop(name, None)
+
+        return copy
 
 class WyckoffPosition(BaseModel):
     position: tuple[Fraction, Fraction, Fraction]
     xyz: tuple[int, int, int] # No idea what this is
     mag: tuple[int, int, int] # Or this
 
+    # Coordinate triplets, e.g. "x,-x,1/2" and "mx,-mx,0", from the crysFML coefficient matrices
+    coordinates: str | None = None
+    moment: str | None = None
+
 class WyckoffSite(BaseModel):
     name: str
     unicode_name: str
@@ -16,7 +47,7 @@ class WyckoffSite(BaseModel):
     multiplicity: int
     positions: list[WyckoffPosition]
 
-class BNSGroup(BaseModel):
+class BNSGroup(_CachingModel):
     number: tuple[int, int]
     symbol: str
     latex_symbol: str
@@ -25,7 +56,118 @@ class BNSGroup(BaseModel):
     lattice_vectors: list[TranslationType]
     wyckoff_sites: list[WyckoffSite]
 
-class OGGroup(BaseModel):
+    @cached_property
+    def multiplication_table(self) -> MultiplicationTable:
+        """ Multiplication table over the indices of `operators`, modulo the lattice """
+
+        # Precomputed tables are for the operators as they are in the database
+        table = precomputed_multiplication_table(self.operators, self.lattice_vectors)
+
+        if table is None:
+            table = build_multiplication_table(self.operators, self.lattice_vectors)
+
+        return table
+
+    @cached_property
+    def operator_arrays(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ (G, 3, 3) rotations, (G, 3) translations and (G,) time reversals of the operators """
+        return operation_arrays(self.operators)
+
+    @cached_property
+    def cell_operators(self) -> list[MagneticOperation]:
+        """ All the operations in the unit cell, the operators combined with the centering translations, sorted """
+        return closure_by_lattice(self.operators, self.lattice_vectors)
+
+    @cached_property
+    def cell_operator_arrays(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ (G, 3, 3) rotations, (G, 3) translations and (G,) time reversals of cell_operators """
+
+        rotations, translations, time_reversals = lattice_expansion_arrays(self.operators, self.lattice_vectors)
+
+        return rotations.astype(float), translations / TRANSLATION_DENOMINATOR, time_reversals.astype(float)
+
+    def apply(self, points_and_momenta: ArrayLike) -> np.ndarray:
+        """ Apply every operation in the unit cell (cell_operators, so including the centering
+        translations) to an (N, 6) array of points and momenta, giving a (G, N, 6) array
+
+        Momenta are axial vectors, transformed by det(R) * time_reversal * R
+        """
+        return apply_operation_arrays(*self.cell_operator_arrays, points_and_momenta)
+
+    def orbit(self, points_and_momenta: ArrayLike, tolerance: float = 1e-4) -> Orbit:
+        """ Unique positions and moments generated from an (N, 6) array of atoms, see msg.orbits.orbit """
+        return orbit(self, points_and_momenta, tolerance)
+
+    @cached_property
+    def wyckoff_expansions(self) -> SiteMapping[WyckoffExpansion]:
+        """ Expansion coefficients for each Wyckoff site, by name, worked out when a site is first used
+
+        Looking up a site that isn't consistent with the operators raises a ValueError
+        """
+        sites = {site.name: site for site in self.wyckoff_sites}
+        return SiteMapping(list(sites), lambda name: wyckoff_expansion(self, sites[name]))
+
+    def expand_wyckoff_sites(
+            self,
+            site_names: list[str],
+            free_parameters: ArrayLike,
+            moments: ArrayLike | None = None) -> tuple[np.ndarray, np.ndarray | None, np.ndarray]:
+        """ All the equivalent positions (and moments) of atoms on Wyckoff sites
+
+        :param site_names: (N,) Wyckoff site name of each atom
+        :param free_parameters: (N, 3) values of x, y and z for each atom
+        :param moments: optional (N, 3) moment of each atom
+        :returns: (T, 3) positions, (T, 3) moments (None if not given), and the (T,) index of
+                  the atom that each one comes from
+        """
+        return expand_sites(self.wyckoff_expansions, site_names, free_parameters, moments)
+
+    @cached_property
+    def moment_projectors(self) -> SiteMapping[np.ndarray]:
+        """ For each Wyckoff site, by name, the (M, 3, 3) projectors onto the allowed moments
+        at each of its equivalent positions (in the order of wyckoff_expansions)
+        """
+        return SiteMapping(list(self.wyckoff_expansions), lambda name: site_moment_projectors(self.wyckoff_expansions[name]))
+
+    def constrain_moments(
+            self,
+            site_names: list[str],
+            moments: ArrayLike,
+            copies: ArrayLike | None = None) -> np.ndarray:
+        """ Project moments onto the directions allowed by the symmetry of their sites
+
+        :param site_names: (N,) Wyckoff site of each moment
+        :param moments: (N, 3) moments
+        :param copies: (N,) which of the equivalent positions of the site each atom is at (default 0)
+        """
+
+        copies = np.zeros(len(site_names), dtype=int) if copies is None else np.asarray(copies)
+        projectors = np.array([self.moment_projectors[name][copy] for name, copy in zip(site_names, copies)])
+
+        return apply_projectors(projectors.reshape(-1, 3, 3), moments)
+
+    def constrain_moments_at(self, points: ArrayLike, moments: ArrayLike, tolerance: float = 1e-4) -> np.ndarray:
+        """ Project moments onto the directions allowed at their positions, for (N, 3) points and moments """
+        return apply_projectors(point_moment_projectors(self, points, tolerance), moments)
+
+    @cached_property
+    def wyckoff_classifier(self) -> WyckoffClassifier:
+        """ Precomputed site stabilizers, for assign_wyckoff_sites, leaving out any sites that can't be expanded """
+
+        expansions = []
+        for name in self.wyckoff_expansions:
+            try:
+                expansions.append(self.wyckoff_expansions[name])
+            except ValueError:
+                expansions.append(None)
+
+        return WyckoffClassifier(self, expansions)
+
+    def assign_wyckoff_sites(self, points: ArrayLike, tolerance: float = 1e-4) -> WyckoffAssignment:
+        """ Wyckoff site, multiplicity and free parameters of each atom in an (N, 3) array of positions """
+        return self.wyckoff_classifier.classify(points, tolerance)
+
+class OGGroup(_CachingModel):
     number: tuple[int, int, int]
     symbol: str
     latex_symbol: str
@@ -34,10 +176,45 @@ class OGGroup(BaseModel):
     lattice_vectors: list[TranslationType]
     wyckoff_sites: list[WyckoffSite]
 
-class BNSOGTransform(BaseModel):
+    @cached_property
+    def operator_arrays(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ (G, 3, 3) rotations, (G, 3) translations and (G,) time reversals of the operators """
+        return operation_arrays(self.operators)
+
+    @cached_property
+    def cell_operator_arrays(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ (G, 3, 3) rotations, (G, 3) translations in [0, OG_TRANSLATION_PERIOD) and (G,) time reversals
+        of all the operations, the operators combined with the lattice vectors modulo OG_TRANSLATION_PERIOD
+        """
+
+        rotations, translations, time_reversals = lattice_expansion_arrays(
+            self.operators, self.lattice_vectors, OG_TRANSLATION_PERIOD)
+
+        return rotations.astype(float), translations / TRANSLATION_DENOMINATOR, time_reversals.astype(float)
+
+    def apply(self, points_and_momenta: ArrayLike) -> np.ndarray:
+        """ Apply every operation in cell_operator_arrays to an (N, 6) array of points and momenta,
+        giving a (G, N, 6) array
+
+        Positions are put back into the cell of side OG_TRANSLATION_PERIOD rather than the unit cell,
+        because in the OG setting the magnetic cell can be bigger than the unit cell
+        """
+        return apply_operation_arrays(*self.cell_operator_arrays, points_and_momenta, period=OG_TRANSLATION_PERIOD)
+
+class BNSOGTransform(_CachingModel):
     origin: TranslationType
     rotation: PointOperationType # TODO - different name?
 
+    @cached_property
+    def bns_to_og(self) -> SettingTransform:
+        """ Coordinate transform from the BNS to the OG setting, x_OG = rotation x_BNS + origin """
+        return SettingTransform.from_matrix(self.rotation, self.origin)
+
+    @cached_property
+    def og_to_bns(self) -> SettingTransform:
+        """ Coordinate transform from the OG to the BNS setting """
+        return self.bns_to_og.inverse
+
 class Group(BaseModel):
     number: int
     group_type: int
@@ -48,5 +225,26 @@ class Group(BaseModel):
     og: OGGroup
     bns_og_transform: BNSOGTransform
 
+    @property
+    def multiplication_table(self) -> MultiplicationTable:
+        """ Multiplication table of the BNS operators, modulo the lattice """
+        return self.bns.multiplication_table
+
+    def bns_to_og_operators(self, operators: list[MagneticOperation]) -> list[OGMagneticOperation]:
+        """ BNS setting operators in the OG setting of this group """
+        return self.bns_og_transform.bns_to_og.transform_operations(operators, OGMagneticOperation)
+
+    def og_to_bns_operators(self, operators: list[OGMagneticOperation]) -> list[MagneticOperation]:
+        """ OG setting operators in the BNS setting of this group """
+        return self.bns_og_transform.og_to_bns.transform_operations(operators, MagneticOperation)
+
+    def bns_to_og_points(self, points_and_momenta: ArrayLike) -> np.ndarray:
+        """ (..., 6) array of points and momenta in BNS coordinates, in OG coordinates """
+        return self.bns_og_transform.bns_to_og.transform_points(points_and_momenta)
+
+    def og_to_bns_points(self, points_and_momenta: ArrayLike) -> np.ndarray:
+        """ (..., 6) array of points and momenta in OG coordinates, in BNS coordinates """
+        return self.bns_og_transform.og_to_bns.transform_points(points_and_momenta)
+
 class MagneticSpaceGroupData(BaseModel):
     groups: list[Group]
\ No newline at end of file
@@ -1,8 +1,227 @@
+from collections import deque
+
 import numpy as np
-from msg.operations import MagneticOperation
+from msg.operations import MagneticOperation, FastMagneticOperation, \
+    OGMagneticOperation, FastOGMagneticOperation, TranslationType, TRANSLATION_DENOMINATOR, \
+    integer_operation_arrays, compose_integer_arrays, integer_operation_keys, operations_from_integer_arrays
+from msg.grouptheory.multiplication_tables import centering_translations
+
+
+def closure(generators: list[MagneticOperation], max_size=100_000) -> list[MagneticOperation]:
+    """ Closure of magnetic space groups
+
+    Breadth first search from the identity: each new element is composed with the generators,
+    and only elements that haven't been seen before (by their packed integer key) are added
+    to the work list. The search is done with FastMagneticOperation where possible.
+
+    :param generators: operations to generate the group from
+    :param max_size: give up if the group gets bigger than this
+    :returns: all the operations in the group, sorted
+    """
+
+    try:
+        fast_generators = [FastMagneticOperation.from_model(generator) for generator in generators]
+
+    except ValueError:
+        # Not all standard magnetic space group operations, use the pydantic models
+        identity = MagneticOperation.from_numpy(np.eye(3), np.zeros(3), 1, name="e")
+        return sorted(_breadth_first_closure(identity, generators, max_size))
+
+    identity = FastMagneticOperation.from_numpy(np.eye(3), np.zeros(3), 1)
+    found = _breadth_first_closure(identity, fast_generators, max_size)
+
+    return [operation.to_model(name="e" if operation == identity else None) for operation in sorted(found)]
+
+
+def _breadth_first_closure(identity, generators: list, max_size: int, reduce=None) -> set:
+    """ Closure by breadth first search, works for any hashable operation type with and_then
+
+    :param reduce: optional function mapping each new operation onto a canonical one, e.g. modulo
+                   some lattice vectors (see _lattice_reduction)
+    """
+
+    if reduce is not None:
+        generators = [reduce(generator) for generator in generators]
+
+    found = {identity}
+    to_process = deque([identity])
+
+    while to_process:
+        operation = to_process.popleft()
+
+        for generator in generators:
+            new_operation = operation.and_then(generator)
+            if reduce is not None:
+                new_operation = reduce(new_operation)
+
+            if new_operation not in found:
+                found.add(new_operation)
+                to_process.append(new_operation)
+
+        if len(found) > max_size:
+            raise Exception("Maximum group size reached")
+
+    return found
+
+
+def _lattice_reduction(operation_type: type[FastMagneticOperation], lattice_vectors: list[TranslationType]):
+    """ Function taking a fast operation to the one with the smallest key that differs from it by
+    a combination of lattice vectors, with translations modulo operation_type.translation_modulus
+    """
+
+    modulus = operation_type.translation_modulus
+
+    # All the lattice translations modulo the period of the operation type
+    zero = (0, 0, 0)
+    vectors = [tuple(int(x * TRANSLATION_DENOMINATOR) % modulus for x in vector) for vector in lattice_vectors]
+
+    translations = {zero}
+    to_check = [zero]
+    while to_check:
+        translation = to_check.pop()
+        for vector in vectors:
+            new_translation = tuple((a + b) % modulus for a, b in zip(translation, vector))
+            if new_translation not in translations:
+                translations.add(new_translation)
+                to_check.append(new_translation)
+
+    def reduce(operation: FastMagneticOperation) -> FastMagneticOperation:
+        return min(
+            operation_type(
+                operation.point_operation_index,
+                tuple((t + c) % modulus for t, c in zip(operation.translation_numerators, translation)),
+                operation.time_reversal)
+            for translation in translations)
+
+    return reduce
+
+
+def og_closure(
+        generators: list[OGMagneticOperation],
+        lattice_vectors: list[TranslationType] | None = None,
+        max_size=100_000) -> list[OGMagneticOperation]:
+    """ Closure of magnetic space groups in the OG setting
+
+    Translations are always reduced modulo OG_TRANSLATION_PERIOD (see OGMagneticOperation.and_then).
+    If lattice vectors are given, operations that differ by them are also identified, and
+    the one with the smallest key is kept.
+
+    :param generators: operations to generate the group from
+    :param lattice_vectors: translations of the group without time reversal
+    :param max_size: give up if the group gets bigger than this
+    :returns: all the operations in the group, sorted
+    """
+
+    identity = FastOGMagneticOperation.from_numpy(np.eye(3), np.zeros(3), 1)
+    reduce = _lattice_reduction(FastOGMagneticOperation, lattice_vectors) if lattice_vectors else None
+
+    found = _breadth_first_closure(
+        identity, [FastOGMagneticOperation.from_model(generator) for generator in generators], max_size, reduce)
+
+    return [operation.to_model(name="e" if operation == identity else None) for operation in sorted(found)]
 
-def closure(generators: list[MagneticOperation], max_iters=1000) -> list[MagneticOperation]:
-    """ Closure of magnetic space groups"""
+
+def closure_by_arrays(generators: list[MagneticOperation], max_size=100_000) -> list[MagneticOperation]:
+    """ Closure of magnetic space groups, as batched array operations
+
+    Same breadth first search as `closure`, but each step composes the whole frontier with
+    all the generators at once (compose_integer_arrays) and finds new elements by their keys.
+    """
+
+    generator_arrays = integer_operation_arrays(generators)
+
+    frontier = (np.eye(3, dtype=np.int64).reshape(1, 3, 3),
+                np.zeros((1, 3), dtype=np.int64),
+                np.ones(1, dtype=np.int64))
+
+    elements = [frontier]
+    found_keys = integer_operation_keys(*frontier)
+
+    while frontier[0].shape[0] > 0:
+        rotations, translations, time_reversals = compose_integer_arrays(frontier, generator_arrays)
+
+        rotations = rotations.reshape(-1, 3, 3)
+        translations = translations.reshape(-1, 3)
+        time_reversals = time_reversals.reshape(-1)
+
+        keys, first_index = np.unique(
+            integer_operation_keys(rotations, translations, time_reversals), return_index=True)
+
+        new = ~np.isin(keys, found_keys)
+        new_index = first_index[new]
+
+        frontier = (rotations[new_index], translations[new_index], time_reversals[new_index])
+        elements.append(frontier)
+        found_keys = np.concatenate((found_keys, keys[new]))
+
+        if found_keys.shape[0] > max_size:
+            raise Exception("Maximum group size reached")
+
+    order = np.argsort(found_keys)
+    rotations, translations, time_reversals = (np.concatenate(arrays)[order] for arrays in zip(*elements))
+
+    output = operations_from_integer_arrays(rotations, translations, time_reversals)
+    output[0] = output[0].model_copy(update={"name": "e"}) # Identity has the smallest key
+
+    return output
+
+
+def lattice_expansion_arrays(
+        operators: list[MagneticOperation] | list[OGMagneticOperation],
+        lattice_vectors: list[TranslationType],
+        period: int = 1) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ All the operations in the unit cell, from coset representatives and lattice vectors, as integer arrays
+
+    Rather than a closure, this is every representative combined with every centering
+    translation, reduced modulo 1, all at once. Any duplicates (representatives that differ by
+    a centering) are removed, and the operations are sorted by key, so the identity is first.
+
+    :param period: reduce translations modulo this instead, OG_TRANSLATION_PERIOD for the OG
+                   setting, where the lattice vectors can be longer than the unit cell
+    :returns: (G, 3, 3) rotations, (G, 3) translation numerators over TRANSLATION_DENOMINATOR,
+              and (G,) time reversals
+    """
+
+    centerings = centering_translations(lattice_vectors, period)
+    centering_arrays = (np.tile(np.eye(3, dtype=np.int64), (len(centerings), 1, 1)),
+                        np.array([[int(x * TRANSLATION_DENOMINATOR) for x in centering] for centering in centerings],
+                                 dtype=np.int64).reshape(-1, 3),
+                        np.ones(len(centerings), dtype=np.int64))
+
+    rotations, translations, time_reversals = compose_integer_arrays(
+        integer_operation_arrays(operators), centering_arrays, reduce=False)
+
+    rotations = rotations.reshape(-1, 3, 3)
+    translations = translations.reshape(-1, 3) % (period * TRANSLATION_DENOMINATOR)
+    time_reversals = time_reversals.reshape(-1)
+
+    _, unique_index = np.unique(integer_operation_keys(rotations, translations, time_reversals), return_index=True)
+
+    return rotations[unique_index], translations[unique_index], time_reversals[unique_index]
+
+
+def closure_by_lattice(
+        operators: list[MagneticOperation],
+        lattice_vectors: list[TranslationType]) -> list[MagneticOperation]:
+    """ All the operations in the unit cell, from coset representatives and lattice vectors
+    (see lattice_expansion_arrays), sorted, as with `closure`
+
+    This is only the closure if the operators are representatives of a group modulo the
+    lattice, as they are in the database.
+    """
+
+    output = operations_from_integer_arrays(*lattice_expansion_arrays(operators, lattice_vectors))
+    output[0] = output[0].model_copy(update={"name": "e"})
+
+    return output
+
+
+def closure_by_sorting(generators: list[MagneticOperation], max_iters=1000) -> list[MagneticOperation]:
+    """ Closure of magnetic space groups, by repeatedly applying all the generators, sorting and
+    removing duplicates until nothing changes
+
+    This is slower than `closure`, but is kept for cross-checking.
+    """
 
     output_generators = [MagneticOperation.from_numpy(np.eye(3), np.zeros(3), 1, name="e")]
 
@@ -37,4 +256,3 @@ def closure(generators: list[MagneticOperation], max_iters=1000) -> list[Magneti
 
     else:
         raise Exception("Maximum iterations reached")
-
@@ -0,0 +1,181 @@
+""" Cosets, double cosets, conjugacy classes and normalizers
+
+Everything here works on the indices of a MultiplicationTable, so subgroups are arrays of
+indices into the same list of operators as the table, and every product is an array lookup.
+As with the tables, operators are only defined up to a lattice translation, so subgroups
+should have the same lattice as the group (translationengleiche subgroups); for anything
+else, use a table over all the operations in the unit cell (e.g. of BNSGroup.cell_operators,
+with just the unit translations as lattice vectors).
+
+Products are written as compositions: g h means h first, then g, which is table[h, g].
+Each coset or class is labelled by its smallest index, so the labels are found with a
+minimum over an array of products, rather than by searching.
+"""
+
+from collections.abc import Iterable
+
+import numpy as np
+
+from msg.operations import MagneticOperation, FastMagneticOperation, TranslationType, TRANSLATION_DENOMINATOR
+from msg.grouptheory.multiplication_tables import MultiplicationTable, centering_translations, _reduced_key
+
+
+def operator_indices(
+        operators: list[MagneticOperation],
+        lattice_vectors: list[TranslationType],
+        subset: Iterable[MagneticOperation]) -> np.ndarray:
+    """ Indices in `operators` (those of a multiplication table) of some other operators, up to the lattice
+
+    :raises ValueError: if one of `subset` is not one of `operators`
+    """
+
+    centerings = [tuple(int(x * TRANSLATION_DENOMINATOR) for x in centering)
+                  for centering in centering_translations(lattice_vectors)]
+
+    lookup = {_reduced_key(FastMagneticOperation.from_model(operator), centerings): index
+              for index, operator in enumerate(operators)}
+
+    try:
+        return np.array([lookup[_reduced_key(FastMagneticOperation.from_model(operator), centerings)]
+                         for operator in subset], dtype=np.int64)
+
+    except KeyError as error:
+        raise ValueError("Operator is not in the group") from error
+
+
+def generated_subgroup(table: MultiplicationTable, generators: Iterable[int]) -> np.ndarray:
+    """ Sorted indices of the subgroup generated by some elements """
+
+    members = np.zeros(len(table), dtype=bool)
+    members[table.identity] = True
+    members[list(generators)] = True
+
+    while True:
+        indices = np.nonzero(members)[0]
+        products = np.zeros(len(table), dtype=bool)
+        products[table.table[np.ix_(indices, indices)].reshape(-1)] = True
+
+        if np.all(products <= members):
+            return indices
+
+        members |= products
+
+
+def is_subgroup(table: MultiplicationTable, subgroup: Iterable[int]) -> bool:
+    """ Whether some elements are closed under composition (and so, being finite, are a subgroup) """
+
+    subgroup = np.asarray(list(subgroup), dtype=np.int64)
+
+    members = np.zeros(len(table), dtype=bool)
+    members[subgroup] = True
+
+    return bool(subgroup.size) and bool(np.all(members[table.table[np.ix_(subgroup, subgroup)]]))
+
+
+def _labels_to_classes(labels: np.ndarray) -> list[np.ndarray]:
+    """ Elements with each label, in order of the labels (which are the smallest element of each class) """
+
+    order = np.argsort(labels, kind="stable")
+    boundaries = np.nonzero(np.diff(labels[order]))[0] + 1
+
+    return np.split(order, boundaries)
+
+
+def left_coset_labels(table: MultiplicationTable, subgroup: Iterable[int]) -> np.ndarray:
+    """ For each element g, the smallest element of the left coset g H """
+
+    subgroup = np.asarray(list(subgroup), dtype=np.int64)
+
+    # [h, g] is g h
+    return np.min(table.table[subgroup, :], axis=0)
+
+
+def right_coset_labels(table: MultiplicationTable, subgroup: Iterable[int]) -> np.ndarray:
+    """ For each element g, the smallest element of the right coset H g """
+
+    subgroup = np.asarray(list(subgroup), dtype=np.int64)
+
+    # [g, h] is h g
+    return np.min(table.table[:, subgroup], axis=1)
+
+
+def left_cosets(table: MultiplicationTable, subgroup: Iterable[int]) -> list[np.ndarray]:
+    """ Left coset decomposition, G = g_1 H + g_2 H + ...
+
+    :returns: sorted elements of each coset, the first (containing the identity) is H
+    """
+    return _cosets_from_labels(table, left_coset_labels(table, subgroup))
+
+
+def right_cosets(table: MultiplicationTable, subgroup: Iterable[int]) -> list[np.ndarray]:
+    """ Right coset decomposition, G = H g_1 + H g_2 + ...
+
+    :returns: sorted elements of each coset, the first (containing the identity) is H
+    """
+    return _cosets_from_labels(table, right_coset_labels(table, subgroup))
+
+
+def _cosets_from_labels(table: MultiplicationTable, labels: np.ndarray) -> list[np.ndarray]:
+    """ Classes, with the one containing the identity first """
+
+    classes = _labels_to_classes(labels)
+    first = next(i for i, members in enumerate(classes) if table.identity in members)
+
+    return [classes[first]] + classes[:first] + classes[first + 1:]
+
+
+def left_coset_representatives(table: MultiplicationTable, subgroup: Iterable[int]) -> np.ndarray:
+    """ One element from each left coset, the identity for H itself """
+    return np.array([table.identity if i == 0 else coset[0]
+                     for i, coset in enumerate(left_cosets(table, subgroup))], dtype=np.int64)
+
+
+def double_cosets(
+        table: MultiplicationTable,
+        left_subgroup: Iterable[int],
+        right_subgroup: Iterable[int]) -> list[np.ndarray]:
+    """ Double coset decomposition, G = H g_1 K + H g_2 K + ...
+
+    H g K is the union of the right cosets H g k, so its smallest element is the smallest of
+    their labels, and all of them are found with one lookup over K.
+
+    :param left_subgroup: H
+    :param right_subgroup: K
+    :returns: sorted elements of each double coset, the first is the one containing the identity (H K)
+    """
+
+    right_labels = right_coset_labels(table, left_subgroup)
+    right_subgroup = np.asarray(list(right_subgroup), dtype=np.int64)
+
+    # [k, g] is g k
+    labels = np.min(right_labels[table.table[right_subgroup, :]], axis=0)
+
+    return _cosets_from_labels(table, labels)
+
+
+def conjugation_table(table: MultiplicationTable) -> np.ndarray:
+    """ [g, x] is the conjugate of g by x, x g x^-1 """
+
+    # x g is table[g, x] (g then x), and x^-1 then x g is table[x^-1, x g], which is x g x^-1
+    return table.table[table.inverses[np.newaxis, :], table.table]
+
+
+def conjugacy_classes(table: MultiplicationTable) -> list[np.ndarray]:
+    """ Conjugacy classes of the group, sorted by their smallest element, with the identity's first """
+    return _cosets_from_labels(table, np.min(conjugation_table(table), axis=1))
+
+
+def normalizer(table: MultiplicationTable, subgroup: Iterable[int]) -> np.ndarray:
+    """ Sorted elements g of the group with g H g^-1 = H """
+
+    subgroup = np.asarray(list(subgroup), dtype=np.int64)
+
+    members = np.zeros(len(table), dtype=bool)
+    members[subgroup] = True
+
+    return np.nonzero(np.all(members[conjugation_table(table)[subgroup, :]], axis=0))[0]
+
+
+def is_normal(table: MultiplicationTable, subgroup: Iterable[int]) -> bool:
+    """ Whether a subgroup is normal, i.e. its normalizer is the whole group """
+    return len(normalizer(table, subgroup)) == len(table)
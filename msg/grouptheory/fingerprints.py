@@ -0,0 +1,136 @@
+""" Identifying magnetic space groups from their operations
+
+The fingerprint of a set of operations is a hash of the sorted packed keys of every
+operation in the group they generate, together with the lattice translations, with
+translations modulo 1. It doesn't depend on the order of the operations, or on whether
+they are all of the group or just generators, so looking up a fingerprint in an index of
+every group in the database identifies the group (in this particular setting).
+
+The index for the database is precomputed when it is built, and stored in
+msg/data/fingerprints.bin; if that file isn't there it is computed on demand.
+"""
+
+from hashlib import blake2b
+from importlib import resources
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from msg.array_file import read_arrays, write_arrays
+from msg.operations import MagneticOperation, FastMagneticOperation, TranslationType
+from msg.point_operations import point_operation_from_index
+from msg.grouptheory.closures import _breadth_first_closure
+
+if TYPE_CHECKING:
+    from msg.groups import Group
+
+FINGERPRINT_SIZE = 16 # bytes
+
+
+def operator_fingerprint(
+        operators: list[MagneticOperation],
+        lattice_vectors: list[TranslationType] = (),
+        max_size: int = 100_000) -> bytes:
+    """ Fingerprint of the group generated by some operators and lattice translations
+
+    :param operators: generators of the group, or all of it
+    :param lattice_vectors: translations without time reversal to add to the generators
+    :raises ValueError: if the operators are not magnetic space group operations
+    """
+
+    generators = [FastMagneticOperation.from_model(operator) for operator in operators]
+    generators += [FastMagneticOperation.from_model(MagneticOperation(
+                        point_operation=point_operation_from_index(0),
+                        translation=tuple(x % 1 for x in vector),
+                        time_reversal=1))
+                   for vector in lattice_vectors]
+
+    identity = FastMagneticOperation.from_numpy(np.eye(3), np.zeros(3), 1)
+    keys = np.array(sorted(operation.key for operation in _breadth_first_closure(identity, generators, max_size)),
+                    dtype=np.int64)
+
+    return blake2b(keys.tobytes(), digest_size=FINGERPRINT_SIZE).digest()
+
+
+def group_fingerprint(group: "Group") -> bytes:
+    """ Fingerprint of a group in the database, from its BNS operators and lattice """
+    return operator_fingerprint(group.bns.operators, group.bns.lattice_vectors)
+
+
+class FingerprintIndex:
+    """ Lookup from fingerprints to group numbers """
+
+    def __init__(self, fingerprints: np.ndarray, numbers: np.ndarray):
+        """
+        :param fingerprints: (n, FINGERPRINT_SIZE) uint8 array
+        :param numbers: (n,) group numbers
+        """
+
+        self._lookup: dict[bytes, list[int]] = {}
+        for fingerprint, number in zip(fingerprints, numbers):
+            self._lookup.setdefault(fingerprint.tobytes(), []).append(int(number))
+
+    def __len__(self) -> int:
+        return len(self._lookup)
+
+    @staticmethod
+    def from_groups(groups: list["Group"]) -> "FingerprintIndex":
+        """ Work out the index for a list of groups """
+        fingerprints = np.array([np.frombuffer(group_fingerprint(group), dtype=np.uint8) for group in groups],
+                                dtype=np.uint8).reshape(-1, FINGERPRINT_SIZE)
+
+        return FingerprintIndex(fingerprints, np.array([group.number for group in groups]))
+
+    def lookup(self, fingerprint: bytes) -> list[int]:
+        """ Numbers of the groups with this fingerprint """
+        return list(self._lookup.get(fingerprint, []))
+
+    def identify(self, operators: list[MagneticOperation], lattice_vectors: list[TranslationType] = ()) -> list[int]:
+        """ Numbers of the groups generated by some operators and lattice translations (see operator_fingerprint) """
+        return self.lookup(operator_fingerprint(operators, lattice_vectors))
+
+
+#
+# Precomputed index
+#
+
+def write_fingerprint_index(groups: list["Group"], filename: str):
+    """ Precompute the fingerprints of a list of groups and save them """
+
+    arrays = {
+        "fingerprints": np.array([np.frombuffer(group_fingerprint(group), dtype=np.uint8) for group in groups],
+                                 dtype=np.uint8).reshape(-1, FINGERPRINT_SIZE),
+        "numbers": np.array([group.number for group in groups], dtype=np.int16)}
+
+    write_arrays(filename, arrays)
+
+
+_database_index: FingerprintIndex | None = None
+
+
+def database_fingerprint_index() -> FingerprintIndex:
+    """ Fingerprint index of every group in the database, loaded from msg/data/fingerprints.bin
+    if it is there, and worked out from the database otherwise
+    """
+
+    global _database_index
+
+    if _database_index is None:
+        path = resources.files("msg.data").joinpath("fingerprints.bin")
+
+        if path.is_file():
+            with resources.as_file(path) as filename:
+                arrays, _ = read_arrays(str(filename))
+
+            _database_index = FingerprintIndex(arrays["fingerprints"], arrays["numbers"])
+
+        else:
+            from msg.load_database import spacegroups
+            _database_index = FingerprintIndex.from_groups(spacegroups)
+
+    return _database_index
+
+
+def identify_group(operators: list[MagneticOperation], lattice_vectors: list[TranslationType] = ()) -> list[int]:
+    """ Numbers of the groups in the database generated by some operators and lattice translations """
+    return database_fingerprint_index().identify(operators, lattice_vectors)
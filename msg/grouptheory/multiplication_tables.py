@@ -0,0 +1,238 @@
+""" Multiplication (Cayley) tables of magnetic space groups, modulo their lattice
+
+Composing operators from a known group then becomes an integer array lookup.
+Tables for every group in the database are precomputed when it is built, and stored
+in msg/data/multiplication_tables.bin; if that file isn't there they are computed on demand.
+The stored tables are found by a hash of the operators in order and the lattice, as the
+table is over the operator indices and is only right for operators in that order.
+"""
+
+from dataclasses import dataclass
+from fractions import Fraction
+from hashlib import blake2b
+from importlib import resources
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from msg.array_file import read_arrays, write_arrays
+from msg.operations import MagneticOperation, FastMagneticOperation, TranslationType, TRANSLATION_DENOMINATOR, \
+    integer_operation_arrays, compose_integer_arrays, integer_operation_keys
+
+if TYPE_CHECKING:
+    from msg.groups import Group
+
+
+@dataclass(frozen=True)
+class MultiplicationTable:
+    """ Multiplication table over the indices of a list of operators
+
+    table[i, j] is the index of operators[i].and_then(operators[j]), up to a lattice translation,
+    inverses[i] is the index of the inverse of operators[i], and identity is the index of the identity
+    """
+
+    table: np.ndarray
+    inverses: np.ndarray
+    identity: int
+
+    def __len__(self) -> int:
+        return self.table.shape[0]
+
+    def compose(self, first: int, second: int) -> int:
+        """ Index of operator `first` followed by operator `second` """
+        return int(self.table[first, second])
+
+    def inverse(self, index: int) -> int:
+        """ Index of the inverse of an operator """
+        return int(self.inverses[index])
+
+
+def centering_translations(lattice_vectors: list[TranslationType], period: int = 1) -> list[TranslationType]:
+    """ All translations, modulo `period`, that can be made from the lattice vectors (including zero) """
+
+    zero = (Fraction(0), Fraction(0), Fraction(0))
+    vectors = [tuple(x % period for x in vector) for vector in lattice_vectors]
+
+    found = {zero}
+    to_check = [zero]
+    while to_check:
+        translation = to_check.pop()
+        for vector in vectors:
+            new_translation = tuple((a + b) % period for a, b in zip(translation, vector))
+            if new_translation not in found:
+                found.add(new_translation)
+                to_check.append(new_translation)
+
+    return sorted(found)
+
+
+def _reduced_key(operator: FastMagneticOperation, centerings: list[tuple[int, int, int]]) -> int:
+    """ Key that is the same for operators that differ by a lattice translation
+
+    :param centerings: centering translations, as numerators over TRANSLATION_DENOMINATOR
+    """
+
+    return min(
+        FastMagneticOperation(
+            operator.point_operation_index,
+            tuple((t + c) % TRANSLATION_DENOMINATOR for t, c in zip(operator.translation_numerators, centering)),
+            operator.time_reversal).key
+        for centering in centerings)
+
+
+def _reduced_keys(rotations: np.ndarray, translations: np.ndarray, time_reversals: np.ndarray,
+                  centerings: np.ndarray) -> np.ndarray:
+    """ Array version of _reduced_key, for integer operation arrays of any leading shape """
+
+    shifted = (translations[np.newaxis, ...] + centerings.reshape((-1,) + (1,) * (translations.ndim - 1) + (3,))) \
+        % TRANSLATION_DENOMINATOR
+
+    return np.min(integer_operation_keys(
+        np.broadcast_to(rotations, shifted.shape[:-1] + (3, 3)), shifted,
+        np.broadcast_to(time_reversals, shifted.shape[:-1])), axis=0)
+
+
+def build_multiplication_table(
+        operators: list[MagneticOperation],
+        lattice_vectors: list[TranslationType]) -> MultiplicationTable:
+    """ Work out the multiplication table for a group
+
+    All the products are worked out at once, as integer arrays, and found in the group by their keys
+
+    :param operators: operators of the group, distinct modulo the lattice
+    :param lattice_vectors: lattice (centering) translations of the group
+    :raises ValueError: if the operators are not a group modulo the lattice
+    """
+
+    centerings = np.array([[int(x * TRANSLATION_DENOMINATOR) for x in centering]
+                           for centering in centering_translations(lattice_vectors)], dtype=np.int64)
+
+    # Check they can all be represented, as FastMagneticOperation.from_model does
+    for operator in operators:
+        FastMagneticOperation.from_model(operator)
+
+    arrays = integer_operation_arrays(operators)
+    keys = _reduced_keys(*arrays, centerings)
+
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    duplicates = np.nonzero(sorted_keys[1:] == sorted_keys[:-1])[0]
+    if duplicates.size:
+        first, second = sorted(order[duplicates[0]:duplicates[0] + 2])
+        raise ValueError(f"Operators {first} and {second} are the same modulo the lattice")
+
+    def find(product_keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """ Indices of some keys in the operators, and whether they were found """
+        positions = np.minimum(np.searchsorted(sorted_keys, product_keys), len(sorted_keys) - 1)
+        return order[positions], sorted_keys[positions] == product_keys
+
+    # [i, j] is operators[i].and_then(operators[j])
+    table, found = find(_reduced_keys(*compose_integer_arrays(arrays, arrays), centerings))
+
+    if not np.all(found):
+        i, j = np.argwhere(~found)[0]
+        raise ValueError(f"Operators are not closed: {operators[i].text_form} then {operators[j].text_form} "
+                         f"is not in the group")
+
+    identity, found = find(_reduced_keys(
+        np.eye(3, dtype=np.int64), np.zeros(3, dtype=np.int64), np.ones((), dtype=np.int64), centerings))
+
+    if not found:
+        raise ValueError("Operators do not contain the identity")
+
+    table = table.astype(np.int16)
+    inverses = np.argmax(table == identity, axis=1).astype(np.int16)
+
+    return MultiplicationTable(table=table, inverses=inverses, identity=int(identity))
+
+
+#
+# Precomputed tables
+#
+
+TABLE_KEY_SIZE = 16 # bytes
+
+
+def table_key(operators: list[MagneticOperation], lattice_vectors: list[TranslationType]) -> bytes:
+    """ Hash of the packed keys of the operators, in order, and of the centering translations
+
+    Operators that differ only by a whole lattice translation have the same key, but reordering
+    them or changing the setting gives a different one.
+
+    :raises ValueError: if a translation is not a multiple of 1/TRANSLATION_DENOMINATOR
+    """
+
+    rotations, translations, time_reversals = integer_operation_arrays(operators)
+    keys = integer_operation_keys(rotations, translations % TRANSLATION_DENOMINATOR, time_reversals)
+
+    centerings = np.array([[int(x * TRANSLATION_DENOMINATOR) for x in centering]
+                           for centering in centering_translations(lattice_vectors)], dtype=np.int64)
+
+    return blake2b(keys.tobytes() + centerings.tobytes(), digest_size=TABLE_KEY_SIZE).digest()
+
+
+def write_multiplication_tables(groups: list["Group"], filename: str):
+    """ Precompute the BNS multiplication tables of a list of groups and save them """
+
+    tables = [build_multiplication_table(group.bns.operators, group.bns.lattice_vectors) for group in groups]
+
+    sizes = [len(table) for table in tables]
+
+    arrays = {
+        "keys": np.array([np.frombuffer(table_key(group.bns.operators, group.bns.lattice_vectors), dtype=np.uint8)
+                          for group in groups], dtype=np.uint8).reshape(-1, TABLE_KEY_SIZE),
+        "op_offsets": np.cumsum([0] + sizes, dtype=np.int32),
+        "table_offsets": np.cumsum([0] + [size*size for size in sizes], dtype=np.int32),
+        "tables": np.concatenate([table.table.reshape(-1) for table in tables]).astype(np.int16),
+        "inverses": np.concatenate([table.inverses for table in tables]).astype(np.int16),
+        "identity": np.array([table.identity for table in tables], dtype=np.int16)}
+
+    write_arrays(filename, arrays)
+
+
+_precomputed: dict[str, np.ndarray] | None = None
+_precomputed_index: dict[bytes, int] = {}
+
+
+def _load_precomputed(filename: str):
+    """ Read a file written by write_multiplication_tables, and index the tables by their keys """
+
+    global _precomputed
+
+    _precomputed, _ = read_arrays(filename)
+
+    _precomputed_index.clear()
+    for index, key in enumerate(_precomputed["keys"]):
+        _precomputed_index[key.tobytes()] = index
+
+
+def precomputed_multiplication_table(
+        operators: list[MagneticOperation],
+        lattice_vectors: list[TranslationType]) -> MultiplicationTable | None:
+    """ Multiplication table for operators as they are in the database, None if there isn't one available """
+
+    if _precomputed is None:
+        path = resources.files("msg.data").joinpath("multiplication_tables.bin")
+        if not path.is_file():
+            return None
+
+        with resources.as_file(path) as filename:
+            _load_precomputed(str(filename))
+
+    try:
+        index = _precomputed_index.get(table_key(operators, lattice_vectors))
+    except ValueError:
+        return None # Not representable, so not from the database
+
+    if index is None:
+        return None
+
+    op_start, op_end = _precomputed["op_offsets"][index:index+2]
+    table_start, table_end = _precomputed["table_offsets"][index:index+2]
+    n = op_end - op_start
+
+    return MultiplicationTable(
+        table=_precomputed["tables"][table_start:table_end].reshape(n, n),
+        inverses=_precomputed["inverses"][op_start:op_end],
+        identity=int(_precomputed["identity"][index]))
@@ -0,0 +1,301 @@
+""" Subgroups of the groups in the database, up to axis permutations and origin shifts
+
+Groups are compared as sets of operations in the unit cell (see lattice_expansion_arrays),
+by their packed keys. For every key there is a bit mask of the groups that contain it, so the
+groups containing all of a group's operations (its supergroups) are the AND of the masks of its
+keys, rather than a search over pairs.
+
+A subgroup is usually in the database in some other setting than the one it has inside the
+group, so each group is also compared after changes of setting that keep the unit cell: the six
+permutations of the axes (made right handed), combined with origin shifts by multiples of 1/4.
+Each different set of operations found this way is a separate relation, so e.g. Pm'mm is a
+subgroup of Pmmm1' three times, as Pm'mm, Pmm'm and Pmmm', and the relation records the
+transformation taking the subgroup's coordinates to the group's. Subgroups that need any other
+change of setting (a different cell, or a hexagonal one with permuted axes) are not found, so
+these relations are not the whole subgroup lattice, and whether a relation is maximal can't be
+worked out from them. Translationengleiche subgroups have the same lattice of (non time reversed)
+translations as the group.
+
+The relations are precomputed when the database is built, and stored in
+msg/data/subgroups.bin; if that file isn't there they are computed on demand.
+"""
+
+from dataclasses import dataclass
+from fractions import Fraction
+from importlib import resources
+from itertools import permutations, product
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from msg.array_file import read_arrays, write_arrays
+from msg.operations import integer_operation_keys, TRANSLATION_DENOMINATOR
+from msg.grouptheory.closures import lattice_expansion_arrays
+from msg.setting_transforms import SettingTransform
+
+if TYPE_CHECKING:
+    from msg.groups import Group
+
+
+@dataclass(frozen=True)
+class SubgroupRelation:
+    """ `subgroup` is a subgroup of `group` (both UNI numbers), of index `index`, when its
+    coordinates are transformed by `transform` into those of `group`
+    """
+
+    group: int
+    subgroup: int
+    index: int
+    translationengleiche: bool
+    transform: SettingTransform
+
+
+def _setting_changes() -> tuple[np.ndarray, np.ndarray]:
+    """ Axis permutations, with a sign change for the odd ones so they are rotations, and origin shifts
+    by multiples of 1/4, as numerators over TRANSLATION_DENOMINATOR, both with the identity first
+    """
+
+    matrices = []
+    for permutation in permutations(range(3)):
+        matrix = np.eye(3, dtype=np.int64)[list(permutation)]
+        matrices.append(matrix * int(np.rint(np.linalg.det(matrix))))
+
+    origins = np.array(list(product(range(4), repeat=3)), dtype=np.int64) * (TRANSLATION_DENOMINATOR // 4)
+
+    return np.array(matrices), origins
+
+
+_matrices, _origins = _setting_changes()
+
+
+def _cell_arrays(group: "Group") -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Integer arrays of all the BNS operations in the unit cell """
+    return lattice_expansion_arrays(group.bns.operators, group.bns.lattice_vectors)
+
+
+def _cell_keys(group: "Group") -> tuple[np.ndarray, int]:
+    """ Keys of all the BNS operations in the unit cell, and how many are pure translations """
+    return _keys(*_cell_arrays(group))
+
+
+def _keys(rotations: np.ndarray, translations: np.ndarray, time_reversals: np.ndarray) -> tuple[np.ndarray, int]:
+    """ Keys of some integer operation arrays, and how many of them are pure translations """
+
+    is_translation = np.all(rotations == np.eye(3, dtype=np.int64), axis=(1, 2)) & (time_reversals == 1)
+
+    return integer_operation_keys(rotations, translations, time_reversals), int(np.sum(is_translation))
+
+
+def _transformed_keys(
+        rotations: np.ndarray, translations: np.ndarray, time_reversals: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """ Keys of the operations after permuting the axes with `matrix` and shifting the origin by each of _origins
+
+    :returns: (O, G) keys, for O origins and G operations
+    :raises ValueError: if the permuted operations aren't all standard point operations (hexagonal ones)
+    """
+
+    # The matrices are orthogonal, so their inverses are their transposes
+    new_rotations = matrix @ rotations @ matrix.T
+
+    new_translations = (translations @ matrix.T)[np.newaxis, :, :] + _origins[:, np.newaxis, :]
+    new_translations -= np.einsum("gab,ob->oga", new_rotations, _origins)
+    new_translations %= TRANSLATION_DENOMINATOR
+
+    return integer_operation_keys(new_rotations, new_translations, time_reversals)
+
+
+def subgroup_relations(groups: list["Group"]) -> list[SubgroupRelation]:
+    """ All the containments between a list of groups, up to axis permutations and origin shifts,
+    with the groups containing them in the settings they are given in
+    """
+
+    numbers = [group.number for group in groups]
+    arrays = [_cell_arrays(group) for group in groups]
+    keys, n_translations = zip(*(_keys(*group_arrays) for group_arrays in arrays)) if groups else ((), ())
+
+    # For every operation, a bit mask of the groups that have it
+    masks: dict[int, int] = {}
+    for i, group_keys in enumerate(keys):
+        bit = 1 << i
+        for key in group_keys.tolist():
+            masks[key] = masks.get(key, 0) | bit
+
+    # Setting changes of each group, and the groups that have all of their operations
+    everything = (1 << len(groups)) - 1
+    found: dict[tuple[int, int], list[tuple[int, int]]] = {}
+    seen: dict[tuple[int, int], set[bytes]] = {}
+    for i, group_arrays in enumerate(arrays):
+        others = everything & ~(1 << i)
+
+        for matrix_index, matrix in enumerate(_matrices):
+            try:
+                transformed = _transformed_keys(*group_arrays, matrix)
+            except ValueError:
+                continue
+
+            # Many origin shifts give the same operations, only check each different set once
+            transformed = np.sort(transformed, axis=1)
+            first: dict[bytes, int] = {}
+            for origin_index, transformed_keys in enumerate(transformed):
+                first.setdefault(transformed_keys.tobytes(), origin_index)
+
+            for operations, origin_index in first.items():
+                mask = others
+                for key in transformed[origin_index].tolist():
+                    mask &= masks.get(key, 0)
+                    if not mask:
+                        break
+
+                for j in _bits(mask):
+                    if len(keys[i]) == len(keys[j]):
+                        continue # The same operations under two numbers, not a proper subgroup
+
+                    # Only one relation for each different set of operations, other axis permutations can repeat them
+                    if operations not in seen.setdefault((j, i), set()):
+                        seen[(j, i)].add(operations)
+                        found.setdefault((j, i), []).append((matrix_index, origin_index))
+
+    transforms: dict[tuple[int, int], SettingTransform] = {}
+    relations = []
+    for j, i in sorted(found):
+        for transform_index in found[(j, i)]:
+            if transform_index not in transforms:
+                matrix_index, origin_index = transform_index
+                transforms[transform_index] = SettingTransform.from_matrix(
+                    _matrices[matrix_index],
+                    [Fraction(int(x), TRANSLATION_DENOMINATOR) for x in _origins[origin_index]])
+
+            relations.append(SubgroupRelation(
+                group=numbers[j],
+                subgroup=numbers[i],
+                index=len(keys[j]) // len(keys[i]),
+                translationengleiche=n_translations[i] == n_translations[j],
+                transform=transforms[transform_index]))
+
+    return relations
+
+
+def _bits(mask: int) -> list[int]:
+    """ Positions of the set bits of an integer """
+
+    output = []
+    while mask:
+        lowest = mask & -mask
+        output.append(lowest.bit_length() - 1)
+        mask ^= lowest
+
+    return output
+
+
+class SubgroupGraph:
+    """ Subgroups and supergroups of each group (see subgroup_relations), looked up by UNI number """
+
+    def __init__(self, relations: list[SubgroupRelation]):
+        self.relations = relations
+
+        self._subgroups: dict[int, list[SubgroupRelation]] = {}
+        self._supergroups: dict[int, list[SubgroupRelation]] = {}
+
+        for relation in relations:
+            self._subgroups.setdefault(relation.group, []).append(relation)
+            self._supergroups.setdefault(relation.subgroup, []).append(relation)
+
+    def __len__(self) -> int:
+        return len(self.relations)
+
+    @staticmethod
+    def from_groups(groups: list["Group"]) -> "SubgroupGraph":
+        """ Work out the relations between a list of groups """
+        return SubgroupGraph(subgroup_relations(groups))
+
+    @staticmethod
+    def from_arrays(arrays: dict[str, np.ndarray]) -> "SubgroupGraph":
+        """ Inverse of `arrays` """
+
+        transforms = {}
+        relations = []
+        for group, subgroup, index, translationengleiche, matrix, origin in zip(
+                arrays["groups"].tolist(), arrays["subgroups"].tolist(), arrays["indices"].tolist(),
+                arrays["translationengleiche"].tolist(), arrays["matrices"].tolist(), arrays["origins"].tolist()):
+
+            # Only a few different ones, so share them
+            transform_key = (tuple(map(tuple, matrix)), tuple(origin))
+            if transform_key not in transforms:
+                transforms[transform_key] = SettingTransform.from_matrix(
+                    matrix, [Fraction(numerator, TRANSLATION_DENOMINATOR) for numerator in origin])
+
+            relations.append(SubgroupRelation(
+                group=group,
+                subgroup=subgroup,
+                index=index,
+                translationengleiche=bool(translationengleiche),
+                transform=transforms[transform_key]))
+
+        return SubgroupGraph(relations)
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        """ The relations as arrays, for saving with write_arrays """
+
+        return {
+            "groups": np.array([relation.group for relation in self.relations], dtype=np.int16),
+            "subgroups": np.array([relation.subgroup for relation in self.relations], dtype=np.int16),
+            "indices": np.array([relation.index for relation in self.relations], dtype=np.int16),
+            "translationengleiche": np.array(
+                [relation.translationengleiche for relation in self.relations], dtype=np.int8),
+            "matrices": np.array([relation.transform.matrix for relation in self.relations],
+                                 dtype=np.int8).reshape(-1, 3, 3),
+            "origins": np.array([[x * TRANSLATION_DENOMINATOR for x in relation.transform.origin]
+                                 for relation in self.relations], dtype=np.int8).reshape(-1, 3)}
+
+    def subgroups(self, number: int) -> list[SubgroupRelation]:
+        """ Relations to the subgroups of a group """
+        return self._subgroups.get(number, [])
+
+    def supergroups(self, number: int) -> list[SubgroupRelation]:
+        """ Relations to the supergroups of a group """
+        return self._supergroups.get(number, [])
+
+
+#
+# Precomputed graph
+#
+
+def write_subgroup_graph(groups: list["Group"], filename: str):
+    """ Work out the subgroup relations between a list of groups and save them """
+    write_arrays(filename, SubgroupGraph.from_groups(groups).arrays())
+
+
+_database_graph: SubgroupGraph | None = None
+
+
+def database_subgroup_graph() -> SubgroupGraph:
+    """ Subgroup relations between all the groups in the database, loaded from msg/data/subgroups.bin
+    if it is there, and worked out from the database otherwise
+    """
+
+    global _database_graph
+
+    if _database_graph is None:
+        path = resources.files("msg.data").joinpath("subgroups.bin")
+
+        if path.is_file():
+            with resources.as_file(path) as filename:
+                arrays, _ = read_arrays(str(filename))
+
+            _database_graph = SubgroupGraph.from_arrays(arrays)
+
+        else:
+            from msg.load_database import spacegroups
+            _database_graph = SubgroupGraph.from_groups(spacegroups)
+
+    return _database_graph
+
+
+def subgroups_of(number: int) -> list[SubgroupRelation]:
+    """ Relations to the subgroups of a group in the database (see SubgroupGraph.subgroups) """
+    return database_subgroup_graph().subgroups(number)
+
+
+def supergroups_of(number: int) -> list[SubgroupRelation]:
+    """ Relations to the supergroups of a group in the database (see SubgroupGraph.supergroups) """
+    return database_subgroup_graph().supergroups(number)
@@ -1,9 +1,110 @@
-from msg.groups import MagneticSpaceGroupData
+""" Lazy loading of the magnetic space group database
 
+Nothing is read when this module is imported. The json is read on the first lookup,
+and each group is only validated as a pydantic model the first time it is accessed.
+"""
+
+import json
+from collections.abc import Sequence
 from importlib import resources
 
-with resources.open_text("msg.data", "database.json") as file:
-    data = file.read()
+from msg.group_index import GroupIndex
+from msg.groups import Group, MagneticSpaceGroupData
+
+
+class LazyGroupList(Sequence):
+    """ Sequence of magnetic space groups, each one validated on first access """
+
+    def __init__(self, package: str = "msg.data", filename: str = "database.json"):
+        self._package = package
+        self._filename = filename
+
+        self._raw: list[dict] | None = None
+        self._groups: list[Group | None] = []
+
+        self._index: GroupIndex | None = None
+
+    def _raw_groups(self) -> list[dict]:
+        """ Unvalidated group data, read from the json file on first use """
+
+        if self._raw is None:
+            with resources.files(self._package).joinpath(self._filename).open("r") as file:
+                self._raw = json.load(file)["groups"]
+
+            self._groups = [None] * len(self._raw)
+
+        return self._raw
+
+    @property
+    def index(self) -> GroupIndex:
+        """ Number and symbol lookups, built from the raw data without validating any groups """
+        if self._index is None:
+            self._index = GroupIndex.from_raw(self._raw_groups())
+
+        return self._index
+
+    def __len__(self) -> int:
+        return len(self._raw_groups())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        raw = self._raw_groups()
+
+        group = self._groups[index]
+        if group is None:
+            group = Group.model_validate(raw[index])
+            self._groups[index] = group
+
+        return group
+
+    @property
+    def loaded_count(self) -> int:
+        """ Number of groups that have been validated so far """
+        return sum(group is not None for group in self._groups)
+
+    def by_number(self, number: int) -> Group:
+        """ Get a group by its sequential (UNI) number, 1 to 1651 """
+        return self[self.index.by_number[number]]
+
+    def by_bns_number(self, number: tuple[int, int]) -> Group:
+        """ Get a group by its BNS number, e.g. (62, 448) """
+        return self[self.index.by_bns_number[tuple(number)]]
+
+    def by_og_number(self, number: tuple[int, int, int]) -> Group:
+        """ Get a group by its OG number, e.g. (62, 10, 508) """
+        return self[self.index.by_og_number[tuple(number)]]
+
+    def by_parent_number(self, number: int) -> list[Group]:
+        """ All the magnetic groups of a (non-magnetic) space group, by its number, 1 to 230 """
+        return [self[index] for index in self.index.by_parent_number.get(number, [])]
+
+    def by_symbol(self, symbol: str) -> Group:
+        """ Get a group by its UNI, BNS or OG symbol, ignoring whitespace and underscores if needed """
+        index = self.index.lookup_symbol(symbol)
+        if index is None:
+            raise KeyError(symbol)
+
+        return self[index]
+
+    def search(self, text: str, limit: int = 10) -> list[Group]:
+        """ Groups whose symbols match `text`, exactly, by prefix, or approximately, best first """
+        return [self[index] for index in self.index.search(text, limit)]
+
+
+spacegroups = LazyGroupList()
+
+_database: MagneticSpaceGroupData | None = None
+
+
+def __getattr__(name: str):
+    # The full validated database is only built if someone actually asks for it
+    global _database
 
-database = MagneticSpaceGroupData.model_validate_json(data)
+    if name == "database":
+        if _database is None:
+            _database = MagneticSpaceGroupData(groups=list(spacegroups))
+        return _database
 
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,52 @@
+""" Symmetry constraints on magnetic moments
+
+Moments are axial vectors, so an operation (R, t, time_reversal) acts on them as
+det(R) * time_reversal * R. Averaging this over the stabilizer of a site gives a projector onto
+the moments the site allows, and constraining moments is then a single matrix multiply.
+"""
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+from msg.wyckoff import WyckoffExpansion, cell_operation_arrays, axial_matrices, fixing_operations
+
+if TYPE_CHECKING:
+    from msg.groups import BNSGroup
+
+
+def moment_projector(rotations: np.ndarray, time_reversals: np.ndarray) -> np.ndarray:
+    """ Projector onto the moments left unchanged by a group of operations, e.g. a site stabilizer """
+    return np.mean(axial_matrices(rotations, time_reversals), axis=0)
+
+
+def site_moment_projectors(expansion: WyckoffExpansion) -> np.ndarray:
+    """ (M, 3, 3) projectors onto the moments allowed at each of the equivalent positions of a site
+
+    For the copy made by operation g, the stabilizer is conjugated by g, and so is the projector
+    """
+
+    axial = (np.linalg.det(expansion.coset_rotations)[:, np.newaxis, np.newaxis] * expansion.coset_rotations)
+
+    # Time reversal of the coset representative cancels out in the conjugation
+    return axial @ expansion.moment_projection @ np.linalg.inv(axial)
+
+
+def point_moment_projectors(group: "BNSGroup", points: ArrayLike, tolerance: float = 1e-4) -> np.ndarray:
+    """ (N, 3, 3) projectors onto the moments allowed at each of an (N, 3) array of positions,
+    from the operations that fix each one
+    """
+
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    rotations, translations, time_reversals = cell_operation_arrays(group)
+
+    fixed = fixing_operations(rotations, translations, points, tolerance).astype(float)
+    axial = axial_matrices(rotations, time_reversals).reshape(-1, 9)
+
+    return ((fixed @ axial) / np.sum(fixed, axis=1)[:, np.newaxis]).reshape(-1, 3, 3)
+
+
+def apply_projectors(projectors: np.ndarray, moments: ArrayLike) -> np.ndarray:
+    """ Project each of an (N, 3) array of moments with its own projector from an (N, 3, 3) array """
+    return np.einsum("nab,nb->na", projectors, np.asarray(moments, dtype=float).reshape(-1, 3))
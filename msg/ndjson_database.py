@@ -0,0 +1,60 @@
+""" Newline delimited json form of the database, one group per line
+
+Groups are written as they come, and read back one at a time, so neither side ever holds
+the whole database or its serialised form in memory. Each line is a complete Group, which
+also makes the file easy to grep and split into shards.
+"""
+
+import json
+from collections.abc import Iterable, Iterator
+from importlib import resources
+from typing import TextIO
+
+from msg.groups import Group
+
+
+def write_ndjson(groups: Iterable[Group], filename: str) -> int:
+    """ Write groups to a file, one per line, as they are produced by `groups`
+
+    :returns: the number of groups written
+    """
+
+    count = 0
+    with open(filename, "w") as file:
+        for group in groups:
+            file.write(group.model_dump_json())
+            file.write("\n")
+            count += 1
+
+    return count
+
+
+def iter_ndjson_raw(file: TextIO) -> Iterator[dict]:
+    """ Unvalidated group data from each non-blank line of an open file """
+
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_ndjson(file: str | TextIO) -> Iterator[Group]:
+    """ Groups from a file written by write_ndjson, validated one line at a time
+
+    :param file: filename, or an open text file
+    """
+
+    if isinstance(file, str):
+        with open(file, "r") as opened:
+            yield from iter_ndjson(opened)
+        return
+
+    for line in file:
+        if line.strip():
+            yield Group.model_validate_json(line)
+
+
+def iter_database_groups(package: str = "msg.data", filename: str = "database.ndjson") -> Iterator[Group]:
+    """ Stream the groups of the packaged database """
+
+    with resources.files(package).joinpath(filename).open("r") as file:
+        yield from iter_ndjson(file)
@@ -1,12 +1,61 @@
 from fractions import Fraction
+from functools import cached_property
 
 import numpy as np
 from numpy.typing import ArrayLike
 from pydantic import BaseModel, field_validator
 
+from msg.point_operations import POINT_OPERATIONS, POINT_OPERATION_PRODUCTS, \
+    point_operation_index, point_operation_from_index, point_operation_indices
+
 PointOperationType = tuple[tuple[int, int, int], tuple[int, int, int], tuple[int, int, int]]
 TranslationType = tuple[Fraction, Fraction, Fraction]
 
+# Translations in magnetic space groups are all multiples of 1/24 (in fact 1/12),
+# operation keys store them as numerators over this
+TRANSLATION_DENOMINATOR = 24
+
+# The OG unit cell vectors are always translations of the magnetic group, possibly with
+# time reversal, so twice them never has time reversal, and OG translations can be reduced
+# modulo 2. Reducing modulo 1 is not possible in general, as x+1 might be time reversed.
+OG_TRANSLATION_PERIOD = 2
+_translation_bits = 8
+
+def pack_operation(point_operation: PointOperationType, translation: TranslationType, time_reversal: int) -> int | None:
+    """ Pack an operation into a single integer
+
+    From most to least significant: index into POINT_OPERATIONS, the three translation
+    numerators over TRANSLATION_DENOMINATOR (8 bits each), and a time reversal bit.
+
+    :returns: the packed integer, or None if the operation can't be represented this way
+    """
+
+    try:
+        index = point_operation_index(point_operation)
+    except ValueError:
+        return None
+
+    numerators = []
+    for t in translation:
+        numerator = t * TRANSLATION_DENOMINATOR
+        if numerator != int(numerator) or not (0 <= numerator < (1 << _translation_bits)):
+            return None
+
+        numerators.append(int(numerator))
+
+    return _pack_integers(index, numerators, time_reversal)
+
+def _pack_integers(point_operation_index: int, numerators: tuple[int, int, int] | list[int], time_reversal: int) -> int:
+    """ Packed key from already validated integer parts, see pack_operation """
+
+    key = point_operation_index
+    for numerator in numerators:
+        key = (key << _translation_bits) | numerator
+
+    return (key << 1) | (time_reversal == -1)
+
+_key_fields = ("point_operation", "translation", "time_reversal")
+
 class BaseMagneticOperation(BaseModel):
     point_operation: PointOperationType
     translation: TranslationType
@@ -37,14 +86,51 @@ class BaseMagneticOperation(BaseModel):
         return value
 
 
+    @cached_property
+    def key(self) -> int | tuple:
+        """ Canonical key, used for hashing, equality and ordering
+
+        This is the packed integer form (see pack_operation) for any operation that
+        can appear in a magnetic space group, otherwise a tuple of the values
+        """
+
+        key = pack_operation(self.point_operation, self.translation, self.time_reversal)
+
+        if key is None:
+            return self.point_operation, self.translation, self.time_reversal
+
+        return key
+
+    def model_copy(self, *, update=None, deep=False):
+        copy = super().model_copy(update=update, deep=deep)
+        copy.__dict__.pop("key", None) # Don't keep the cached key of the original
+        return copy
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+
+        # The cached key depends on the fields
+        if name in _key_fields:
+            self.__dict__.pop("key", None)
+
+
     def __lt__(self, other: "BaseMagneticOperation") -> bool:
-        return (self.point_operation, self.translation, self.time_reversal) < \
-            (other.point_operation, other.translation, other.time_reversal)
+        key, other_key = self.key, other.key
+        if type(key) is type(other_key):
+            return key < other_key
+
+        # Packed keys come before tuple keys
+        return isinstance(key, int)
 
 
     def __eq__(self, other: "BaseMagneticOperation"):
-        return (self.point_operation, self.translation, self.time_reversal) == \
-            (other.point_operation, other.translation, other.time_reversal)
+        if not isinstance(other, BaseMagneticOperation):
+            return NotImplemented
+
+        return self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
 
 
     @staticmethod
@@ -162,7 +248,9 @@ class MagneticOperation(BaseMagneticOperation):
         momenta = np.array(momenta)
 
         new_points = (point_operation @ points.T + translation).T % 1
-        new_momenta = momenta * self.time_reversal
+
+        # Moments are axial vectors
+        new_momenta = (self.time_reversal * np.linalg.det(point_operation)) * (point_operation @ momenta.T).T
 
         return np.concatenate((new_points, new_momenta), axis=1)
 
@@ -187,8 +275,28 @@ class OGMagneticOperation(BaseMagneticOperation):
         # This means would be ambiguous to use __mul__ in this case. and_then makes
         #  the order of application clear
 
+        # Same as MagneticOperation.and_then, except for the translation reduction
+        new_point_operation = [[0,0,0],[0,0,0],[0,0,0]]
+        for i in range(3):
+            for j in range(3):
+                for k in range(3):
+                    new_point_operation[i][j] += other.point_operation[i][k] * self.point_operation[k][j]
+
+        new_point_operation = tuple(tuple(x) for x in new_point_operation)
+
+        # Translations can be outside [0, 1) in OG, only reduce by the part that is
+        # definitely a lattice translation without time reversal
+        new_translation = tuple(
+            (sum(a*b for a, b in zip(point_op_row, self.translation)) + other_trans) % OG_TRANSLATION_PERIOD
+                for point_op_row, other_trans in zip(other.point_operation, other.translation))
+
         new_time_reversal = self.time_reversal * other.time_reversal
 
+        return OGMagneticOperation(
+            point_operation=new_point_operation,
+            translation=new_translation,
+            time_reversal=new_time_reversal)
+
     @staticmethod
     def from_numpy(point_operation: np.ndarray, translation: np.ndarray,
                    time_reversal: np.ndarray, name: str | None = None) -> "OGMagneticOperation":
@@ -201,6 +309,275 @@ class OGMagneticOperation(BaseMagneticOperation):
                                  time_reversal=time_reversal,
                                  name=name)
 
+
+class FastMagneticOperation:
+    """ Lightweight immutable magnetic operation, for when lots of them are needed
+
+    This has the same and_then, __call__ and text_form as MagneticOperation, but it isn't
+    a pydantic model and does no validation. The point operation is stored as an index into
+    POINT_OPERATIONS and the translation as integer numerators over TRANSLATION_DENOMINATOR,
+    so composition is integer arithmetic and a table lookup. Convert from and to
+    MagneticOperation with from_model and to_model.
+    """
+
+    __slots__ = ("point_operation_index", "translation_numerators", "time_reversal", "key")
+
+    # Translations are reduced modulo this many multiples of 1/TRANSLATION_DENOMINATOR
+    translation_modulus = TRANSLATION_DENOMINATOR
+    model_type = MagneticOperation
+
+    def __init__(self,
+                 point_operation_index: int,
+                 translation_numerators: tuple[int, int, int],
+                 time_reversal: int):
+
+        # Slots are set directly, as __setattr__ is blocked to keep this immutable
+        _set_point_operation_index(self, point_operation_index)
+        _set_translation_numerators(self, translation_numerators)
+        _set_time_reversal(self, time_reversal)
+        _set_key(self, _pack_integers(point_operation_index, translation_numerators, time_reversal))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    @property
+    def point_operation(self) -> PointOperationType:
+        return _point_operation_tuples[self.point_operation_index]
+
+    @property
+    def translation(self) -> TranslationType:
+        return tuple(Fraction(n, TRANSLATION_DENOMINATOR) for n in self.translation_numerators)
+
+    text_form = BaseMagneticOperation.text_form
+
+    def and_then(self, other: "FastMagneticOperation") -> "FastMagneticOperation":
+        """ Composition of operations, see MagneticOperation.and_then """
+
+        new_point_operation_index = _point_operation_products[other.point_operation_index][self.point_operation_index]
+        if new_point_operation_index < 0:
+            raise ValueError(f"Composition of {self.text_form} and {other.text_form} is not a "
+                             f"crystallographic point operation")
+
+        t0, t1, t2 = self.translation_numerators
+        u0, u1, u2 = other.translation_numerators
+        a, b, c = _point_operation_tuples[other.point_operation_index]
+        modulus = self.translation_modulus
+
+        new_translation = (
+            (a[0]*t0 + a[1]*t1 + a[2]*t2 + u0) % modulus,
+            (b[0]*t0 + b[1]*t1 + b[2]*t2 + u1) % modulus,
+            (c[0]*t0 + c[1]*t1 + c[2]*t2 + u2) % modulus)
+
+        return type(self)(
+            new_point_operation_index, new_translation, self.time_reversal * other.time_reversal)
+
+    def __call__(self, points_and_momenta: ArrayLike) -> np.ndarray:
+        return MagneticOperation.__call__(self, points_and_momenta)
+
+    def __eq__(self, other: "FastMagneticOperation"):
+        if not isinstance(other, FastMagneticOperation):
+            return NotImplemented
+
+        return self.key == other.key
+
+    def __lt__(self, other: "FastMagneticOperation") -> bool:
+        return self.key < other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.text_form})"
+
+    @classmethod
+    def from_model(cls, operation: BaseMagneticOperation) -> "FastMagneticOperation":
+        """ Convert from a pydantic operation
+
+        :raises ValueError: if the operation is not a magnetic space group operation
+                            with translations in the range this class reduces to
+        """
+
+        numerators = []
+        for t in operation.translation:
+            numerator = t * TRANSLATION_DENOMINATOR
+            if numerator != int(numerator) or not (0 <= numerator < cls.translation_modulus):
+                raise ValueError(f"Cannot represent translation {operation.translation} "
+                                 f"with a denominator of {TRANSLATION_DENOMINATOR}")
+
+            numerators.append(int(numerator))
+
+        return cls(point_operation_index(operation.point_operation), tuple(numerators), operation.time_reversal)
+
+    def to_model(self, name: str | None = None) -> MagneticOperation:
+        """ Convert to the pydantic MagneticOperation (OGMagneticOperation for FastOGMagneticOperation) """
+        return self.model_type(
+            point_operation=self.point_operation,
+            translation=self.translation,
+            time_reversal=self.time_reversal,
+            name=name)
+
+    @classmethod
+    def from_numpy(cls, point_operation: np.ndarray, translation: np.ndarray, time_reversal: np.ndarray) \
+            -> "FastMagneticOperation":
+        """ Same as MagneticOperation.from_numpy, but without building a pydantic model """
+
+        point_operation, translation, time_reversal = \
+            BaseMagneticOperation._from_numpy(point_operation, translation, time_reversal)
+
+        return cls.from_model(
+            cls.model_type.model_construct(
+                point_operation=point_operation, translation=translation, time_reversal=time_reversal))
+
+class FastOGMagneticOperation(FastMagneticOperation):
+    """ FastMagneticOperation for the OG setting, translations are reduced modulo OG_TRANSLATION_PERIOD """
+
+    __slots__ = ()
+
+    translation_modulus = OG_TRANSLATION_PERIOD * TRANSLATION_DENOMINATOR
+    model_type = OGMagneticOperation
+
+_set_point_operation_index = FastMagneticOperation.point_operation_index.__set__
+_set_translation_numerators = FastMagneticOperation.translation_numerators.__set__
+_set_time_reversal = FastMagneticOperation.time_reversal.__set__
+_set_key = FastMagneticOperation.key.__set__
+
+_point_operation_tuples = [point_operation_from_index(i) for i in range(POINT_OPERATIONS.shape[0])]
+_point_operation_products = POINT_OPERATION_PRODUCTS.tolist()
+
+
+def operation_arrays(operations: list[BaseMagneticOperation]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Stack operations into arrays for applying them all at once
+
+    :returns: (G, 3, 3) rotations, (G, 3) translations and (G,) time reversals
+    """
+
+    rotations = np.array([op.point_operation for op in operations], dtype=float).reshape(-1, 3, 3)
+    translations = np.array([[float(t) for t in op.translation] for op in operations]).reshape(-1, 3)
+    time_reversals = np.array([op.time_reversal for op in operations], dtype=float)
+
+    return rotations, translations, time_reversals
+
+def apply_operation_arrays(
+        rotations: np.ndarray,
+        translations: np.ndarray,
+        time_reversals: np.ndarray,
+        points_and_momenta: ArrayLike,
+        wrap: bool = True,
+        period: int = 1) -> np.ndarray:
+    """ Apply a stack of G operations (see operation_arrays) to N points and momenta in one go
+
+    :param points_and_momenta: (N, 6) array of positions followed by momenta
+    :param wrap: put the new positions back into the unit cell
+    :param period: size of the cell positions are wrapped into, e.g. OG_TRANSLATION_PERIOD
+    :returns: (G, N, 6) array, entry [g, n] is operation g applied to point n
+    """
+
+    points_and_momenta = np.asarray(points_and_momenta, dtype=float)
+
+    output = np.empty((rotations.shape[0], points_and_momenta.shape[0], 6))
+
+    # Points: R x + t, done as x^T R^T so it is one batched matrix multiply
+    new_points = np.matmul(points_and_momenta[:, :3], rotations.transpose(0, 2, 1))
+    new_points += translations[:, np.newaxis, :]
+    if wrap:
+        new_points -= period * np.floor(new_points / period) # Much faster than % period
+
+    output[:, :, :3] = new_points
+
+    # Momenta are axial vectors, so transform with time_reversal * det(R) * R
+    axial = (time_reversals * np.linalg.det(rotations))[:, np.newaxis, np.newaxis] * rotations
+    output[:, :, 3:] = np.matmul(points_and_momenta[:, 3:], axial.transpose(0, 2, 1))
+
+    return output
+
+
+#
+# Exact operations on stacks of operations, as integer arrays
+#
+
+IntegerOperationArrays = tuple[np.ndarray, np.ndarray, np.ndarray]
+
+def integer_operation_arrays(
+        operations: list[BaseMagneticOperation],
+        denominator: int = TRANSLATION_DENOMINATOR) -> IntegerOperationArrays:
+    """ Stack operations into integer arrays, for exact batch calculations
+
+    :returns: (n, 3, 3) rotations, (n, 3) translation numerators over `denominator`, and (n,) time reversals
+    :raises ValueError: if a translation is not a multiple of 1/denominator
+    """
+
+    numerators = [[t * denominator for t in op.translation] for op in operations]
+    if any(n.denominator != 1 for row in numerators for n in row):
+        raise ValueError(f"Translations must be multiples of 1/{denominator}")
+
+    rotations = np.array([op.point_operation for op in operations], dtype=np.int64).reshape(-1, 3, 3)
+    translations = np.array([[int(n) for n in row] for row in numerators], dtype=np.int64).reshape(-1, 3)
+    time_reversals = np.array([op.time_reversal for op in operations], dtype=np.int64)
+
+    return rotations, translations, time_reversals
+
+def operations_from_integer_arrays(
+        rotations: np.ndarray,
+        translations: np.ndarray,
+        time_reversals: np.ndarray,
+        denominator: int = TRANSLATION_DENOMINATOR) -> list[MagneticOperation]:
+    """ Inverse of integer_operation_arrays, for any leading shape (the output is flattened) """
+
+    rotations = rotations.reshape(-1, 3, 3)
+    translations = translations.reshape(-1, 3)
+    time_reversals = time_reversals.reshape(-1)
+
+    return [MagneticOperation(
+                point_operation=tuple(tuple(int(x) for x in row) for row in rotation),
+                translation=tuple(Fraction(int(n), denominator) for n in translation),
+                time_reversal=int(time_reversal))
+            for rotation, translation, time_reversal in zip(rotations, translations, time_reversals)]
+
+def compose_integer_arrays(
+        first: IntegerOperationArrays,
+        second: IntegerOperationArrays,
+        denominator: int = TRANSLATION_DENOMINATOR,
+        reduce: bool = True) -> IntegerOperationArrays:
+    """ All n x m products of two stacks of operations, in one go
+
+    Entry [i, j] of the output is first[i].and_then(second[j]), calculated exactly with
+    translation numerators over `denominator`.
+
+    :param reduce: reduce the translations modulo 1, as in MagneticOperation.and_then
+    :returns: (n, m, 3, 3) rotations, (n, m, 3) translation numerators and (n, m) time reversals
+    """
+
+    first_rotations, first_translations, first_time_reversals = first
+    second_rotations, second_translations, second_time_reversals = second
+
+    rotations = second_rotations[np.newaxis, :, :, :] @ first_rotations[:, np.newaxis, :, :]
+
+    translations = np.einsum("jab,ib->ija", second_rotations, first_translations)
+    translations += second_translations[np.newaxis, :, :]
+    if reduce:
+        translations %= denominator
+
+    time_reversals = first_time_reversals[:, np.newaxis] * second_time_reversals[np.newaxis, :]
+
+    return rotations, translations, time_reversals
+
+def integer_operation_keys(rotations: np.ndarray, translations: np.ndarray, time_reversals: np.ndarray) -> np.ndarray:
+    """ Packed keys (see pack_operation) for integer operation arrays of any leading shape
+
+    Translations must be numerators over TRANSLATION_DENOMINATOR, and these keys are the
+    same as those of the corresponding MagneticOperation objects.
+    """
+
+    if np.any(translations < 0) or np.any(translations >= (1 << _translation_bits)):
+        raise ValueError("Translation numerators out of range for packing")
+
+    keys = point_operation_indices(rotations).astype(np.int64)
+    for i in range(3):
+        keys = (keys << _translation_bits) | translations[..., i]
+
+    return (keys << 1) | (time_reversals == -1)
+
+
 if __name__ == "__main__":
     MagneticOperation(rotation=((1,0,0),(0,1,0),(0,0,1)),
                       translation=(Fraction(1/2), Fraction(1/2), Fraction(1/2)),
@@ -0,0 +1,171 @@
+""" Orbits of atoms under a group, with symmetry equivalent copies merged
+
+Applying every operation to every atom gives lots of copies that are the same position modulo
+the lattice. Instead of comparing every pair, positions are put into a periodic grid of cells at
+least `tolerance` wide, so copies of the same site are either in the same cell or in neighbouring
+ones, and only neighbouring cells need comparing.
+"""
+
+from dataclasses import dataclass
+from itertools import product
+from typing import TYPE_CHECKING
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+from msg.wyckoff import cell_operation_arrays, axial_matrices
+
+if TYPE_CHECKING:
+    from msg.groups import BNSGroup
+
+# Half of the 26 neighbouring cells, the other half are covered by symmetry
+_neighbour_offsets = np.array([offset for offset in product((-1, 0, 1), repeat=3) if offset > (0, 0, 0)])
+
+# Cells are keyed by a single int64, which is at most n_cells^3, so there can't be more than 2^20 along each side
+MIN_TOLERANCE = 2 ** -20
+
+
+def merge_periodic_points(positions: ArrayLike, tolerance: float = 1e-4) -> np.ndarray:
+    """ Group together positions that are the same modulo the lattice
+
+    Positions closer than `tolerance` (in each fractional coordinate, modulo 1) are merged.
+    Positions in the same grid cell are always merged, so ones up to twice the tolerance
+    apart might be too.
+
+    :param positions: (P, 3) fractional coordinates
+    :param tolerance: at least MIN_TOLERANCE (about 1e-6)
+    :returns: (P,) label for each position, labels count up from 0 in order of first appearance
+    :raises ValueError: if the tolerance is too small
+    """
+
+    if not tolerance >= MIN_TOLERANCE:
+        raise ValueError(f"Tolerance must be at least {MIN_TOLERANCE:.3g}, got {tolerance}")
+
+    positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+    positions = positions - np.floor(positions)
+
+    n_cells = max(1, int(1 / tolerance))
+    cells = np.floor(positions * n_cells).astype(np.int64) % n_cells
+
+    keys = (cells[:, 0] * n_cells + cells[:, 1]) * n_cells + cells[:, 2]
+    cell_keys, cell_of_point = np.unique(keys, return_inverse=True)
+    cell_of_point = cell_of_point.reshape(-1)
+
+    # Points sorted by cell, so the points in each cell are a contiguous range
+    by_cell = np.argsort(cell_of_point, kind="stable")
+    cell_starts = np.searchsorted(cell_of_point[by_cell], np.arange(len(cell_keys) + 1))
+
+    # Join up neighbouring cells with any pair of positions that are close enough
+    parents = np.arange(len(cell_keys))
+
+    def root(cell):
+        while parents[cell] != cell:
+            parents[cell] = parents[parents[cell]]
+            cell = parents[cell]
+        return cell
+
+    occupied_cells = cells[by_cell[cell_starts[:-1]]]
+    cell_sizes = np.diff(cell_starts)
+
+    for offset in _neighbour_offsets:
+        neighbours = (occupied_cells + offset) % n_cells
+        neighbour_keys = (neighbours[:, 0] * n_cells + neighbours[:, 1]) * n_cells + neighbours[:, 2]
+
+        found = np.searchsorted(cell_keys, neighbour_keys)
+        found[found == len(cell_keys)] = 0
+        cells_a = np.nonzero(cell_keys[found] == neighbour_keys)[0]
+        cells_b = found[cells_a]
+
+        # Every point in each cell paired with every point in its neighbour
+        n_pairs = cell_sizes[cells_a] * cell_sizes[cells_b]
+        pair = np.repeat(np.arange(len(cells_a)), n_pairs)
+        index = np.arange(pair.size) - np.repeat(np.cumsum(n_pairs) - n_pairs, n_pairs)
+        points = by_cell[cell_starts[cells_a][pair] + index // cell_sizes[cells_b][pair]]
+        others = by_cell[cell_starts[cells_b][pair] + index % cell_sizes[cells_b][pair]]
+
+        differences = positions[others] - positions[points]
+        close = np.all(np.abs(differences - np.rint(differences)) < tolerance, axis=1)
+
+        # Only a few cells should ever need joining, so a python loop is fine here
+        for joined in np.unique(pair[close]):
+            a, b = root(cells_a[joined]), root(cells_b[joined])
+            if a != b:
+                parents[max(a, b)] = min(a, b)
+
+    cell_roots = np.array([root(cell) for cell in range(len(cell_keys))], dtype=np.int64)
+
+    # Relabel in order of first appearance
+    point_roots = cell_roots[cell_of_point]
+    _, first, inverse = np.unique(point_roots, return_index=True, return_inverse=True)
+    order = np.argsort(np.argsort(first))
+
+    return order[inverse.reshape(-1)]
+
+
+@dataclass(frozen=True)
+class Orbit:
+    """ Unique positions generated from some atoms by a group
+
+    positions and moments are (U, 3) arrays of the unique sites, and atom_indices and
+    operation_indices say which atom and which operation (an index into cell_operation_arrays)
+    each one first came from. site_indices[g, n] is the unique site that operation g takes
+    atom n to, and multiplicities[n] is the number of unique sites in the orbit of atom n.
+    """
+
+    positions: np.ndarray
+    moments: np.ndarray
+    atom_indices: np.ndarray
+    operation_indices: np.ndarray
+    site_indices: np.ndarray
+    multiplicities: np.ndarray
+
+    def __len__(self) -> int:
+        return self.positions.shape[0]
+
+
+def orbit(group: "BNSGroup", points_and_momenta: ArrayLike, tolerance: float = 1e-4) -> Orbit:
+    """ All the unique positions (and moments) generated from some atoms by a group
+
+    Moments are axial vectors, so are transformed by det(R) * time_reversal * R. The moment of
+    each unique site is the average over all the copies that land on it, so moments that the
+    site symmetry doesn't allow average away.
+
+    :param points_and_momenta: (N, 6) array of positions followed by moments
+    """
+
+    points_and_momenta = np.asarray(points_and_momenta, dtype=float).reshape(-1, 6)
+    rotations, translations, time_reversals = cell_operation_arrays(group)
+
+    n_operations = rotations.shape[0]
+    n_atoms = points_and_momenta.shape[0]
+
+    # Every operation applied to every atom, as (N, G, 3), so the copies of each atom are together
+    positions = np.einsum("gab,nb->nga", rotations, points_and_momenta[:, :3]) + translations
+    positions -= np.floor(positions)
+
+    moments = np.einsum("gab,nb->nga", axial_matrices(rotations, time_reversals), points_and_momenta[:, 3:])
+
+    labels = merge_periodic_points(positions.reshape(-1, 3), tolerance)
+    n_sites = int(labels.max()) + 1 if labels.size else 0
+
+    # First copy landing on each site
+    first = np.full(n_sites, labels.size, dtype=np.int64)
+    np.minimum.at(first, labels, np.arange(labels.size))
+
+    # Average moments over all the copies on each site
+    summed_moments = np.zeros((n_sites, 3))
+    np.add.at(summed_moments, labels, moments.reshape(-1, 3))
+    counts = np.bincount(labels, minlength=n_sites)
+
+    site_indices = labels.reshape(n_atoms, n_operations)
+
+    atom_site_pairs = np.unique(np.arange(n_atoms)[:, np.newaxis] * n_sites + site_indices)
+    multiplicities = np.bincount(atom_site_pairs // n_sites, minlength=n_atoms)
+
+    return Orbit(
+        positions=positions.reshape(-1, 3)[first],
+        moments=summed_moments / counts[:, np.newaxis],
+        atom_indices=first // n_operations,
+        operation_indices=first % n_operations,
+        site_indices=site_indices.T,
+        multiplicities=multiplicities)
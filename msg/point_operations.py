@@ -0,0 +1,115 @@
+""" Table of the point operations that appear in magnetic space groups
+
+Like the crysFML data, this is the 48 operations of m-3m (signed permutations, used by
+the cubic, tetragonal, orthorhombic, monoclinic and triclinic groups) followed by the
+24 operations of 6/mmm in the hexagonal basis. Some matrices are in both, so the table
+has 72 entries but only 64 distinct matrices; lookups give the first index.
+"""
+
+from itertools import permutations, product
+
+import numpy as np
+
+
+def _cubic_point_operations() -> list[np.ndarray]:
+    """ All 48 signed permutation matrices, identity first """
+
+    output = []
+    for permutation in permutations(range(3)):
+        for signs in product((1, -1), repeat=3):
+            matrix = np.zeros((3, 3), dtype=int)
+            for row, (column, sign) in enumerate(zip(permutation, signs)):
+                matrix[row, column] = sign
+
+            output.append(matrix)
+
+    return output
+
+
+def _hexagonal_point_operations() -> list[np.ndarray]:
+    """ The 24 operations of 6/mmm in the hexagonal basis, identity first """
+
+    six_fold = np.array([[1, -1, 0], [1, 0, 0], [0, 0, 1]])
+    two_fold = np.array([[0, 1, 0], [1, 0, 0], [0, 0, -1]])
+
+    rotations = [np.linalg.matrix_power(six_fold, i) for i in range(6)]
+    rotations += [rotation @ two_fold for rotation in rotations]
+
+    return rotations + [-rotation for rotation in rotations]
+
+
+POINT_OPERATIONS: np.ndarray = np.array(
+    _cubic_point_operations() + _hexagonal_point_operations(), dtype=np.int8)
+
+N_CUBIC_POINT_OPERATIONS = 48
+
+
+def point_operation_from_index(index: int) -> tuple[tuple[int, int, int], ...]:
+    """ Point operation, as nested tuples, for an index into POINT_OPERATIONS """
+    return tuple(tuple(int(x) for x in row) for row in POINT_OPERATIONS[index])
+
+
+_index_lookup: dict[tuple[tuple[int, int, int], ...], int] = {}
+for _index in range(POINT_OPERATIONS.shape[0]):
+    _index_lookup.setdefault(point_operation_from_index(_index), _index)
+
+
+def point_operation_index(point_operation: tuple[tuple[int, int, int], ...] | np.ndarray) -> int:
+    """ Index of a point operation in POINT_OPERATIONS
+
+    :raises ValueError: if it is not one of the crystallographic point operations
+    """
+
+    if not isinstance(point_operation, tuple):
+        point_operation = tuple(tuple(int(x) for x in row) for row in point_operation)
+
+    try:
+        return _index_lookup[point_operation]
+    except KeyError:
+        raise ValueError(f"{point_operation} is not a crystallographic point operation")
+
+
+
+def _point_operation_products() -> np.ndarray:
+    """ Index of each product of two point operations, -1 where it isn't in the table """
+
+    n = POINT_OPERATIONS.shape[0]
+    products = np.full((n, n), -1, dtype=np.int8)
+
+    for i in range(n):
+        for j in range(n):
+            product = POINT_OPERATIONS[i].astype(int) @ POINT_OPERATIONS[j]
+            products[i, j] = _index_lookup.get(tuple(tuple(int(x) for x in row) for row in product), -1)
+
+    return products
+
+
+# Entry [i, j] is the index of POINT_OPERATIONS[i] @ POINT_OPERATIONS[j]
+POINT_OPERATION_PRODUCTS: np.ndarray = _point_operation_products()
+
+
+# Lookup from a base 3 encoding of the matrix entries to index, -1 if not a point operation
+_base_3_powers = 3 ** np.arange(9)
+_base_3_lookup = np.full(3 ** 9, -1, dtype=np.int64)
+for _index in range(POINT_OPERATIONS.shape[0] - 1, -1, -1): # Backwards, so the first index wins
+    _base_3_lookup[np.dot(POINT_OPERATIONS[_index].reshape(9).astype(np.int64) + 1, _base_3_powers)] = _index
+
+
+def point_operation_indices(point_operations: np.ndarray) -> np.ndarray:
+    """ Vectorised point_operation_index, for an array of matrices with shape (..., 3, 3)
+
+    :raises ValueError: if any of them are not crystallographic point operations
+    """
+
+    point_operations = np.asarray(point_operations)
+    flat = point_operations.reshape(point_operations.shape[:-2] + (9,)).astype(np.int64)
+
+    if np.any(np.abs(flat) > 1):
+        raise ValueError("Point operation entries must be -1, 0 or 1")
+
+    indices = _base_3_lookup[(flat + 1) @ _base_3_powers]
+
+    if np.any(indices < 0):
+        raise ValueError("Not all matrices are crystallographic point operations")
+
+    return indices
@@ -0,0 +1,241 @@
+""" Changes of setting, in particular between the BNS and OG settings of a group
+
+A setting transform is an affine change of coordinates x' = matrix x + origin. Operators
+(W, w) become (matrix W matrix^-1, matrix w + origin - matrix W matrix^-1 origin), and
+everything is done on stacks of operators or points at once.
+
+Moments are given by their components along the cell vectors, m = m_1 a + m_2 b + m_3 c (the
+same as the operators act on), so a change of setting, which doesn't change the moments
+themselves, is m' = matrix m. Their lengths are found with the metric of the cell they are
+in, see transform_metric.
+"""
+
+from dataclasses import dataclass
+from fractions import Fraction
+from functools import cached_property
+from typing import TYPE_CHECKING
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+from msg.datamodel.parse_operator import parse_coordinate_triplet, format_coordinate_triplet
+from msg.operations import BaseMagneticOperation, MagneticOperation, OGMagneticOperation, \
+    TranslationType, OG_TRANSLATION_PERIOD
+
+if TYPE_CHECKING:
+    from msg.groups import WyckoffSite
+
+MatrixType = tuple[tuple[Fraction, Fraction, Fraction], ...]
+
+
+def _inverse_matrix(matrix: MatrixType) -> MatrixType:
+    """ Exact inverse of a 3x3 matrix of Fractions, by the adjugate """
+
+    (a, b, c), (d, e, f), (g, h, i) = matrix
+
+    determinant = a*(e*i - f*h) - b*(d*i - f*g) + c*(d*h - e*g)
+    if determinant == 0:
+        raise ValueError("Setting transform matrix is singular")
+
+    adjugate = (
+        (e*i - f*h, c*h - b*i, b*f - c*e),
+        (f*g - d*i, a*i - c*g, c*d - a*f),
+        (d*h - e*g, b*g - a*h, a*e - b*d))
+
+    return tuple(tuple(x / determinant for x in row) for row in adjugate)
+
+
+def _matrix_product(a: MatrixType, b: MatrixType) -> MatrixType:
+    """ Exact product of two 3x3 matrices """
+    return tuple(tuple(sum(a[i][k] * b[k][j] for k in range(3)) for j in range(3)) for i in range(3))
+
+
+def _matrix_vector_product(matrix: MatrixType, vector: TranslationType) -> TranslationType:
+    """ Exact product of a 3x3 matrix and a vector """
+    return tuple(sum(a * b for a, b in zip(row, vector)) for row in matrix)
+
+
+@dataclass(frozen=True)
+class SettingTransform:
+    """ Affine change of coordinates x' = matrix x + origin, with exact entries
+
+    The float arrays used for the vectorised calculations are worked out once, when first used
+    """
+
+    matrix: MatrixType
+    origin: TranslationType
+
+    @staticmethod
+    def from_matrix(matrix: ArrayLike, origin: ArrayLike) -> "SettingTransform":
+        """ Transform from anything that can be turned into Fractions (ints, Fractions, strings) """
+        return SettingTransform(
+            matrix=tuple(tuple(Fraction(x) for x in row) for row in matrix),
+            origin=tuple(Fraction(x) for x in origin))
+
+    @cached_property
+    def inverse(self) -> "SettingTransform":
+        """ The transform back again: x = matrix^-1 x' - matrix^-1 origin """
+
+        inverse = _inverse_matrix(self.matrix)
+        origin = tuple(-sum(a*b for a, b in zip(row, self.origin)) for row in inverse)
+
+        return SettingTransform(matrix=inverse, origin=origin)
+
+    @cached_property
+    def matrix_array(self) -> np.ndarray:
+        return np.array(self.matrix, dtype=float)
+
+    @cached_property
+    def inverse_matrix_array(self) -> np.ndarray:
+        return np.array(self.inverse.matrix, dtype=float)
+
+    @cached_property
+    def origin_array(self) -> np.ndarray:
+        return np.array(self.origin, dtype=float)
+
+    def transform_points(self, points_and_momenta: ArrayLike, wrap: bool = False) -> np.ndarray:
+        """ Transform an (..., 6) array of positions followed by momenta (components along the cell vectors)
+
+        :param wrap: put the new positions into the unit cell
+        """
+
+        points_and_momenta = np.asarray(points_and_momenta, dtype=float)
+        output = np.empty(points_and_momenta.shape)
+
+        new_points = points_and_momenta[..., :3] @ self.matrix_array.T
+        new_points += self.origin_array
+        if wrap:
+            new_points -= np.floor(new_points)
+
+        output[..., :3] = new_points
+        output[..., 3:] = points_and_momenta[..., 3:] @ self.matrix_array.T
+
+        return output
+
+    def transform_metric(self, metric: ArrayLike) -> np.ndarray:
+        """ Metric tensor of the new cell from the (3, 3) metric tensor of the old one, so that
+        distances and moment lengths are the same in both settings
+        """
+        return self.inverse_matrix_array.T @ np.asarray(metric, dtype=float) @ self.inverse_matrix_array
+
+    def transform_operation_arrays(
+            self,
+            rotations: np.ndarray,
+            translations: np.ndarray,
+            time_reversals: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ Transform a stack of operations, as given by operation_arrays
+
+        Translations are not reduced, and the rotations are floats.
+        """
+
+        new_rotations = self.matrix_array @ rotations @ self.inverse_matrix_array
+        new_translations = translations @ self.matrix_array.T + self.origin_array - new_rotations @ self.origin_array
+
+        return new_rotations, new_translations, time_reversals
+
+    def transform_operations(
+            self,
+            operations: list[BaseMagneticOperation],
+            operation_type: type[BaseMagneticOperation] = MagneticOperation) -> list[BaseMagneticOperation]:
+        """ Transform operations into the new setting
+
+        :param operation_type: MagneticOperation (translations reduced modulo 1) or
+                               OGMagneticOperation (reduced modulo OG_TRANSLATION_PERIOD)
+        :raises ValueError: if the operations don't have integer matrices in the new setting
+        """
+
+        modulus = OG_TRANSLATION_PERIOD if issubclass(operation_type, OGMagneticOperation) else 1
+
+        # Done exactly, with Fractions, rather than with transform_operation_arrays
+        output = []
+        for operation in operations:
+            rotation = _matrix_product(_matrix_product(self.matrix, operation.point_operation), self.inverse.matrix)
+            if any(x.denominator != 1 for row in rotation for x in row):
+                raise ValueError("Operations are not compatible with this setting transform")
+
+            translation = tuple(
+                (a + shift - b) % modulus for a, shift, b in zip(
+                    _matrix_vector_product(self.matrix, operation.translation), self.origin,
+                    _matrix_vector_product(rotation, self.origin)))
+
+            output.append(operation_type(
+                point_operation=tuple(tuple(int(x) for x in row) for row in rotation),
+                translation=translation,
+                time_reversal=operation.time_reversal,
+                name=operation.name))
+
+        return output
+
+    def _transform_coefficients(self, rows: MatrixType) -> tuple[tuple[int, int, int], ...]:
+        """ Coefficient matrix A of a coordinate or moment triplet (A p + b) in the new setting, with the free
+        parameters transformed the same way as the coordinates (or moments), p = matrix^-1 p', so
+        matrix A matrix^-1
+
+        :raises ValueError: if that doesn't have integer coefficients
+        """
+
+        linear = _matrix_product(_matrix_product(self.matrix, rows), self.inverse.matrix)
+
+        if any(Fraction(x).denominator != 1 for row in linear for x in row):
+            raise ValueError("Coefficients are not integers in the new setting")
+
+        return tuple(tuple(int(x) for x in row) for row in linear)
+
+    def _transform_triplet(self, triplet: str, moment: bool) -> str:
+        """ Coordinate (or moment) triplet in the new setting, with the free parameters transformed
+        the same way as the coordinates, so e.g. 'x,1/4,z' stays in that form for an origin shift
+        """
+
+        rows, constants = parse_coordinate_triplet(triplet)
+
+        try:
+            linear = self._transform_coefficients(rows)
+        except ValueError as error:
+            raise ValueError(f"'{triplet}' doesn't have integer coefficients in the new setting") from error
+
+        if moment:
+            constant = (0, 0, 0)
+        else:
+            constant = tuple(x % 1 for x in self._transform_point(constants))
+
+        return format_coordinate_triplet(linear, constant, moment)
+
+    def _transform_point(self, point: TranslationType) -> TranslationType:
+        """ matrix point + origin, exactly """
+        return tuple(x + shift for x, shift in zip(_matrix_vector_product(self.matrix, point), self.origin))
+
+    def transform_wyckoff_site(self, site: "WyckoffSite") -> "WyckoffSite":
+        """ Wyckoff site with its positions in the new setting, modulo 1
+
+        The coordinate and moment triplets are rewritten for the new setting. The xyz and mag fields
+        are the first two columns of the coordinate coefficient matrix (the coefficients of x and of y),
+        so for new axes they are taken from the rewritten coordinates. With only an origin shift they
+        don't change.
+
+        :raises ValueError: if a position has xyz or mag values but no coordinates, and the axes change
+        """
+
+        identity_axes = self.matrix == ((1, 0, 0), (0, 1, 0), (0, 0, 1))
+
+        positions = []
+        for position in site.positions:
+            update = {"position": tuple(x % 1 for x in self._transform_point(position.position))}
+
+            if position.coordinates is not None:
+                update["coordinates"] = self._transform_triplet(position.coordinates, moment=False)
+
+                if not identity_axes:
+                    rows, _ = parse_coordinate_triplet(update["coordinates"])
+                    update["xyz"] = tuple(int(row[0]) for row in rows)
+                    update["mag"] = tuple(int(row[1]) for row in rows)
+
+            elif not identity_axes and (any(position.xyz) or any(position.mag)):
+                raise ValueError(f"Can't rewrite the xyz and mag values of site {site.name} for new axes "
+                                 f"without its coordinates")
+
+            if position.moment is not None:
+                update["moment"] = self._transform_triplet(position.moment, moment=True)
+
+            positions.append(position.model_copy(update=update))
+
+        return site.model_copy(update={"positions": positions})
@@ -0,0 +1,484 @@
+""" Expanding Wyckoff sites into all their equivalent positions and moments
+
+A site is worked out from the group operators and the first position of the site:
+
+ * The stabilizer of the site is the set of operations that fix a general point on it. It has
+   |G| / multiplicity elements (G being all the operations in the cell, including centering).
+ * The site is an affine map from free parameters (x, y, z) to a point on it, e.g.
+   (x, y, z) -> (x, 1/4, z).
+ * Averaging det(R) * time_reversal * R over the stabilizer gives the projection onto the
+   moments (axial vectors) the site allows.
+ * One operation from each coset of the stabilizer gives each of the equivalent positions.
+
+When the position has its coordinate triplet (e.g. "x,-x,0", which the database build decodes
+from the crysFML coefficient matrices), that is the map onto the site, and the stabilizer is
+everything that fixes it pointwise, so the free parameters are the conventional x, y and z.
+Otherwise the stabilizer is the subgroup of the right size that fixes the largest subspace through
+the first position, and the map is the average of its operations. Several sites can start at the
+same point with the same multiplicity (e.g. (x,0,0), (0,y,0) and (0,0,z) in Pmmm), in which case
+there is no way to tell which one is meant without the triplet, and a ValueError is raised.
+
+These are all combined into one (M, 3, 3) matrix and (M, 3) offset array for the positions and
+one (M, 3, 3) matrix array for the moments, so expanding a site is a single matrix multiply.
+Expansions are only worked out for a site when it is first used, so a site that can't be
+expanded doesn't stop the rest of the group's sites being used.
+"""
+
+from collections.abc import Callable, Iterator, Mapping
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, TypeVar
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+from msg.datamodel.parse_operator import parse_coordinate_triplet
+
+if TYPE_CHECKING:
+    from msg.groups import BNSGroup, WyckoffSite
+
+_tolerance = 1e-6
+
+T = TypeVar("T")
+
+
+def cell_operation_arrays(group: "BNSGroup") -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ All the operations in the unit cell, the operators combined with each centering translation
+
+    :returns: (G, 3, 3) rotations, (G, 3) translations in [0, 1) and (G,) time reversals,
+              with the identity first
+    """
+    return group.cell_operator_arrays
+
+
+def axial_matrices(rotations: np.ndarray, time_reversals: np.ndarray) -> np.ndarray:
+    """ How operations act on axial vectors (moments): det(R) * time_reversal * R """
+    return (np.linalg.det(rotations) * time_reversals)[:, np.newaxis, np.newaxis] * rotations
+
+
+def fixing_operations(
+        rotations: np.ndarray, translations: np.ndarray, points: np.ndarray, tolerance: float) -> np.ndarray:
+    """ (N, G) booleans, which of G operations fix each of N points, modulo the lattice """
+
+    shifts = np.einsum("gab,nb->nga", rotations, points) + translations - points[:, np.newaxis, :]
+    return np.all(np.abs(shifts - np.rint(shifts)) < tolerance, axis=2)
+
+
+def _fixed_subspace(matrices: np.ndarray) -> np.ndarray:
+    """ Orthogonal projector onto the vectors fixed by all of a stack of matrices """
+
+    stacked = (matrices - np.eye(3)).reshape(-1, 3)
+    _, singular_values, vh = np.linalg.svd(stacked)
+
+    rank = int(np.sum(singular_values > _tolerance))
+    basis = vh[rank:]
+
+    return basis.T @ basis
+
+
+def _site_stabilizer(rotations: np.ndarray, point_stabilizer: np.ndarray, size: int) -> np.ndarray:
+    """ Indices of the operations in the stabilizer of a general point of the site
+
+    When the first position of the site is itself a special point (e.g. (0,0,0) for the
+    general position), more operations fix it than fix a general point of the site. The site
+    stabilizer is then the subgroup that fixes a whole subspace pointwise, and has the right size.
+
+    :raises ValueError: if there is no such subgroup, or more than one that fixes the largest subspace
+    """
+
+    if len(point_stabilizer) == size:
+        return point_stabilizer
+
+    # Candidate subspaces are intersections of the fixed spaces of the elements
+    candidates = {}
+    to_check = [_fixed_subspace(rotations[[index]]) for index in point_stabilizer]
+    while to_check:
+        projector = to_check.pop()
+        key = tuple(np.round(projector.reshape(-1), 6))
+        if key in candidates:
+            continue
+
+        candidates[key] = projector
+        for other in list(candidates.values()):
+            to_check.append(_fixed_subspace(np.array([projector, other])))
+
+    # Subgroups of the right size, by the dimension of the subspace they fix
+    subgroups: dict[int, set[tuple[int, ...]]] = {}
+    for projector in candidates.values():
+        # Everything that fixes this subspace pointwise
+        fixes = np.all(np.abs(rotations[point_stabilizer] @ projector - projector) < _tolerance, axis=(1, 2))
+        subgroup = point_stabilizer[fixes]
+
+        if len(subgroup) == size:
+            subgroups.setdefault(int(np.rint(np.trace(projector))), set()).add(tuple(subgroup.tolist()))
+
+    if not subgroups:
+        raise ValueError("Could not find a stabilizer of the right size for this Wyckoff site")
+
+    best = subgroups[max(subgroups)]
+    if len(best) > 1:
+        raise ValueError(f"{len(best)} different stabilizers fit this Wyckoff site, "
+                         f"the coordinates of its first position are needed to choose one")
+
+    return np.array(best.pop(), dtype=point_stabilizer.dtype)
+
+
+def _triplet_stabilizer(
+        rotations: np.ndarray, translations: np.ndarray, matrix: np.ndarray, offset: np.ndarray) -> np.ndarray:
+    """ Indices of the operations fixing every point matrix @ p + offset, modulo the lattice """
+
+    shifts = np.einsum("gab,b->ga", rotations, offset) + translations - offset
+
+    return np.nonzero(np.all(np.abs(rotations @ matrix - matrix) < _tolerance, axis=(1, 2)) &
+                      np.all(np.abs(shifts - np.rint(shifts)) < _tolerance, axis=1))[0]
+
+
+@dataclass(frozen=True)
+class WyckoffExpansion:
+    """ Precomputed coefficients for expanding one Wyckoff site
+
+    Entry k of the M equivalent positions of free parameters p is
+    position_matrices[k] @ p + position_offsets[k] (mod 1), and the corresponding moment
+    for a moment m is moment_matrices[k] @ m. Entry 0 is the site itself.
+
+    The pieces these are made from are kept too: the map onto the site,
+    p -> projection_matrix @ p + projection_offset, and back again (for points on the site),
+    x -> parameter_matrix @ x + parameter_offset, the projection onto the allowed moments,
+    and the operation (coset_rotations[k], coset_translations[k]) taking the site to entry k.
+    """
+
+    name: str
+    multiplicity: int
+    position_matrices: np.ndarray
+    position_offsets: np.ndarray
+    moment_matrices: np.ndarray
+
+    projection_matrix: np.ndarray
+    projection_offset: np.ndarray
+    parameter_matrix: np.ndarray
+    parameter_offset: np.ndarray
+    moment_projection: np.ndarray
+    coset_rotations: np.ndarray
+    coset_translations: np.ndarray
+
+    def __len__(self) -> int:
+        return self.position_matrices.shape[0]
+
+    def positions(self, free_parameters: ArrayLike) -> np.ndarray:
+        """ (N, M, 3) equivalent positions for an (N, 3) array of free parameters """
+
+        free_parameters = np.asarray(free_parameters, dtype=float).reshape(-1, 3)
+
+        positions = np.einsum("kab,nb->nka", self.position_matrices, free_parameters) + self.position_offsets
+        positions -= np.floor(positions + _tolerance)
+
+        return positions
+
+    def moments(self, moments: ArrayLike) -> np.ndarray:
+        """ (N, M, 3) equivalent moments for an (N, 3) array of moments on the site
+
+        Any part of the moments that the site symmetry doesn't allow is projected out
+        """
+
+        moments = np.asarray(moments, dtype=float).reshape(-1, 3)
+        return np.einsum("kab,nb->nka", self.moment_matrices, moments)
+
+
+def wyckoff_expansion(group: "BNSGroup", site: "WyckoffSite") -> WyckoffExpansion:
+    """ Work out the expansion coefficients for a site of a group
+
+    :raises ValueError: if the site is not consistent with the operators
+    """
+
+    rotations, translations, time_reversals = cell_operation_arrays(group)
+    n_operations = rotations.shape[0]
+
+    if n_operations % site.multiplicity != 0:
+        raise ValueError(f"Site multiplicity {site.multiplicity} does not divide the number of operations")
+
+    stabilizer_size = n_operations // site.multiplicity
+    first = site.positions[0]
+
+    if first.coordinates is not None:
+        rows, constants = parse_coordinate_triplet(first.coordinates)
+        linear_projection = np.array(rows, dtype=float)
+        offset = np.array(constants, dtype=float)
+
+        stabilizer = _triplet_stabilizer(rotations, translations, linear_projection, offset)
+
+        if len(stabilizer) != stabilizer_size:
+            raise ValueError(f"Site {site.name} ({first.coordinates}) is fixed by {len(stabilizer)} operations, "
+                             f"but should be by {stabilizer_size} for a multiplicity of {site.multiplicity}")
+
+        # Free parameters are the conventional ones
+        parameter_matrix = np.linalg.pinv(linear_projection)
+        parameter_offset = -parameter_matrix @ offset
+
+    else:
+        # Operations that fix the first position, with their translations adjusted to fix it exactly
+        origin = np.array(first.position, dtype=float)
+
+        shifts = np.einsum("gab,b->ga", rotations, origin) + translations - origin
+        lattice_shifts = np.rint(shifts)
+        point_stabilizer = np.nonzero(np.all(np.abs(shifts - lattice_shifts) < _tolerance, axis=1))[0]
+
+        try:
+            stabilizer = _site_stabilizer(rotations, point_stabilizer, stabilizer_size)
+        except ValueError as error:
+            raise ValueError(f"Site {site.name}: {error}") from error
+
+        stabilizer_translations = translations[stabilizer] - lattice_shifts[stabilizer]
+
+        # Averaging the stabilizer projects onto the site, and points on it are their own free parameters
+        linear_projection = np.mean(rotations[stabilizer], axis=0)
+        offset = np.mean(stabilizer_translations, axis=0)
+
+        parameter_matrix = np.eye(3)
+        parameter_offset = np.zeros(3)
+
+    axial = axial_matrices(rotations, time_reversals)
+    moment_projection = np.mean(axial[stabilizer], axis=0)
+
+    if first.moment is not None:
+        moment_rows, moment_constants = parse_coordinate_triplet(first.moment)
+        moment_form = np.array(moment_rows, dtype=float)
+
+        if (any(moment_constants) or not np.allclose(moment_projection @ moment_form, moment_form) or
+                np.linalg.matrix_rank(moment_form) != np.linalg.matrix_rank(moment_projection)):
+            raise ValueError(f"Site {site.name} moment ({first.moment}) doesn't match the symmetry of the site")
+
+    # One operation per coset, identified by where they send the site
+    position_matrices = rotations @ linear_projection
+    position_offsets = np.einsum("gab,b->ga", rotations, offset) + translations
+    position_offsets -= np.floor(position_offsets + _tolerance)
+
+    keys = np.round(np.concatenate(
+        (position_matrices.reshape(n_operations, 9), position_offsets), axis=1) / _tolerance).astype(np.int64)
+    _, representatives = np.unique(keys, axis=0, return_index=True)
+    representatives = np.sort(representatives) # Identity (index 0) first
+
+    if len(representatives) != site.multiplicity:
+        raise ValueError(f"Site {site.name} has {len(representatives)} equivalent positions, "
+                         f"but a multiplicity of {site.multiplicity}")
+
+    return WyckoffExpansion(
+        name=site.name,
+        multiplicity=site.multiplicity,
+        position_matrices=position_matrices[representatives],
+        position_offsets=position_offsets[representatives],
+        moment_matrices=axial[representatives] @ moment_projection,
+        projection_matrix=linear_projection,
+        projection_offset=offset,
+        parameter_matrix=parameter_matrix,
+        parameter_offset=parameter_offset,
+        moment_projection=moment_projection,
+        coset_rotations=rotations[representatives],
+        coset_translations=translations[representatives])
+
+
+class SiteMapping(Mapping[str, T]):
+    """ Read only mapping from site name to something about the site, worked out the first time it is looked up """
+
+    def __init__(self, names: list[str], compute: Callable[[str], T]):
+        self._names = list(names)
+        self._compute = compute
+        self._values: dict[str, T] = {}
+
+    def __getitem__(self, name: str) -> T:
+        if name not in self._values:
+            if name not in self._names:
+                raise KeyError(name)
+
+            self._values[name] = self._compute(name)
+
+        return self._values[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+def expand_sites(
+        expansions: Mapping[str, WyckoffExpansion],
+        site_names: list[str],
+        free_parameters: ArrayLike,
+        moments: ArrayLike | None = None) -> tuple[np.ndarray, np.ndarray | None, np.ndarray]:
+    """ Expand many atoms, on any sites, at once
+
+    :param expansions: expansions for each site name
+    :param site_names: (N,) site of each atom
+    :param free_parameters: (N, 3) free parameters of each atom
+    :param moments: optional (N, 3) moments of each atom
+    :returns: (T, 3) positions, (T, 3) moments (or None), and the (T,) index of the atom each one comes from
+    """
+
+    free_parameters = np.asarray(free_parameters, dtype=float).reshape(-1, 3)
+    if moments is not None:
+        moments = np.asarray(moments, dtype=float).reshape(-1, 3)
+
+    site_names = np.asarray(site_names)
+
+    all_positions = []
+    all_moments = []
+    all_indices = []
+
+    # One batched multiply for all the atoms on each kind of site
+    for name in dict.fromkeys(site_names.tolist()):
+        expansion = expansions[name]
+        indices = np.nonzero(site_names == name)[0]
+
+        all_positions.append(expansion.positions(free_parameters[indices]).reshape(-1, 3))
+        all_indices.append(np.repeat(indices, len(expansion)))
+
+        if moments is not None:
+            all_moments.append(expansion.moments(moments[indices]).reshape(-1, 3))
+
+    if not all_positions:
+        return np.zeros((0, 3)), None if moments is None else np.zeros((0, 3)), np.zeros(0, dtype=int)
+
+    # Put the atoms back in their original order
+    indices = np.concatenate(all_indices)
+    order = np.argsort(indices, kind="stable")
+
+    return (np.concatenate(all_positions)[order],
+            None if moments is None else np.concatenate(all_moments)[order],
+            indices[order])
+
+
+#
+# Working out which site atoms are on
+#
+
+@dataclass(frozen=True)
+class WyckoffAssignment:
+    """ Sites of a list of atoms
+
+    site_indices are indices into the group's wyckoff_sites (-1 if no site matches, which is
+    also the case for atoms on sites that can't be expanded), and
+    free_parameters are such that the first position of the site's expansion is equivalent
+    to the atom, so e.g. the atom is expansion.positions(free_parameters)[k] for some k
+    """
+
+    site_indices: np.ndarray
+    site_names: np.ndarray
+    multiplicities: np.ndarray
+    free_parameters: np.ndarray
+
+
+class WyckoffClassifier:
+    """ Finds the Wyckoff sites of many atoms at once
+
+    The set of operations fixing an atom (modulo the lattice) is the stabilizer of one of the
+    copies of the site it is on. The stabilizers of every copy of every site are precomputed as
+    bit masks over the operations in the cell, so classifying an atom is working out its own
+    mask, one dictionary lookup, and mapping it back onto the first copy of the site to get its
+    free parameters.
+    """
+
+    def __init__(self, group: "BNSGroup", expansions: list[WyckoffExpansion | None]):
+        """ :param expansions: expansion of each of the group's sites, in order, or None for ones to leave out """
+
+        self.rotations, self.translations, _ = cell_operation_arrays(group)
+        self.expansions = expansions
+        self.names = [site.name for site in group.wyckoff_sites]
+
+        # Stabilizer mask of each copy of each site, from a general point on the site
+        general_point = np.array([0.1234, 0.3812, 0.7371])
+        self._lookup: dict[bytes, list[tuple[int, int]]] = {}
+        for site_index, expansion in enumerate(expansions):
+            if expansion is None:
+                continue
+
+            masks = self._masks(expansion.positions(general_point)[0], _tolerance)
+            for copy, mask in enumerate(masks):
+                self._lookup.setdefault(mask.tobytes(), []).append((site_index, copy))
+
+        # Lattice vectors to try when mapping atoms back onto the first copy of a site
+        self._lattice_shifts = np.array(np.meshgrid(*[(0, -1, 1)] * 3, indexing="ij")).reshape(3, -1).T
+
+    def _fixed(self, points: np.ndarray, tolerance: float) -> np.ndarray:
+        """ (N, G) booleans, which operations fix each point, modulo the lattice """
+        return fixing_operations(self.rotations, self.translations, points, tolerance)
+
+    def _masks(self, points: np.ndarray, tolerance: float) -> np.ndarray:
+        """ Packed stabilizer masks for each point, as an (N, bytes) array """
+        return np.packbits(self._fixed(points, tolerance), axis=1)
+
+    def _free_parameters(
+            self, points: np.ndarray, site_index: int, copy: int, tolerance: float) -> tuple[np.ndarray, np.ndarray]:
+        """ Map points onto the first copy of a site
+
+        :returns: (N, 3) free parameters, and (N,) whether each point really is on this copy
+        """
+
+        expansion = self.expansions[site_index]
+        rotation = expansion.coset_rotations[copy]
+        translation = expansion.coset_translations[copy]
+
+        # Undo the operation taking the site to this copy
+        mapped = (points - translation) @ np.linalg.inv(rotation).T
+        mapped -= np.floor(mapped)
+
+        # That's on the site, up to a lattice vector n, if (I - L K) n = mapped - L (K mapped + c) - b,
+        # where L, b is the map onto the site and K, c the map back
+        projection = expansion.projection_matrix @ expansion.parameter_matrix
+        residuals = (mapped - mapped @ projection.T -
+                     expansion.projection_matrix @ expansion.parameter_offset - expansion.projection_offset)
+        candidates = self._lattice_shifts @ (np.eye(3) - projection).T
+
+        distances = np.max(np.abs(residuals[:, np.newaxis, :] - candidates[np.newaxis, :, :]), axis=2)
+        best = np.argmin(distances, axis=1)
+
+        parameters = (mapped - self._lattice_shifts[best]) @ expansion.parameter_matrix.T + expansion.parameter_offset
+
+        return parameters, distances[np.arange(points.shape[0]), best] < tolerance
+
+    def classify(self, points: ArrayLike, tolerance: float = 1e-4, chunk_size: int | None = None) -> WyckoffAssignment:
+        """ Sites of an (N, 3) array of fractional coordinates
+
+        :param tolerance: how far (in fractional coordinates) atoms can be from the exact site
+        :param chunk_size: number of atoms done at once, limits the memory used
+        """
+
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        n_points = points.shape[0]
+        n_operations = self.rotations.shape[0]
+
+        if chunk_size is None:
+            chunk_size = max(1, (1 << 22) // n_operations)
+
+        site_indices = np.full(n_points, -1, dtype=int)
+        multiplicities = np.zeros(n_points, dtype=int)
+        free_parameters = np.full((n_points, 3), np.nan)
+
+        for start in range(0, n_points, chunk_size):
+            chunk = points[start:start + chunk_size]
+            fixed = self._fixed(chunk, tolerance)
+
+            multiplicities[start:start + chunk_size] = n_operations // np.sum(fixed, axis=1)
+
+            masks, inverse = np.unique(np.packbits(fixed, axis=1), axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+
+            for mask_index, mask in enumerate(masks):
+                indices = np.nonzero(inverse == mask_index)[0]
+
+                for site_index, copy in self._lookup.get(mask.tobytes(), []):
+                    parameters, on_site = self._free_parameters(chunk[indices], site_index, copy, tolerance)
+
+                    site_indices[start + indices[on_site]] = site_index
+                    free_parameters[start + indices[on_site]] = parameters[on_site]
+
+                    indices = indices[~on_site]
+                    if len(indices) == 0:
+                        break
+
+        names = np.array(self.names + [""], dtype=object)
+
+        return WyckoffAssignment(
+            site_indices=site_indices,
+            site_names=names[site_indices],
+            multiplicities=multiplicities,
+            free_parameters=free_parameters)
+
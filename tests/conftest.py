@@ -0,0 +1,84 @@
+from fractions import Fraction
+
+import pytest
+import spglib
+
+from msg.groups import Group, BNSGroup, OGGroup, BNSOGTransform
+from msg.operations import OGMagneticOperation
+from builddatabase.spglib_data import spglib_generators
+
+
+def spglib_group(number: int) -> Group:
+    """ Build a Group model from the spglib database, for tests that need a group but not database.json
+
+    spglib gives every operation in the cell, so the lattice vectors are just the unit cell vectors
+    """
+
+    group_type = spglib.get_magnetic_spacegroup_type(number)
+
+    bns_number = tuple(int(x) for x in group_type.bns_number.split("."))
+    og_number = tuple(int(x) for x in group_type.og_number.split("."))
+
+    operators = spglib_generators(number)
+    lattice = [(Fraction(1), Fraction(0), Fraction(0)),
+               (Fraction(0), Fraction(1), Fraction(0)),
+               (Fraction(0), Fraction(0), Fraction(1))]
+
+    bns = BNSGroup(
+        number=bns_number,
+        symbol=group_type.bns_number,
+        latex_symbol=group_type.bns_number,
+        operators=operators,
+        lattice_vectors=lattice,
+        wyckoff_sites=[])
+
+    og = OGGroup(
+        number=og_number,
+        symbol=group_type.og_number,
+        latex_symbol=group_type.og_number,
+        operators=[OGMagneticOperation(
+                        point_operation=op.point_operation,
+                        translation=op.translation,
+                        time_reversal=op.time_reversal)
+                   for op in operators],
+        lattice_vectors=lattice,
+        wyckoff_sites=[])
+
+    return Group(
+        number=number,
+        group_type=group_type.type,
+        symbol=group_type.bns_number,
+        latex_symbol=group_type.bns_number,
+        bns=bns,
+        og=og,
+        bns_og_transform=BNSOGTransform(
+            rotation=((1, 0, 0), (0, 1, 0), (0, 0, 1)),
+            origin=(Fraction(0), Fraction(0), Fraction(0))))
+
+
+def centered_group(number: int, centering: tuple[Fraction, Fraction, Fraction]) -> Group:
+    """ Group from spglib with the BNS operators reduced to representatives modulo a centering vector,
+    which is the form they take in the database
+    """
+
+    group = spglib_group(number)
+
+    representatives = []
+    for op in group.bns.operators:
+        shifted = tuple((t + c) % 1 for t, c in zip(op.translation, centering))
+        if not any(other.point_operation == op.point_operation and
+                   other.time_reversal == op.time_reversal and
+                   other.translation == shifted for other in representatives):
+            representatives.append(op)
+
+    bns = group.bns.model_copy(update={
+        "operators": representatives,
+        "lattice_vectors": group.bns.lattice_vectors + [centering]})
+
+    return group.model_copy(update={"bns": bns})
+
+
+@pytest.fixture(scope="session")
+def sample_groups() -> list[Group]:
+    """ A handful of groups of different types and sizes """
+    return [spglib_group(number) for number in (1, 5, 100, 1234, 1651)]
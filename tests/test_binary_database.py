@@ -0,0 +1,67 @@
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from msg.array_file import write_arrays, read_arrays
+from msg.binary_database import BinaryDatabase, write_binary_database
+from msg.groups import WyckoffSite, WyckoffPosition
+
+
+@pytest.fixture
+def groups_with_sites(sample_groups):
+    """ The sample groups, with a made up wyckoff site added to one of them """
+
+    site = WyckoffSite(
+        name="b", unicode_name="b", latex_name="b", multiplicity=2,
+        positions=[
+            WyckoffPosition(position=(Fraction(1, 2), Fraction(0), Fraction(1, 4)), xyz=(1, 2, 3), mag=(0, 0, 1),
+                            coordinates="1/2,0,1/4", moment="mx,my,0"),
+            WyckoffPosition(position=(Fraction(0), Fraction(1, 3), Fraction(0)), xyz=(-1, 2, 0), mag=(1, 0, 0))])
+
+    groups = [group.model_copy(deep=True) for group in sample_groups]
+    groups[2].bns.wyckoff_sites.append(site)
+
+    return groups
+
+
+def test_array_round_trip(tmp_path):
+    arrays = {
+        "a": np.arange(7, dtype=np.int8),
+        "b": np.arange(12, dtype=np.float64).reshape(3, 4),
+        "empty": np.zeros((0, 3), dtype=np.int16)}
+
+    write_arrays(str(tmp_path / "arrays.bin"), arrays, metadata={"x": 1})
+    loaded, metadata = read_arrays(str(tmp_path / "arrays.bin"))
+
+    assert metadata == {"x": 1}
+    for name in arrays:
+        assert loaded[name].dtype == arrays[name].dtype
+        assert np.array_equal(loaded[name], arrays[name])
+
+
+def test_database_round_trip(tmp_path, groups_with_sites):
+    filename = str(tmp_path / "database.bin")
+    write_binary_database(groups_with_sites, filename)
+
+    database = BinaryDatabase(filename)
+
+    assert len(database) == len(groups_with_sites)
+    for group, loaded in zip(groups_with_sites, database):
+        assert loaded == group
+        assert database.by_number(group.number) == group
+
+
+def test_operator_arrays(tmp_path, sample_groups):
+    filename = str(tmp_path / "database.bin")
+    write_binary_database(sample_groups, filename)
+
+    database = BinaryDatabase(filename)
+
+    for index, group in enumerate(sample_groups):
+        rotations, numerators, denominators, time_reversals = database.operator_arrays(index)
+
+        for i, op in enumerate(group.bns.operators):
+            assert np.array_equal(rotations[i], op.point_operation)
+            assert tuple(Fraction(int(n), int(denominators[i])) for n in numerators[i]) == op.translation
+            assert time_reversals[i] == op.time_reversal
@@ -0,0 +1,222 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# The build scripts are run from their own directory, and import each other as top level modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "builddatabase"))
+
+import build_database
+from build_database import convert_groups, convert_groups_cached
+from crysfml_load import PointOperation, iter_crysfml_groups, load_point_operations
+
+point_operations = {
+    1: PointOperation(number=1, name="1", string_form="x,y,z", matrix=np.eye(3, dtype=int)),
+    2: PointOperation(number=2, name="-1", string_form="-x,-y,-z", matrix=-np.eye(3, dtype=int)),
+    3: PointOperation(number=3, name="2z", string_form="-x,-y,z", matrix=np.diag([-1, -1, 1]))}
+
+
+def wyckoff_site(label: str, multiplicity: int) -> dict:
+    return {
+        "label": label,
+        "multiplicity": multiplicity,
+        "positions_num": [[0, 0, 0]] * multiplicity,
+        "positions_denom": [1] * multiplicity,
+        "positions_xyz": [[1, 2, 3]] * multiplicity,
+        "positions_mag": [[0, 0, 1]] * multiplicity,
+        "positions_coordinate_matrix": [[[1, 0, 0], [0, 1, 0], [0, 0, 1]]] * multiplicity,
+        "positions_moment_matrix": [[[0, 0, 0], [0, 0, 0], [0, 0, 1]]] * multiplicity}
+
+
+def record(group_id: int) -> dict:
+    """ Made up crysFML record, alternately of type 1 and type 4 """
+
+    group_type = 4 if group_id % 2 else 1
+    point_ops = [1, 2, 3][:1 + group_id % 3]
+
+    data = {
+        "bns_number_part_1": group_id + 1,
+        "bns_number_part_2": group_id + 2,
+        "bns_number_string": f"{group_id + 1}.{group_id + 2}",
+        "uni_label": f"P{group_id}",
+        "bns_label": f"P_a{group_id}" if group_type == 4 else f"P{group_id}",
+        "og_number_part_1": group_id + 1,
+        "og_number_part_2": 1,
+        "og_number_part_3": group_id + 2,
+        "og_number_string": f"{group_id + 1}.1.{group_id + 2}",
+        "og_label": f"P_2a{group_id}'" if group_type == 4 else f"P{group_id}",
+        "group_type": group_type,
+        "bns_point_op": point_ops,
+        "bns_translation_num": [[0, 0, i % 2] for i in range(len(point_ops))],
+        "bns_translation_denom": [2] * len(point_ops),
+        "bns_time_inversion": [1] * len(point_ops),
+        "lattice_vectors_num": [[1, 0, 0], [0, 1, 0], [0, 0, 1]],
+        "lattice_vectors_denom": [1, 1, 1],
+        "bns_wyckoff": [wyckoff_site("a", 1), wyckoff_site("b", 2)]}
+
+    if group_type == 4:
+        data.update({
+            "bnsog_point_op": np.array([[2, 0, 0], [0, 1, 0], [0, 0, 1]]),
+            "bnsog_origin_num": np.array([1, 0, 0]),
+            "bnsog_origin_denom": 4,
+            "og_point_op": point_ops,
+            "og_translation_num": [[1, 0, 0]] * len(point_ops),
+            "og_translation_denom": [1] * len(point_ops),
+            "og_time_inversion": [-1] * len(point_ops),
+            "og_lattice_vectors_num": [[2, 0, 0], [0, 1, 0], [0, 0, 1]],
+            "og_lattice_vectors_denom": [1, 1, 1],
+            "og_wyckoff": [wyckoff_site("a", 2)]})
+
+    return data
+
+
+@pytest.fixture(scope="module")
+def records() -> dict[int, dict]:
+    return {group_id: record(group_id) for group_id in range(12)}
+
+
+def test_serial_and_parallel_agree(records):
+    serial = convert_groups(records, point_operations, jobs=1)
+    parallel = convert_groups(records, point_operations, jobs=3)
+
+    assert [group.number for group in serial] == [group_id + 1 for group_id in records]
+    assert [group.model_dump_json() for group in parallel] == [group.model_dump_json() for group in serial]
+
+    assert serial[1].group_type == 4
+    assert serial[1].og.operators[0].time_reversal == -1
+
+
+def test_cache(records, tmp_path):
+    cache = str(tmp_path / "cache")
+
+    groups, n_converted = convert_groups_cached(records, point_operations, cache_directory=cache)
+    assert n_converted == len(records)
+    assert len(os.listdir(cache)) == len(records)
+
+    # Everything comes from the cache the second time
+    cached, n_converted = convert_groups_cached(records, point_operations, cache_directory=cache)
+    assert n_converted == 0
+    assert cached == groups
+
+
+def test_cache_invalidated_by_change(records, tmp_path):
+    cache = str(tmp_path / "cache")
+    groups, _ = convert_groups_cached(records, point_operations, cache_directory=cache)
+
+    changed = dict(records)
+    changed[3] = record(3) | {"uni_label": "P_changed"}
+
+    new_groups, n_converted = convert_groups_cached(changed, point_operations, cache_directory=cache)
+
+    assert n_converted == 1
+    assert new_groups[3].symbol == "P_changed"
+    assert new_groups[:3] + new_groups[4:] == groups[:3] + groups[4:]
+
+    # The entry for the old record is gone
+    assert len(os.listdir(cache)) == len(records)
+
+
+def test_cache_pruned_for_new_converter(records, tmp_path, monkeypatch):
+    cache = str(tmp_path / "cache")
+    convert_groups_cached(records, point_operations, cache_directory=cache)
+    old_entries = set(os.listdir(cache))
+
+    monkeypatch.setattr(build_database, "converter_version", lambda point_operations: "changed")
+    _, n_converted = convert_groups_cached(records, point_operations, cache_directory=cache)
+
+    assert n_converted == len(records)
+    assert len(os.listdir(cache)) == len(records)
+    assert not old_entries & set(os.listdir(cache))
+
+
+def test_converter_sources():
+    """ Everything the conversion imports from this repository, however indirectly, is in the cache key """
+
+    sources = {os.path.relpath(filename, build_database._ROOT_DIRECTORY).replace(os.sep, "/")
+               for filename in build_database._converter_sources()}
+
+    assert {"builddatabase/build_database.py", "builddatabase/crysfml_load.py", "builddatabase/formatting.py",
+            "msg/__init__.py", "msg/groups.py", "msg/operations.py", "msg/wyckoff.py", "msg/setting_transforms.py",
+            "msg/datamodel/parse_operator.py", "msg/grouptheory/closures.py"} <= sources
+
+    # Not imported by the conversion
+    assert "msg/datamodel/mcif.py" not in sources
+    assert not any(source.startswith("tests/") for source in sources)
+
+
+def test_no_cache_option(records, tmp_path, monkeypatch):
+    """ --no-cache converts everything, without reading or writing the cache """
+
+    streamed = []
+    written = []
+    monkeypatch.setattr(build_database, "load_point_operations", lambda: (point_operations, {}))
+    monkeypatch.setattr(build_database, "iter_crysfml_groups", lambda: iter(records.items()))
+    monkeypatch.setattr(build_database, "write_ndjson", lambda groups, filename: streamed.extend(groups))
+    monkeypatch.setattr(build_database, "write_outputs", lambda database, timings: written.append(database))
+    monkeypatch.chdir(tmp_path)
+
+    def no_cache(*args, **kwargs):
+        raise AssertionError("The cache shouldn't be used")
+
+    monkeypatch.setattr(build_database, "iter_groups_cached", no_cache)
+
+    build_database.main(["--no-cache", "--jobs", "1"])
+
+    # The NDJSON file is written from the conversion, everything else from the whole database
+    assert streamed == convert_groups(records, point_operations)
+    assert len(written) == 1
+    assert written[0].groups == streamed
+    assert not os.path.exists(tmp_path / build_database.CACHE_DIRECTORY)
+
+
+def test_records_streamed(records, tmp_path, monkeypatch):
+    """ main converts the records as they are read, rather than reading them all first """
+
+    read = []
+
+    def iter_records():
+        for group_id, group in records.items():
+            read.append(group_id)
+            yield group_id, group
+
+    def write_ndjson(groups, filename):
+        for group in groups:
+            assert len(read) == group.number # Nothing read ahead of the group being written
+
+    monkeypatch.setattr(build_database, "load_point_operations", lambda: (point_operations, {}))
+    monkeypatch.setattr(build_database, "iter_crysfml_groups", iter_records)
+    monkeypatch.setattr(build_database, "write_ndjson", write_ndjson)
+    monkeypatch.setattr(build_database, "write_outputs", lambda database, timings: None)
+    monkeypatch.chdir(tmp_path)
+
+    build_database.main(["--jobs", "1"])
+    assert read == list(records)
+
+    # In parallel, only a few records are read ahead
+    read.clear()
+    converted = build_database.iter_converted_groups(iter_records(), point_operations, jobs=2)
+    next(converted)
+
+    assert len(read) == 2 * build_database._READ_AHEAD
+    assert len(list(converted)) == len(records) - 1
+
+
+def test_sample_sites_expand():
+    """ Sites straight from the crysFML data, with coordinates decoded from its coefficient matrices,
+    including the ones along x, y and z in Pmmm that all start at (0,0,0) """
+
+    sample_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "crysfml_sample.txt")
+    pmmm = convert_groups(dict(iter_crysfml_groups(sample_path)), load_point_operations(sample_path)[0])[3].bns
+
+    sites = {site.name: site.positions[0] for site in pmmm.wyckoff_sites}
+    assert (sites["x"].coordinates, sites["x"].moment) == ("x,1/2,z", "0,my,0")
+
+    for name, expected in [("i", (0.1, 0, 0)), ("m", (0, 0.2, 0)), ("q", (0, 0, 0.3))]:
+        assert sites[name].position == (0, 0, 0)
+
+        positions = pmmm.wyckoff_expansions[name].positions([[0.1, 0.2, 0.3]])[0]
+        assert np.allclose(positions[0], expected)
+
+    for site in pmmm.wyckoff_sites:
+        assert len(pmmm.wyckoff_expansions[site.name]) == site.multiplicity
@@ -0,0 +1,116 @@
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from msg.grouptheory.closures import closure, closure_by_sorting, closure_by_arrays, og_closure, closure_by_lattice
+from msg.operations import OGMagneticOperation
+
+from conftest import spglib_group, centered_group
+
+
+@pytest.mark.parametrize("number", [1, 5, 100, 1234, 1651])
+def test_full_group_is_closed(number):
+    """ spglib lists every operation, so the closure shouldn't add anything """
+    operators = spglib_group(number).bns.operators
+    closed = closure(operators)
+
+    assert closed == sorted(operators)
+
+
+@pytest.mark.parametrize("number", [5, 100, 400, 1234])
+@pytest.mark.parametrize("n_generators", [1, 2, 3])
+def test_same_as_sorting_closure(number, n_generators):
+    """ Hash based closure should agree with the original sort and deduplicate one """
+    generators = spglib_group(number).bns.operators[1:n_generators+1]
+
+    assert closure(generators) == closure_by_sorting(generators)
+
+
+@pytest.mark.parametrize("number", [5, 100, 400, 1234, 1651])
+@pytest.mark.parametrize("n_generators", [1, 2, 3])
+def test_same_as_array_closure(number, n_generators):
+    """ Closure with batched array composition should give the same result """
+    generators = spglib_group(number).bns.operators[1:n_generators+1]
+
+    assert closure(generators) == closure_by_arrays(generators)
+
+
+@pytest.mark.parametrize("number", [5, 100, 1234, 1651])
+def test_og_composition(number):
+    """ OG composition should match BNS composition modulo 1 for these (BNS = OG) groups """
+    group = spglib_group(number)
+
+    for bns_a, og_a in list(zip(group.bns.operators, group.og.operators))[:10]:
+        for bns_b, og_b in zip(group.bns.operators, group.og.operators):
+            bns = bns_a.and_then(bns_b)
+            og = og_a.and_then(og_b)
+
+            assert og.point_operation == bns.point_operation
+            assert og.time_reversal == bns.time_reversal
+            assert tuple(t % 1 for t in og.translation) == bns.translation
+            assert all(0 <= t < 2 for t in og.translation)
+
+
+@pytest.mark.parametrize("number", [5, 100, 1234])
+def test_og_closure(number):
+    group = spglib_group(number)
+
+    # Modulo the unit cell, this is the same as the BNS closure
+    closed = og_closure(group.og.operators, group.og.lattice_vectors)
+    assert [op.key for op in closed] == [op.key for op in closure(group.bns.operators)]
+
+    # Otherwise translations are only reduced modulo 2, but modulo 1 it is the same group
+    unreduced = og_closure(group.og.operators)
+    assert len(unreduced) >= len(closed)
+    assert all(0 <= t < 2 for op in unreduced for t in op.translation)
+    assert {(op.point_operation, tuple(t % 1 for t in op.translation), op.time_reversal) for op in unreduced} == \
+           {(op.point_operation, op.translation, op.time_reversal) for op in closed}
+
+
+@pytest.mark.parametrize("number, axis", [(7, 2), (11, 0)])
+def test_type_4_og_closure(number, axis):
+    """ Type 4 groups in the OG setting have a cell half the size of the BNS one along the
+    anti-translation, which becomes a time reversed unit translation, so translations reach 1
+    before they are reduced modulo 2
+    """
+
+    bns_operators = spglib_group(number).bns.operators
+    scale = [2 if i == axis else 1 for i in range(3)]
+
+    og_operators = [OGMagneticOperation(
+                        point_operation=op.point_operation,
+                        translation=tuple(t * s for t, s in zip(op.translation, scale)),
+                        time_reversal=op.time_reversal)
+                    for op in bns_operators]
+
+    lattice = [tuple(Fraction(scale[i]) if i == j else Fraction(0) for j in range(3)) for i in range(3)]
+
+    closed = og_closure(og_operators[1:], lattice)
+
+    assert len(closed) == len(bns_operators)
+    assert any(op.time_reversal == -1 and op.translation[axis] == 1 for op in closed)
+
+    # Back in the BNS cell, it is the same group
+    assert {(op.point_operation, tuple(t / s % 1 for t, s in zip(op.translation, scale)), op.time_reversal)
+            for op in closed} == \
+           {(op.point_operation, op.translation, op.time_reversal) for op in bns_operators}
+
+
+@pytest.mark.parametrize("number", [20, 23, 24])
+def test_lattice_expansion(number):
+    """ Representatives modulo a centering, combined with the centering, give back all the operations """
+
+    group = spglib_group(number)
+    centered = centered_group(number, (Fraction(1, 2), Fraction(1, 2), Fraction(0)))
+
+    assert len(centered.bns.operators) < len(group.bns.operators)
+    assert closure_by_lattice(centered.bns.operators, centered.bns.lattice_vectors) == closure(group.bns.operators)
+
+    # Arrays are in the same order, with the identity first
+    rotations, translations, time_reversals = centered.bns.cell_operator_arrays
+    assert np.allclose(rotations[0], np.eye(3)) and np.allclose(translations[0], 0) and time_reversals[0] == 1
+
+    for operation, rotation, translation in zip(centered.bns.cell_operators, rotations, translations):
+        assert np.allclose(operation.point_operation, rotation)
+        assert np.allclose([float(t) for t in operation.translation], translation)
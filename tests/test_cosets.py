@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from conftest import spglib_group
+from msg.grouptheory.cosets import (
+    operator_indices, generated_subgroup, is_subgroup, left_cosets, right_cosets, left_coset_representatives,
+    double_cosets, conjugacy_classes, normalizer, is_normal)
+
+
+@pytest.fixture(scope="module")
+def cubic():
+    """ Pm-3m1' (221.93), 96 elements, and its subgroup Pm-3m (221.92) """
+
+    group = spglib_group(1595)
+    subgroup = operator_indices(
+        group.bns.operators, group.bns.lattice_vectors, spglib_group(1594).bns.operators)
+
+    return group.multiplication_table, subgroup
+
+
+def product(table, g, h):
+    """ g h, h first """
+    return table.compose(h, g)
+
+
+def test_operator_indices(cubic):
+    table, subgroup = cubic
+
+    assert len(subgroup) == 48
+    assert is_subgroup(table, subgroup)
+    assert not is_subgroup(table, subgroup[1:])
+
+    with pytest.raises(ValueError):
+        operator_indices(spglib_group(1594).bns.operators, [], spglib_group(1595).bns.operators)
+
+
+def test_generated_subgroup(cubic):
+    table, subgroup = cubic
+
+    assert np.array_equal(generated_subgroup(table, subgroup), np.sort(subgroup))
+    assert np.array_equal(generated_subgroup(table, []), [table.identity])
+
+
+def check_partition(table, classes):
+    everything = np.sort(np.concatenate(classes))
+    assert np.array_equal(everything, np.arange(len(table)))
+
+
+def test_cosets(cubic):
+    table, _ = cubic
+
+    # A subgroup that isn't normal, generated by one element of order 2 or 4
+    element = next(g for g in range(len(table)) if g != table.identity and not is_normal(table, [table.identity, g]))
+    subgroup = generated_subgroup(table, [element])
+
+    for cosets, side in [(left_cosets(table, subgroup), "left"), (right_cosets(table, subgroup), "right")]:
+        check_partition(table, cosets)
+        assert np.array_equal(cosets[0], subgroup)
+
+        for coset in cosets:
+            g = coset[0]
+            expected = {product(table, g, h) if side == "left" else product(table, h, g) for h in subgroup}
+            assert set(coset.tolist()) == expected
+
+    assert ({frozenset(coset.tolist()) for coset in left_cosets(table, subgroup)} !=
+            {frozenset(coset.tolist()) for coset in right_cosets(table, subgroup)})
+
+    representatives = left_coset_representatives(table, subgroup)
+    assert representatives[0] == table.identity
+    assert len(representatives) * len(subgroup) == len(table)
+
+
+def test_double_cosets(cubic):
+    table, subgroup = cubic
+
+    element = next(g for g in range(len(table)) if g != table.identity and not is_normal(table, [table.identity, g]))
+    small = generated_subgroup(table, [element])
+
+    cosets = double_cosets(table, small, small)
+    check_partition(table, cosets)
+
+    for coset in cosets:
+        g = coset[0]
+        expected = {product(table, product(table, h, g), k) for h in small for k in small}
+        assert set(coset.tolist()) == expected
+
+    # With a normal subgroup they are just cosets
+    assert len(double_cosets(table, subgroup, subgroup)) == 2
+
+
+def test_conjugacy_classes(cubic):
+    table, subgroup = cubic
+
+    classes = conjugacy_classes(table)
+    check_partition(table, classes)
+
+    # m-3m has 10 classes, and the grey group has twice as many
+    assert len(classes) == 20
+    assert np.array_equal(classes[0], [table.identity])
+
+    for members in classes:
+        g = members[0]
+        expected = {product(table, product(table, x, g), table.inverse(x)) for x in range(len(table))}
+        assert set(members.tolist()) == expected
+
+
+def test_normalizer(cubic):
+    table, subgroup = cubic
+
+    assert is_normal(table, subgroup)
+
+    element = next(g for g in range(len(table)) if g != table.identity and not is_normal(table, [table.identity, g]))
+    small = generated_subgroup(table, [element])
+
+    normalising = normalizer(table, small)
+    assert set(small.tolist()) <= set(normalising.tolist())
+
+    for g in range(len(table)):
+        conjugated = {product(table, product(table, g, h), table.inverse(g)) for h in small}
+        assert (conjugated == set(small.tolist())) == (g in normalising)
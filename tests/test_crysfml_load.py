@@ -0,0 +1,102 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# The build scripts are run from their own directory, and import each other as top level modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "builddatabase"))
+
+import crysfml_load
+from build_database import convert_groups
+from crysfml_load import iter_crysfml_groups, load_point_operations
+
+SAMPLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "crysfml_sample.txt")
+
+
+@pytest.fixture
+def eager(monkeypatch):
+    """ The module level dictionaries, read from the sample file (P1, P11', P_S1 and Pmmm from the crysFML data) """
+
+    monkeypatch.setattr(crysfml_load, "DEFAULT_PATH", SAMPLE_PATH)
+    monkeypatch.setattr(crysfml_load, "_loaded", {})
+
+    return crysfml_load
+
+
+def assert_records_equal(record, expected):
+    assert record.keys() == expected.keys()
+
+    for key, value in expected.items():
+        if key.endswith("wyckoff"):
+            assert record[key] == value
+        else:
+            assert np.array_equal(record[key], value), key
+
+
+def test_point_operations():
+    point_operations, hexagonal_point_operations = load_point_operations(SAMPLE_PATH)
+
+    assert len(point_operations) == 48
+    assert len(hexagonal_point_operations) == 24
+
+    assert point_operations[2].name == "2x"
+    assert np.array_equal(point_operations[2].matrix, np.diag([1, -1, -1]))
+    assert np.array_equal(hexagonal_point_operations[3].matrix, [[0, -1, 0], [1, -1, 0], [0, 0, 1]])
+
+
+def test_iterator_matches_eager(eager):
+    # Read up to the end of the file, without being told how many groups there are
+    records = list(iter_crysfml_groups(SAMPLE_PATH))
+
+    assert [group_id for group_id, _ in records] == [0, 1, 2, 3]
+    assert eager.space_groups.keys() == dict(records).keys()
+
+    for group_id, record in records:
+        assert_records_equal(record, eager.space_groups[group_id])
+
+    assert eager.point_operations.keys() == load_point_operations(SAMPLE_PATH)[0].keys()
+
+
+def test_records():
+    records = dict(iter_crysfml_groups(SAMPLE_PATH))
+
+    assert records[0]["uni_label"] == "P1.1"
+    assert records[0]["bns_point_op"] == [1]
+    assert records[0]["bns_wyckoff"][0]["positions_coordinate_matrix"] == [np.eye(3, dtype=int).tolist()]
+    assert records[0]["bns_wyckoff"][0]["positions_moment_matrix"] == [np.eye(3, dtype=int).tolist()]
+
+    assert records[1]["bns_time_inversion"] == [1, -1]
+    assert records[1]["bns_wyckoff"][0]["positions_moment_matrix"] == [np.zeros((3, 3), dtype=int).tolist()]
+
+    # Type 4, with the BNS to OG transformation and the OG setting
+    assert records[2]["group_type"] == 4
+    assert np.array_equal(records[2]["bnsog_point_op"], np.diag([1, 1, 2]))
+    assert records[2]["bns_translation_num"][1] == [0, 0, 1]
+    assert records[2]["bns_translation_denom"][1] == 2
+    assert records[2]["og_lattice_vectors_num"][2] == [0, 0, 2]
+    assert records[2]["og_wyckoff"][0]["multiplicity"] == 2
+
+    # Operations over more than one line
+    assert records[3]["bns_point_op"] == [1, 2, 3, 4, 25, 26, 27, 28]
+
+    sites = {site["label"]: site for site in records[3]["bns_wyckoff"]}
+    assert len(sites) == 27
+
+    # 4x is x,1/2,z, with moments along y
+    assert sites["x"]["positions_num"][0] == [0, 1, 0]
+    assert sites["x"]["positions_denom"][0] == 2
+    assert sites["x"]["positions_coordinate_matrix"][0] == [[1, 0, 0], [0, 0, 0], [0, 0, 1]]
+    assert sites["x"]["positions_moment_matrix"][0] == [[0, 0, 0], [0, 1, 0], [0, 0, 0]]
+
+    # The first six coefficients are still in the xyz and mag fields
+    assert sites["x"]["positions_xyz"][0] == [1, 0, 0]
+    assert sites["x"]["positions_mag"][0] == [0, 0, 0]
+
+
+def test_sample_converts():
+    point_operations, _ = load_point_operations(SAMPLE_PATH)
+    groups = convert_groups(dict(iter_crysfml_groups(SAMPLE_PATH)), point_operations)
+
+    assert [group.group_type for group in groups] == [1, 2, 4, 1]
+    assert len(groups[3].bns.operators) == 8
@@ -0,0 +1,53 @@
+from fractions import Fraction
+
+import pytest
+
+from conftest import spglib_group, centered_group
+from msg.grouptheory.closures import closure
+from msg.grouptheory.fingerprints import FingerprintIndex, operator_fingerprint, group_fingerprint
+from msg.operations import MagneticOperation
+
+
+def test_order_independent(sample_groups):
+    for group in sample_groups:
+        operators = group.bns.operators
+        assert operator_fingerprint(operators) == operator_fingerprint(operators[::-1])
+
+
+def test_generators_give_same_fingerprint():
+    """ A couple of operators of P4_2/mnm' should be enough to generate it """
+
+    group = spglib_group(1000)
+    operators = group.bns.operators
+
+    generators = []
+    for op in operators:
+        generators.append(op)
+        if len(closure(generators)) == len(operators):
+            break
+
+    assert len(generators) < len(operators)
+    assert operator_fingerprint(generators) == group_fingerprint(group)
+
+
+@pytest.mark.parametrize("number", [20, 23, 24])
+def test_centering(number):
+    """ Representatives modulo a centering plus the centering should be the same as all the operators """
+    centering = (Fraction(1, 2), Fraction(1, 2), Fraction(0))
+    assert group_fingerprint(centered_group(number, centering)) == group_fingerprint(spglib_group(number))
+
+
+def test_identify(sample_groups):
+    index = FingerprintIndex.from_groups(sample_groups)
+
+    assert len(index) == len(sample_groups)
+    for group in sample_groups:
+        assert index.identify(group.bns.operators[::-1]) == [group.number]
+
+    # P-1' isn't one of them
+    inversion = MagneticOperation(
+        point_operation=((-1, 0, 0), (0, -1, 0), (0, 0, -1)),
+        translation=(Fraction(0), Fraction(0), Fraction(0)),
+        time_reversal=-1)
+
+    assert index.identify([inversion]) == []
@@ -3,7 +3,8 @@ import pytest
 
 import spglib
 
-from msgmodels.operations import MagneticOperation
+from msg.operations import MagneticOperation, FastMagneticOperation, \
+    integer_operation_arrays, compose_integer_arrays, integer_operation_keys, operations_from_integer_arrays
 
 r_z = np.array([
     [0, -1,  0],
@@ -197,3 +198,111 @@ def test_generator_not_equal(index_1: int, delta: int):
 
     assert generator_1 is not generator_2
     assert generator_1 != generator_2
+
+
+@pytest.mark.parametrize("g", random_generator_info)
+def test_generator_hash(g):
+    """ Equal generators should hash the same, and be deduplicated by sets """
+    generator_1 = MagneticOperation.from_numpy(*g, name="Generator 1")
+    generator_2 = MagneticOperation.from_numpy(*g, name="Generator 2")
+
+    assert hash(generator_1) == hash(generator_2)
+    assert len({generator_1, generator_2}) == 1
+
+
+@pytest.mark.parametrize("number", [5, 100, 1651])
+def test_packed_keys(number):
+    """ Operations from the database can all be packed, and the keys are distinct """
+    data = spglib.get_magnetic_symmetry_from_database(number)
+    operations = [MagneticOperation.from_numpy(rotation.T, translation, -1 if time_reversal else 1)
+                  for rotation, translation, time_reversal
+                  in zip(data["rotations"], data["translations"], data["time_reversals"])]
+
+    keys = [op.key for op in operations]
+
+    assert all(isinstance(key, int) for key in keys)
+    assert len(set(keys)) == len(keys)
+    assert len(set(operations)) == len(operations)
+
+
+def test_key_follows_assignment():
+    """ The cached key is worked out again when a field it depends on is changed """
+    operation = MagneticOperation.from_numpy(np.eye(3), np.zeros(3), 1)
+    original_key = operation.key
+
+    operation.time_reversal = -1
+    assert operation.key != original_key
+    assert operation == MagneticOperation.from_numpy(np.eye(3), np.zeros(3), -1)
+
+    operation.name = "renamed"
+    assert operation.key == MagneticOperation.from_numpy(np.eye(3), np.zeros(3), -1).key
+
+
+@pytest.mark.parametrize("seed", [1234, 76423, 2093478, 7973634])
+def test_sorting_is_order_independent(seed):
+    operations = [MagneticOperation.from_numpy(*g) for g in random_generator_info]
+    operations += [MagneticOperation.from_numpy(g[0], np.zeros(3)+0.5, g[2]) for g in random_generator_info]
+
+    rng = np.random.default_rng(seed)
+    shuffled = [operations[i] for i in rng.permutation(len(operations))]
+
+    assert sorted(shuffled) == sorted(operations)
+
+
+def spglib_operations(number: int) -> list[MagneticOperation]:
+    data = spglib.get_magnetic_symmetry_from_database(number)
+    return [MagneticOperation.from_numpy(rotation.T, translation, -1 if time_reversal else 1)
+            for rotation, translation, time_reversal
+            in zip(data["rotations"], data["translations"], data["time_reversals"])]
+
+
+@pytest.mark.parametrize("number", [5, 100, 1000, 1651])
+def test_fast_operation_composition(number):
+    """ FastMagneticOperation should compose the same way as MagneticOperation """
+    operations = spglib_operations(number)[:20]
+
+    for a in operations:
+        for b in operations:
+            fast = FastMagneticOperation.from_model(a).and_then(FastMagneticOperation.from_model(b))
+            assert fast.to_model() == a.and_then(b)
+            assert fast.key == a.and_then(b).key
+
+
+@pytest.mark.parametrize("points", test_points)
+def test_fast_operation_call(points):
+    for op in spglib_operations(1651)[::7]:
+        fast = FastMagneticOperation.from_model(op)
+        assert np.all(np.abs(fast(points) - op(points)) < 1e-10)
+        assert fast.text_form == op.text_form
+
+
+def test_fast_operation_immutable():
+    fast = FastMagneticOperation.from_numpy(np.eye(3), np.zeros(3), 1)
+    with pytest.raises(AttributeError):
+        fast.time_reversal = -1
+
+
+@pytest.mark.parametrize("g", random_generator_info)
+def test_fast_operation_needs_standard_translation(g):
+    """ Arbitrary translations can't be represented """
+    with pytest.raises(ValueError):
+        FastMagneticOperation.from_model(MagneticOperation.from_numpy(*g))
+
+
+@pytest.mark.parametrize("number", [5, 100, 1000, 1651])
+def test_batch_composition(number):
+    """ Composing stacks of operations should be the same as composing pairs """
+    operations = spglib_operations(number)
+    first = operations[:10]
+    second = operations[5:]
+
+    composed = compose_integer_arrays(integer_operation_arrays(first), integer_operation_arrays(second))
+    keys = integer_operation_keys(*composed)
+    products = operations_from_integer_arrays(*composed)
+
+    assert keys.shape == (len(first), len(second))
+
+    for i, a in enumerate(first):
+        for j, b in enumerate(second):
+            assert products[i*len(second) + j] == a.and_then(b)
+            assert keys[i, j] == a.and_then(b).key
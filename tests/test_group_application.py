@@ -0,0 +1,99 @@
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from conftest import centered_group
+from msg.groups import BNSOGTransform
+from msg.operations import OGMagneticOperation, OG_TRANSLATION_PERIOD
+from msg.wyckoff import axial_matrices
+
+rng = np.random.default_rng(1651)
+test_points = [rng.random((n, 6)) for n in (1, 7, 50)]
+
+
+@pytest.mark.parametrize("points", test_points)
+def test_apply_matches_operators(points, sample_groups):
+    """ Applying the whole group at once should be the same as applying operators one at a time """
+    for group in sample_groups:
+        applied = group.bns.apply(points)
+
+        assert applied.shape == (len(group.bns.cell_operators), points.shape[0], 6)
+
+        for op, result in zip(group.bns.cell_operators, applied):
+            assert np.all(np.abs(op(points) - result) < 1e-10)
+
+
+@pytest.mark.parametrize("points", test_points)
+def test_apply_centered_group(points):
+    """ The database only has representatives modulo the centering, apply uses every operation in the cell """
+
+    group = centered_group(20, (Fraction(1, 2), Fraction(1, 2), Fraction(0))).bns
+    applied = group.apply(points)
+
+    assert len(group.cell_operators) == 2 * len(group.operators)
+    assert applied.shape == (len(group.cell_operators), points.shape[0], 6)
+
+    for op, result in zip(group.cell_operators, applied):
+        assert np.all(np.abs(op(points) - result) < 1e-10)
+
+
+@pytest.mark.parametrize("points", test_points)
+def test_og_apply(points, sample_groups):
+    """ OG positions are wrapped modulo OG_TRANSLATION_PERIOD, and for these groups, whose OG operators are
+    the BNS ones, agree with the BNS ones modulo 1 """
+    for group in sample_groups:
+        applied = group.og.apply(points)
+        rotations, translations, time_reversals = group.og.cell_operator_arrays
+
+        assert applied.shape == (rotations.shape[0], points.shape[0], 6)
+        assert np.all((applied[:, :, :3] >= 0) & (applied[:, :, :3] < OG_TRANSLATION_PERIOD))
+
+        expected = (np.einsum("gab,nb->gna", rotations, points[:, :3]) + translations[:, np.newaxis, :]) % 1
+        assert np.allclose(applied[:, :, :3] % 1, expected)
+        assert np.allclose(applied[:, :, 3:],
+                           np.einsum("gab,nb->gna", axial_matrices(rotations, time_reversals), points[:, 3:]))
+
+        bns_rotations, _, _ = group.bns.cell_operator_arrays
+        assert rotations.shape[0] == 8 * bns_rotations.shape[0] # Translations by 1 are different operations
+
+
+def unique_atoms(points_and_momenta: np.ndarray) -> np.ndarray:
+    """ Atoms with different positions modulo 1 or different moments """
+    positions = np.round(points_and_momenta[:, :3] % 1, 6) % 1
+    return np.unique(np.concatenate((positions, np.round(points_and_momenta[:, 3:], 6)), axis=1), axis=0)
+
+
+def test_og_orbit_matches_bns():
+    """ C2.1'_a[P2] (5.17), whose OG setting is P_C2, with the BNS cell doubled along a and b. The OG operators
+    are only representatives modulo the C centering of the OG lattice, but should give the same atoms as BNS """
+
+    group = centered_group(24, (Fraction(1, 2), Fraction(1, 2), Fraction(0)))
+    transform = BNSOGTransform(rotation=((2, 0, 0), (0, 2, 0), (0, 0, 1)), origin=(0, 0, 0))
+
+    og = group.og.model_copy(update={
+        "operators": transform.bns_to_og.transform_operations(group.bns.operators, OGMagneticOperation),
+        "lattice_vectors": [tuple(sum(a * b for a, b in zip(row, vector)) for row in transform.rotation)
+                            for vector in group.bns.lattice_vectors]})
+
+    group = group.model_copy(update={"og": og, "bns_og_transform": transform})
+
+    # Two (1, 1, 0) OG translations, without time reversal, aren't among the OG operators
+    assert len(og.cell_operator_arrays[0]) == 4 * len(og.operators)
+
+    points = test_points[1]
+    bns_orbit = group.bns.apply(points).reshape(-1, 6)
+    og_orbit = group.og_to_bns_points(og.apply(group.bns_to_og_points(points)).reshape(-1, 6))
+
+    assert np.allclose(unique_atoms(og_orbit), unique_atoms(bns_orbit))
+
+def test_apply_moments_are_axial(sample_groups):
+    """ Moments transform with det(R) * time_reversal * R, as in orbits and the moment projectors """
+
+    points = test_points[1]
+    for group in sample_groups:
+        rotations, _, time_reversals = group.bns.cell_operator_arrays
+
+        expected = np.einsum("gab,nb->gna", axial_matrices(rotations, time_reversals), points[:, 3:])
+
+        assert np.allclose(group.bns.apply(points)[:, :, 3:], expected)
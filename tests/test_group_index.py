@@ -0,0 +1,70 @@
+import pytest
+
+from msg.group_index import GroupIndex, normalise_symbol
+
+symbols = ["P1", "P_S 1", "P2_1", "P2_1'", "P_a 2_1", "P_A 2_1", "Pnma", "Pn'ma"]
+
+
+@pytest.fixture
+def index() -> GroupIndex:
+    index = GroupIndex()
+    for i, symbol in enumerate(symbols):
+        index.add(i, i + 1, (i // 2 + 1, i), (i // 2 + 1, 1, i), (symbol, f"{i + 1}"))
+
+    return index
+
+
+def test_normalise():
+    assert normalise_symbol("P 2_1 ' ") == "P21'"
+    assert normalise_symbol("P_a 2_1") != normalise_symbol("P_A 2_1")
+
+
+def test_numbers(index):
+    assert index.by_number[3] == 2
+    assert index.by_bns_number[(2, 2)] == 2
+    assert index.by_og_number[(2, 1, 2)] == 2
+    assert index.by_parent_number[2] == [2, 3]
+
+
+def test_symbols(index):
+    for i, symbol in enumerate(symbols):
+        assert index.lookup_symbol(symbol) == i
+        assert index.lookup_symbol(symbol.replace("_", "").replace(" ", "")) == i
+        assert index.lookup_symbol(" ".join(symbol)) == i
+
+    assert index.lookup_symbol("P6") is None
+
+
+def test_prefix_search(index):
+    assert index.prefix_search("P2") == [2, 3]
+    assert index.prefix_search("P_a") == [4]
+    assert index.prefix_search("Q") == []
+
+
+def test_fuzzy_search(index):
+    assert index.fuzzy_search("Pmna")[0] == 6
+    assert 7 in index.fuzzy_search("Pnm'a")
+
+
+def test_search_order(index):
+    # Exact first, then the other prefix matches
+    assert index.search("P2_1")[:2] == [2, 3]
+    assert index.search("Pnma", limit=1) == [6]
+
+
+def test_prefix_search_limit(index):
+    assert index.prefix_search("P", limit=3) == index.prefix_search("P")[:3]
+    assert len(index.prefix_search("P", limit=3)) == 3
+
+
+def test_search_skips_fuzzy_when_enough(index, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("fuzzy search shouldn't be needed")
+
+    monkeypatch.setattr(index, "fuzzy_search", fail)
+
+    assert index.search("P2_1", limit=2) == [2, 3]
+    assert index.search("P", limit=4) == index.prefix_search("P")[:4]
+
+    with pytest.raises(AssertionError):
+        index.search("Pmna")
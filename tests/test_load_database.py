@@ -0,0 +1,56 @@
+import sys
+
+import pytest
+
+from msg.groups import MagneticSpaceGroupData
+from msg.load_database import LazyGroupList
+
+
+@pytest.fixture
+def lazy_groups(tmp_path, monkeypatch, sample_groups) -> LazyGroupList:
+    """ A lazy list reading a small database written to a temporary package """
+
+    package = tmp_path / "fake_msg_data"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    (package / "database.json").write_text(
+        MagneticSpaceGroupData(groups=sample_groups).model_dump_json(indent=2))
+
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield LazyGroupList(package="fake_msg_data")
+    sys.modules.pop("fake_msg_data", None)
+
+
+def test_nothing_validated_until_accessed(lazy_groups, sample_groups):
+    assert len(lazy_groups) == len(sample_groups)
+    assert lazy_groups.loaded_count == 0
+
+    group = lazy_groups[2]
+
+    assert group == sample_groups[2]
+    assert lazy_groups.loaded_count == 1
+    assert lazy_groups[2] is group
+
+
+def test_lookups(lazy_groups, sample_groups):
+    for group in sample_groups:
+        assert lazy_groups.by_number(group.number) == group
+        assert lazy_groups.by_bns_number(group.bns.number) == group
+        assert lazy_groups.by_symbol(group.og.symbol) == group
+
+    assert lazy_groups.loaded_count == len(sample_groups)
+
+
+def test_slicing(lazy_groups, sample_groups):
+    assert lazy_groups[1:3] == sample_groups[1:3]
+    assert lazy_groups[-1] == sample_groups[-1]
+
+
+def test_index_lookups(lazy_groups, sample_groups):
+    for group in sample_groups:
+        assert lazy_groups.by_og_number(group.og.number) == group
+        assert group in lazy_groups.by_parent_number(group.bns.number[0])
+        assert lazy_groups.search(group.bns.symbol)[0] == group
+
+    with pytest.raises(KeyError):
+        lazy_groups.by_symbol("not a symbol")
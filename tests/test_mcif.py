@@ -0,0 +1,177 @@
+import io
+
+import numpy as np
+import pytest
+
+from conftest import spglib_group
+from msg.datamodel.mcif import iter_mcif_blocks, read_mcif_symmetry, read_many_mcif_symmetries, read_mcif_directory
+from msg.datamodel.parse_operator import format_coordinate_triplet
+from msg.grouptheory import fingerprints
+from msg.operations import operation_arrays
+
+
+def mcif_text(group, block: str = "test") -> str:
+    """ mCIF with the operators of a group in the current style of loop, and some other things to skip """
+
+    operations = "\n".join(f"{i + 1} '{operation.text_form}'" for i, operation in enumerate(group.bns.operators))
+
+    return f"""
+data_{block}
+_cell_length_a 5.0  # A comment
+_journal_name_full
+;
+Some text, with _a_tag and loop_ in it
+;
+loop_
+_space_group_symop_magn_operation.id
+_space_group_symop_magn_operation.xyz
+{operations}
+
+loop_
+_space_group_symop_magn_centering.id
+_space_group_symop_magn_centering.xyz
+1 x,y,z,+1
+
+loop_
+_atom_site_label
+_atom_site_fract_x
+Fe1 0.1
+"""
+
+
+def sorted_rows(array: np.ndarray) -> np.ndarray:
+    array = np.round(array, 6)
+    return array[np.lexsort(array.T[::-1])]
+
+
+def flattened(rotations, translations, time_reversals) -> np.ndarray:
+    return np.concatenate((rotations.reshape(-1, 9), translations % 1, time_reversals[:, np.newaxis]), axis=1)
+
+
+def test_read_symmetry():
+    group = spglib_group(539)
+
+    symmetries = read_mcif_symmetry(io.StringIO(mcif_text(group)))
+
+    assert len(symmetries) == 1
+    symmetry = symmetries[0]
+
+    assert symmetry.block == "test"
+    assert symmetry.centerings == ("x,y,z,+1",)
+    assert len(symmetry) == len(group.bns.operators)
+
+    assert np.allclose(
+        sorted_rows(flattened(symmetry.rotations, symmetry.translations, symmetry.time_reversals)),
+        sorted_rows(flattened(*operation_arrays(group.bns.operators))))
+
+
+def test_centerings_and_old_tags():
+    text = """
+data_first
+loop_
+_space_group_symop.magn_operation_xyz
+x,y,z,+1
+-x,-y,-z,-1
+loop_
+_space_group_symop.magn_centering_xyz
+x,y,z,+1
+x+1/2,y+1/2,z,-1
+data_no_symmetry
+_cell_length_a 5.0
+data_second
+loop_
+_space_group_symop_magn_operation.xyz
+x,y,z,+1
+"""
+
+    blocks = list(iter_mcif_blocks(io.StringIO(text)))
+    assert [block for block, _, _ in blocks] == ["first", "second"]
+
+    symmetry = read_mcif_symmetry(io.StringIO(text))[0]
+
+    assert len(symmetry) == 4
+    assert np.allclose(symmetry.time_reversals, [1, -1, -1, 1])
+    assert np.allclose(symmetry.translations[3], (0.5, 0.5, 0))
+    assert np.allclose(symmetry.rotations[3], -np.eye(3))
+
+
+def test_many_files(tmp_path, sample_groups):
+    for group in sample_groups:
+        (tmp_path / f"{group.number:04d}.mcif").write_text(mcif_text(group, str(group.number)))
+
+    (tmp_path / "bad.mcif").write_text("data_bad\nloop_\n_space_group_symop_magn_operation.xyz\nx,y,w\n")
+
+    with pytest.raises(ValueError):
+        read_mcif_directory(str(tmp_path), jobs=1)
+
+    serial = read_mcif_directory(str(tmp_path), jobs=1, skip_errors=True)
+    parallel = read_mcif_directory(str(tmp_path), jobs=2, skip_errors=True)
+
+    assert [symmetry.block for symmetry in serial] == [str(group.number) for group in sample_groups]
+    assert [symmetry.block for symmetry in parallel] == [symmetry.block for symmetry in serial]
+
+    for a, b in zip(serial, parallel):
+        assert np.array_equal(a.rotations, b.rotations)
+        assert np.array_equal(a.translations, b.translations)
+
+
+def test_identify(tmp_path, sample_groups, monkeypatch):
+    monkeypatch.setattr(fingerprints, "_database_index", fingerprints.FingerprintIndex.from_groups(sample_groups))
+
+    filenames = []
+    for group in sample_groups:
+        filename = tmp_path / f"{group.number}.mcif"
+        filename.write_text(mcif_text(group))
+        filenames.append(str(filename))
+
+    symmetries = read_many_mcif_symmetries(filenames, identify=True)
+
+    assert [symmetry.group_numbers for symmetry in symmetries] == [(group.number,) for group in sample_groups]
+
+
+def test_identify_unreduced_translations(sample_groups, monkeypatch):
+    """ Translations outside [0, 1) in the file, e.g. x+1,y,z-1/2, are the same operations """
+
+    monkeypatch.setattr(fingerprints, "_database_index", fingerprints.FingerprintIndex.from_groups(sample_groups))
+
+    group = sample_groups[3]
+    shift = (1, 0, -1)
+    operations = [format_coordinate_triplet(operation.point_operation,
+                                            [t + s for t, s in zip(operation.translation, shift)])
+                  + f",{operation.time_reversal:+d}"
+                  for operation in group.bns.operators]
+
+    assert any("+1" in operation.split(",")[0] for operation in operations)
+
+    text = "data_shifted\nloop_\n_space_group_symop_magn_operation.xyz\n" + "\n".join(operations) + "\n"
+    symmetry, = read_mcif_symmetry(io.StringIO(text), identify=True)
+
+    assert symmetry.group_numbers == (group.number,)
+
+
+def test_identify_not_found(sample_groups, monkeypatch):
+    monkeypatch.setattr(fingerprints, "_database_index", fingerprints.FingerprintIndex.from_groups(sample_groups[1:]))
+
+    text = mcif_text(sample_groups[0])
+    assert read_mcif_symmetry(io.StringIO(text), identify=True)[0].group_numbers == ()
+
+    # Translations that no group has
+    text = "data_fifths\nloop_\n_space_group_symop_magn_operation.xyz\nx,y,z,+1\nx+1/5,y,z,+1\n"
+    assert read_mcif_symmetry(io.StringIO(text), identify=True)[0].group_numbers == ()
+
+
+def test_signed_factors():
+    text = """
+data_signed
+loop_
+_space_group_symop_magn_operation.xyz
+x,y,z,+1
+x*-1,y*-1,z/-2*-2+1/2,-1
+"""
+
+    symmetry = read_mcif_symmetry(io.StringIO(text))[0]
+
+    assert len(symmetry) == 2
+    assert np.allclose(symmetry.rotations[1], -np.diag([1, 1, -1]))
+    assert np.allclose(symmetry.translations[1], (0, 0, 0.5))
+    assert np.allclose(symmetry.time_reversals, [1, -1])
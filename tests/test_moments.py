@@ -0,0 +1,84 @@
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from conftest import spglib_group
+from msg.datamodel.parse_operator import parse_coordinate_triplet
+from test_wyckoff import site, with_sites
+
+
+@pytest.fixture(scope="module")
+def pnma():
+    """ Pnma (62.441) with its 4a and 4c sites """
+    return with_sites(spglib_group(539), [
+        site("a", 4, (0, 0, 0)),
+        site("c", 4, (0, Fraction(1, 4), 0))])
+
+
+def test_site_projectors(pnma):
+    projectors = pnma.bns.moment_projectors
+
+    assert projectors["c"].shape == (4, 3, 3)
+    assert np.allclose(projectors["c"][0], np.diag([0, 1, 0]))
+
+    for name in ("a", "c"):
+        # Projectors are idempotent
+        assert np.allclose(projectors[name] @ projectors[name], projectors[name])
+
+
+def test_constrain_moments(pnma):
+    expansion = pnma.bns.wyckoff_expansions["c"]
+    moments = np.array([[1.0, 2.0, 3.0]] * 4)
+
+    constrained = pnma.bns.constrain_moments(["c"] * 4, moments, copies=range(4))
+    assert np.allclose(constrained, (0, 2, 0))
+
+    # Symmetry equivalent moments are already allowed
+    allowed = expansion.moments([[1.0, 2.0, 3.0]])[0]
+    assert np.allclose(pnma.bns.constrain_moments(["c"] * 4, allowed, copies=range(4)), allowed)
+
+
+def test_projectors_from_points(pnma):
+    """ Projectors worked out from positions agree with the ones for the sites """
+
+    expansion = pnma.bns.wyckoff_expansions["c"]
+    points = expansion.positions([[0.1, 0.3, 0.2]])[0]
+    moments = np.random.default_rng(0).normal(size=(4, 3))
+
+    assert np.allclose(
+        pnma.bns.constrain_moments_at(points, moments),
+        pnma.bns.constrain_moments(["c"] * 4, moments, copies=range(4)))
+
+
+def test_grey_group_has_no_moments():
+    grey = spglib_group(2) # P1.1'
+    assert grey.group_type == 2
+
+    moments = grey.bns.constrain_moments_at([[0.1, 0.2, 0.3]], [[1.0, 2.0, 3.0]])
+    assert np.allclose(moments, 0)
+
+
+def test_projectors_match_moment_triplets():
+    """ In Pm'm'm', the sites (x,0,0), (0,y,0) and (0,0,z) all start at (0,0,0) but allow different moments """
+
+    moments = {"i": "mx,0,0", "k": "0,my,0", "m": "0,0,mz"}
+    group = with_sites(spglib_group(351), [
+        site("i", 2, (0, 0, 0), "x,0,0", moments["i"]),
+        site("k", 2, (0, 0, 0), "0,y,0", moments["k"]),
+        site("m", 2, (0, 0, 0), "0,0,z", moments["m"])])
+
+    projectors = group.bns.moment_projectors
+
+    for name, triplet in moments.items():
+        rows, _ = parse_coordinate_triplet(triplet)
+        form = np.array(rows, dtype=float)
+
+        # The projector at the site itself is onto the moments in its triplet
+        assert np.allclose(projectors[name][0], form)
+
+        # and at the other copy, onto the moments of the triplet transformed by the coset operation
+        expansion = group.bns.wyckoff_expansions[name]
+        copy_form = expansion.moment_matrices[1] @ form
+        assert np.allclose(projectors[name][1] @ copy_form, copy_form)
+        assert np.linalg.matrix_rank(projectors[name][1]) == 1
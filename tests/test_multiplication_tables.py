@@ -0,0 +1,78 @@
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from msg.grouptheory import multiplication_tables
+from msg.grouptheory.multiplication_tables import build_multiplication_table, centering_translations, \
+    write_multiplication_tables, precomputed_multiplication_table, table_key
+
+from conftest import centered_group
+
+c_centering = (Fraction(1, 2), Fraction(1, 2), Fraction(0))
+
+
+def test_centering_translations():
+    vectors = [(Fraction(1), Fraction(0), Fraction(0)), (Fraction(1, 2), Fraction(1, 2), Fraction(1, 2))]
+    assert centering_translations(vectors) == [
+        (Fraction(0), Fraction(0), Fraction(0)),
+        (Fraction(1, 2), Fraction(1, 2), Fraction(1, 2))]
+
+
+def check_table(operators, lattice_vectors, table):
+    centerings = centering_translations(lattice_vectors)
+
+    for i, first in enumerate(operators):
+        for j, second in enumerate(operators):
+            product = first.and_then(second)
+            expected = operators[table.compose(i, j)]
+
+            assert product.point_operation == expected.point_operation
+            assert product.time_reversal == expected.time_reversal
+            assert any(tuple((t + c) % 1 for t, c in zip(expected.translation, centering)) == product.translation
+                       for centering in centerings)
+
+    for i in range(len(operators)):
+        assert table.compose(i, table.inverse(i)) == table.identity
+        assert table.compose(table.identity, i) == i
+
+
+def test_sample_group_tables(sample_groups):
+    for group in sample_groups[:4]:
+        check_table(group.bns.operators, group.bns.lattice_vectors, group.multiplication_table)
+
+
+@pytest.mark.parametrize("number", [20, 23, 24])
+def test_centered_group_tables(number):
+    group = centered_group(number, c_centering)
+
+    assert len(group.multiplication_table) * 2 == len(group.og.operators)
+    check_table(group.bns.operators, group.bns.lattice_vectors, group.multiplication_table)
+
+
+def test_not_closed(sample_groups):
+    operators = sample_groups[1].bns.operators[1:]
+    with pytest.raises(ValueError):
+        build_multiplication_table(operators, sample_groups[1].bns.lattice_vectors)
+
+
+def test_precomputed_tables(tmp_path, sample_groups, monkeypatch):
+    filename = str(tmp_path / "multiplication_tables.bin")
+    write_multiplication_tables(sample_groups, filename)
+
+    monkeypatch.setattr(multiplication_tables, "_precomputed", None)
+    monkeypatch.setattr(multiplication_tables, "_precomputed_index", {})
+    multiplication_tables._load_precomputed(filename)
+
+    for group in sample_groups:
+        table = precomputed_multiplication_table(group.bns.operators, group.bns.lattice_vectors)
+        check_table(group.bns.operators, group.bns.lattice_vectors, table)
+
+    # Same group, operators in another order, so the stored table doesn't apply
+    group = sample_groups[1]
+    reordered = group.bns.model_copy(update={"operators": group.bns.operators[::-1]})
+
+    assert table_key(reordered.operators, reordered.lattice_vectors) != \
+        table_key(group.bns.operators, group.bns.lattice_vectors)
+    assert precomputed_multiplication_table(reordered.operators, reordered.lattice_vectors) is None
+    check_table(reordered.operators, reordered.lattice_vectors, reordered.multiplication_table)
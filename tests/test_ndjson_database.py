@@ -0,0 +1,37 @@
+import io
+
+from msg.ndjson_database import write_ndjson, iter_ndjson, iter_ndjson_raw
+
+
+def test_round_trip(tmp_path, sample_groups):
+    filename = str(tmp_path / "database.ndjson")
+
+    assert write_ndjson(iter(sample_groups), filename) == len(sample_groups)
+    assert list(iter_ndjson(filename)) == sample_groups
+
+    with open(filename) as file:
+        assert [raw["number"] for raw in iter_ndjson_raw(file)] == [group.number for group in sample_groups]
+
+
+def test_one_group_per_line(tmp_path, sample_groups):
+    filename = str(tmp_path / "database.ndjson")
+    write_ndjson(sample_groups, filename)
+
+    with open(filename) as file:
+        lines = file.readlines()
+
+    assert len(lines) == len(sample_groups)
+
+    # Any subset of lines is a valid file
+    assert list(iter_ndjson(io.StringIO(lines[3] + "\n" + lines[1]))) == [sample_groups[3], sample_groups[1]]
+
+
+def test_streaming(sample_groups):
+    """ Groups come out before the rest of the file is read """
+
+    text = "".join(group.model_dump_json() + "\n" for group in sample_groups)
+    file = io.StringIO(text)
+
+    groups = iter_ndjson(file)
+    assert next(groups) == sample_groups[0]
+    assert file.tell() < len(text)
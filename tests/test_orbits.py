@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from conftest import spglib_group
+from msg.orbits import merge_periodic_points, MIN_TOLERANCE
+from msg.wyckoff import cell_operation_arrays, axial_matrices
+
+
+@pytest.fixture(scope="module")
+def pnma():
+    return spglib_group(539).bns
+
+
+def test_merge_across_cell_boundary():
+    positions = np.array([
+        [1e-9, 0.5, 0.5],
+        [0.99999999, 0.5, 0.5],
+        [0.3, 0.3, 0.3],
+        [0.3, 0.3 + 1e-6, 1.3],
+        [0.6, 0.3, 0.3]])
+
+    assert list(merge_periodic_points(positions)) == [0, 0, 1, 1, 2]
+
+
+def test_merge_independent_of_order():
+    """ The last two points are close, but in different cells, and further from the first point in their cell """
+
+    positions = np.array([[0.1000001, 0.5, 0.5], [0.1000999, 0.5, 0.5], [0.1001002, 0.5, 0.5]])
+
+    assert list(merge_periodic_points(positions)) == [0, 0, 0]
+    assert list(merge_periodic_points(positions[::-1])) == [0, 0, 0]
+    assert list(merge_periodic_points(positions[1:])) == [0, 0]
+
+    # The same across the cell boundary
+    positions = np.array([[0.5, 0.5, 0.99990001], [0.5, 0.5, 0.99999], [0.5, 0.5, 0.000005]])
+    assert list(merge_periodic_points(positions)) == [0, 0, 0]
+
+
+def test_merge_many():
+    """ Lots of points, each repeated with small errors and lattice shifts """
+
+    rng = np.random.default_rng(19)
+    points = rng.random((500, 3))
+    copies = np.concatenate([points + rng.integers(-2, 3, size=points.shape) + rng.normal(scale=1e-7, size=points.shape)
+                             for _ in range(4)])
+
+    labels = merge_periodic_points(copies)
+
+    assert np.array_equal(labels, np.tile(np.arange(500), 4))
+
+
+def test_merge_tolerance():
+    positions = np.array([[0.1, 0.2, 0.3], [0.1, 0.2, 0.3 + 2e-6]])
+
+    assert list(merge_periodic_points(positions, tolerance=MIN_TOLERANCE)) == [0, 1]
+
+    # Smaller tolerances would need more cells than fit in the keys
+    for tolerance in (1e-7, 0.0, -1e-4, float("nan")):
+        with pytest.raises(ValueError):
+            merge_periodic_points(positions, tolerance=tolerance)
+
+
+def test_orbit_multiplicities(pnma):
+    atoms = np.array([
+        [0.1, 0.25, 0.2, 0, 0, 0],  # 4c
+        [0.1, 0.3, 0.2, 0, 0, 0],   # 8d
+        [0.0, 0.0, 0.0, 0, 0, 0],   # 4a
+        [0.6, 0.25, 0.3, 0, 0, 0]]) # Same as the first one, moved by (x+1/2, -y+1/2, -z+1/2)
+
+    result = pnma.orbit(atoms)
+
+    assert list(result.multiplicities) == [4, 8, 4, 4]
+    assert len(result) == 16
+    assert set(result.site_indices[:, 3]) == set(result.site_indices[:, 0])
+    assert not np.any(result.atom_indices == 3)
+
+
+def test_orbit_mapping(pnma):
+    rotations, translations, time_reversals = cell_operation_arrays(pnma)
+    atoms = np.random.default_rng(20).random((5, 6))
+
+    result = pnma.orbit(atoms)
+
+    for position, atom, operation in zip(result.positions, result.atom_indices, result.operation_indices):
+        moved = rotations[operation] @ atoms[atom, :3] + translations[operation]
+        assert np.allclose(moved % 1, position)
+
+    # Every copy is on the site it is mapped to
+    for g in range(rotations.shape[0]):
+        moved = (atoms[:, :3] @ rotations[g].T + translations[g]) % 1
+        differences = moved - result.positions[result.site_indices[g]]
+        assert np.allclose(differences, np.rint(differences))
+
+    # General positions have nothing to average
+    axial = axial_matrices(rotations, time_reversals)
+    for position_moment, atom, operation in zip(result.moments, result.atom_indices, result.operation_indices):
+        assert np.allclose(position_moment, axial[operation] @ atoms[atom, 3:])
+
+
+def test_orbit_moments_averaged(pnma):
+    """ On the mirror plane of 4c only moments along y survive """
+
+    result = pnma.orbit([[0.1, 0.25, 0.2, 1.0, 2.0, 3.0]])
+
+    assert np.allclose(result.moments[0], (0, 2, 0))
+    assert np.allclose(np.abs(result.moments), [[0, 2, 0]] * 4)
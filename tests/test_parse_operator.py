@@ -0,0 +1,76 @@
+from fractions import Fraction
+
+import pytest
+
+from msg.datamodel.parse_operator import (
+    parse_linear_form, parse_space_group_operator, parse_space_group_operator_og,
+    parse_many, parse_one_line_generators, parse_coordinate_triplet)
+from msg.operations import MagneticOperation, OGMagneticOperation
+
+
+@pytest.mark.parametrize("component, row, constant", [
+    ("x", (1, 0, 0), 0),
+    ("-z + 1 / 2", (0, 0, -1), Fraction(1, 2)),
+    ("-y+x", (1, -1, 0), 0),
+    ("z+2/3", (0, 0, 1), Fraction(2, 3)),
+    ("1/3 - z", (0, 0, -1), Fraction(1, 3)),
+    ("0.5+x", (1, 0, 0), Fraction(1, 2)),
+    ("--x", (1, 0, 0), 0),
+    ("2*x-1/4", (2, 0, 0), Fraction(-1, 4)),
+    ("x+y-x", (0, 1, 0), 0),
+    ("x*-1", (-1, 0, 0), 0),
+    ("-1/-2+y", (0, 1, 0), Fraction(1, 2)),
+    (" y ", (0, 1, 0), 0)])
+def test_linear_form(component, row, constant):
+    assert parse_linear_form(component) == (row, constant)
+
+
+@pytest.mark.parametrize("component", ["", "x*y", "1/x", "x/2", "2x", "x+", "x**2", "a", "(x)"])
+def test_invalid_linear_form(component):
+    with pytest.raises(ValueError):
+        parse_linear_form(component)
+
+
+def test_operators():
+    operation = parse_space_group_operator("-x, y, -z + 1 / 2")
+
+    assert operation.point_operation == ((-1, 0, 0), (0, 1, 0), (0, 0, -1))
+    assert operation.translation == (0, 0, Fraction(1, 2))
+    assert operation.time_reversal == 1
+
+    assert parse_space_group_operator("x+1/2,y+1/2,z,-1").time_reversal == -1
+    assert parse_space_group_operator("x,y,z", time_reversed=True).time_reversal == -1
+    assert isinstance(parse_space_group_operator_og("x,y,z+1"), OGMagneticOperation)
+
+    with pytest.raises(ValueError):
+        parse_space_group_operator("x,y")
+
+    with pytest.raises(ValueError):
+        parse_space_group_operator("x,y,z,1", time_reversed=False)
+
+
+def test_parse_many():
+    strings = ["x,y,z", "-x,-y,z+1/2,-1", "x,y,z"]
+
+    operations = parse_many(strings)
+
+    assert operations == [parse_space_group_operator(string) for string in strings]
+    assert all(isinstance(operation, MagneticOperation) for operation in operations)
+
+    og_operations = parse_many(strings, operation_type=OGMagneticOperation)
+    assert all(isinstance(operation, OGMagneticOperation) for operation in og_operations)
+
+
+def test_one_line_generators():
+    operations = parse_one_line_generators("(-x,y,-z+1/2);(x,-y,z+1/2)';(x+1/2,y+1/2,z)")
+
+    assert [operation.time_reversal for operation in operations] == [1, -1, 1]
+    assert operations[2].translation == (Fraction(1, 2), Fraction(1, 2), 0)
+
+
+def test_coordinate_triplets():
+    assert parse_coordinate_triplet("x,-x,1/2") == (((1, 0, 0), (-1, 0, 0), (0, 0, 0)), (0, 0, Fraction(1, 2)))
+    assert parse_coordinate_triplet("mx, 2mx, mz") == (((1, 0, 0), (2, 0, 0), (0, 0, 1)), (0, 0, 0))
+
+    with pytest.raises(ValueError):
+        parse_coordinate_triplet("x,y")
@@ -0,0 +1,170 @@
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from msg.groups import BNSOGTransform, WyckoffSite, WyckoffPosition
+from msg.operations import MagneticOperation, OGMagneticOperation, operation_arrays, apply_operation_arrays
+from msg.setting_transforms import SettingTransform
+
+# Doubles the cell and shifts the origin, this works for groups of any crystal system
+transform = BNSOGTransform(
+    rotation=((2, 0, 0), (0, 2, 0), (0, 0, 2)),
+    origin=(Fraction(1, 4), Fraction(0), Fraction(1, 2)))
+
+rng = np.random.default_rng(10)
+
+
+def test_inverse():
+    forward = transform.bns_to_og
+    backward = transform.og_to_bns
+
+    assert backward.inverse == forward
+    assert np.allclose(backward.matrix_array @ forward.matrix_array, np.eye(3))
+
+    points = rng.random((20, 6))
+    assert np.allclose(backward.transform_points(forward.transform_points(points)), points)
+
+
+def test_cached():
+    assert transform.bns_to_og is transform.bns_to_og
+    assert transform.og_to_bns is transform.og_to_bns
+
+
+def test_operations_commute_with_transform(sample_groups):
+    """ Transforming then applying the transformed operations is the same as applying then transforming """
+
+    points = rng.random((10, 6))
+    forward = transform.bns_to_og
+
+    for group in sample_groups:
+        og_operators = forward.transform_operations(group.bns.operators, OGMagneticOperation)
+
+        for bns_op, og_op in zip(group.bns.operators, og_operators):
+            assert isinstance(og_op, OGMagneticOperation)
+
+            expected = forward.transform_points(bns_op(points))
+            actual = apply_operation_arrays(*operation_arrays([og_op]), forward.transform_points(points), wrap=False)[0]
+
+            # BNS positions are wrapped, so they can differ by a lattice vector
+            difference = actual[:, :3] - expected[:, :3]
+            assert np.allclose(difference, np.rint(difference))
+            assert np.allclose(actual[:, 3:], expected[:, 3:])
+
+
+def test_operations_round_trip(sample_groups):
+    for group in sample_groups:
+        round_trip = transform.og_to_bns.transform_operations(
+            transform.bns_to_og.transform_operations(group.bns.operators, OGMagneticOperation))
+
+        assert all(type(op) is MagneticOperation for op in round_trip)
+        assert round_trip == group.bns.operators
+
+
+def test_group_methods(sample_groups):
+    """ Sample groups have the identity transform """
+
+    points = rng.random((5, 6))
+    for group in sample_groups:
+        assert np.allclose(group.bns_to_og_points(points), points)
+        assert np.allclose(group.og_to_bns_points(points), points)
+        assert group.og_to_bns_operators(group.bns_to_og_operators(group.bns.operators)) == group.bns.operators
+
+
+def test_incompatible_operation():
+    skew = SettingTransform.from_matrix(((1, 1, 0), (0, 1, 0), (0, 0, 1)), (0, 0, 0))
+    four_fold = MagneticOperation(
+        point_operation=((0, -1, 0), (1, 0, 0), (0, 0, 1)),
+        translation=(Fraction(0), Fraction(0), Fraction(0)),
+        time_reversal=1)
+
+    with pytest.raises(ValueError):
+        skew.transform_operations([four_fold])
+
+
+def test_wyckoff_site():
+    site = WyckoffSite(
+        name="a", unicode_name="a", latex_name="a", multiplicity=1,
+        positions=[WyckoffPosition(position=(Fraction(1, 2), Fraction(0), Fraction(1, 4)), xyz=(1, 0, 0), mag=(0, 0, 0),
+                                   coordinates="x+1/2,0,1/4", moment="mx,my,0")])
+
+    transformed = transform.bns_to_og.transform_wyckoff_site(site)
+
+    assert transformed.positions[0].position == (Fraction(1, 4), Fraction(0), Fraction(0))
+    assert transformed.positions[0].coordinates == "x+1/4,0,0"
+    assert transformed.positions[0].moment == "mx,my,0"
+    assert site.positions[0].position == (Fraction(1, 2), Fraction(0), Fraction(1, 4))
+
+    # Triplets where the parameters mix
+    skew = SettingTransform.from_matrix(((1, 1, 0), (0, 1, 0), (0, 0, 1)), (0, 0, Fraction(1, 2)))
+    transformed = skew.transform_wyckoff_site(site)
+
+    assert transformed.positions[0].coordinates == "x-y+1/2,0,3/4"
+    assert transformed.positions[0].moment == "mx,my,0"
+    assert skew.inverse.transform_wyckoff_site(transformed) == site
+
+
+def test_wyckoff_site_encoded_fields():
+    """ The xyz and mag fields are the coefficients of x and y in the coordinates, which are rewritten along with
+    them for new axes, and don't change after an origin shift """
+
+    site = WyckoffSite(
+        name="x", unicode_name="x", latex_name="x", multiplicity=2,
+        positions=[WyckoffPosition(position=(Fraction(0), Fraction(1, 2), Fraction(0)), xyz=(1, 0, 0), mag=(0, 0, 0),
+                                   coordinates="x,1/2,z", moment="0,my,0")])
+
+    shift = SettingTransform.from_matrix(np.eye(3, dtype=int), (Fraction(1, 2), 0, 0))
+    assert shift.transform_wyckoff_site(site).positions[0].xyz == (1, 0, 0)
+
+    # x and y swapped, keeping the handedness
+    swap = SettingTransform.from_matrix(((0, 1, 0), (1, 0, 0), (0, 0, -1)), (0, 0, 0))
+    transformed = swap.transform_wyckoff_site(site).positions[0]
+
+    assert transformed.coordinates == "1/2,y,z"
+    assert transformed.moment == "mx,0,0"
+    assert (transformed.xyz, transformed.mag) == ((0, 0, 0), (0, 1, 0))
+
+    # Without the coordinates, there isn't enough to rewrite them
+    without_coordinates = site.model_copy(update={
+        "positions": [site.positions[0].model_copy(update={"coordinates": None})]})
+
+    assert shift.transform_wyckoff_site(without_coordinates).positions[0].xyz == (1, 0, 0)
+    with pytest.raises(ValueError):
+        swap.transform_wyckoff_site(without_coordinates)
+
+
+def test_exact_translations():
+    """ Translations are worked out with Fractions, so any origin shift comes through exactly """
+
+    shift = SettingTransform.from_matrix(np.eye(3, dtype=int), (Fraction(1, 1234567), 0, 0))
+    inversion = MagneticOperation(
+        point_operation=((-1, 0, 0), (0, -1, 0), (0, 0, -1)),
+        translation=(Fraction(0), Fraction(0), Fraction(0)),
+        time_reversal=1)
+
+    transformed, = shift.transform_operations([inversion])
+    assert transformed.translation == (Fraction(2, 1234567), 0, 0)
+
+
+def test_non_orthogonal_round_trip():
+    """ Positions and moments come back after a transform that changes lengths and angles,
+    and moment lengths, measured with the metric of each cell, don't change
+    """
+
+    skew = SettingTransform.from_matrix(((1, 1, 0), (0, 1, 0), (0, 0, 2)), (Fraction(1, 3), 0, Fraction(1, 4)))
+    metric = np.array([[1.0, 0.2, 0.0], [0.2, 1.5, 0.1], [0.0, 0.1, 2.0]])
+
+    points = rng.random((20, 6))
+    transformed = skew.transform_points(points)
+
+    assert np.allclose(skew.inverse.transform_points(transformed), points)
+
+    new_metric = skew.transform_metric(metric)
+    assert np.allclose(np.einsum("na,ab,nb->n", transformed[:, 3:], new_metric, transformed[:, 3:]),
+                       np.einsum("na,ab,nb->n", points[:, 3:], metric, points[:, 3:]))
+
+    # Distances too
+    difference = points[1:, :3] - points[:-1, :3]
+    new_difference = transformed[1:, :3] - transformed[:-1, :3]
+    assert np.allclose(np.einsum("na,ab,nb->n", new_difference, new_metric, new_difference),
+                       np.einsum("na,ab,nb->n", difference, metric, difference))
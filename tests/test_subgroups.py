@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from conftest import spglib_group
+from msg.groups import Group
+from msg.grouptheory.subgroups import SubgroupGraph, SubgroupRelation, subgroup_relations
+from msg.setting_transforms import SettingTransform
+
+
+@pytest.fixture(scope="module")
+def graph():
+    """ Pnma (62.441) and some of its relatives in the same setting:
+    Pnma1' (62.442), P-1 (2.4), P-11' (2.5), P1 (1.1) and P11' (1.2)
+    """
+    return SubgroupGraph.from_groups([spglib_group(number) for number in (539, 540, 4, 5, 1, 2)])
+
+
+def is_identity(transform: SettingTransform) -> bool:
+    return np.allclose(transform.matrix_array, np.eye(3)) and not any(transform.origin)
+
+
+def assert_contained(relation: SubgroupRelation, group: Group, subgroup: Group):
+    """ The subgroup's operations, transformed into the group's setting, are some of the group's """
+
+    transformed = relation.transform.transform_operations(subgroup.bns.cell_operators)
+    assert set(transformed) <= set(group.bns.cell_operators)
+
+
+def test_subgroups(graph):
+    assert {relation.subgroup for relation in graph.subgroups(540)} == {539, 4, 5, 1, 2}
+    assert {relation.subgroup for relation in graph.subgroups(539)} == {4, 1}
+    assert graph.subgroups(1) == []
+
+    by_subgroup = {relation.subgroup: relation for relation in graph.subgroups(539)}
+    assert by_subgroup[1].index == 8
+    assert by_subgroup[4].index == 4
+    assert all(relation.translationengleiche for relation in by_subgroup.values())
+
+
+def test_other_settings():
+    """ P2_1/c (14.75) is a subgroup of Pnma, as P2_1/a along c """
+
+    pnma, p21c = spglib_group(539), spglib_group(82)
+    relations = subgroup_relations([pnma, p21c])
+
+    assert [(relation.group, relation.subgroup, relation.index) for relation in relations] == [(539, 82, 2)]
+    assert not is_identity(relations[0].transform)
+
+    # The unique axis, b, along c
+    assert np.allclose(relations[0].transform.matrix_array @ (0, 1, 0), (0, 0, 1))
+    assert_contained(relations[0], pnma, p21c)
+
+
+def test_conjugates():
+    """ Pmmm1' (47.250) has Pm'mm (47.251) as Pm'mm, Pmm'm and Pmmm', and P2/m (10.42) along a, b and c """
+
+    groups = {number: spglib_group(number) for number in (348, 349, 49)}
+    relations = subgroup_relations(list(groups.values()))
+
+    for subgroup, axis in [(349, 0), (49, 1)]:
+        found = [relation for relation in relations if relation.group == 348 and relation.subgroup == subgroup]
+
+        # The special axis of each of them, in the setting of Pmmm1'
+        axes = {int(np.argmax(np.abs(relation.transform.matrix_array[:, axis]))) for relation in found}
+        assert len(found) == 3 and axes == {0, 1, 2}
+
+        assert sum(is_identity(relation.transform) for relation in found) == 1
+        for relation in found:
+            assert relation.index == len(groups[348].bns.cell_operators) // len(groups[subgroup].bns.cell_operators)
+            assert_contained(relation, groups[348], groups[subgroup])
+
+
+def test_supergroups(graph):
+    assert {relation.group for relation in graph.supergroups(1)} == {539, 540, 4, 5, 2}
+
+    for relation in graph.relations:
+        assert relation in graph.supergroups(relation.subgroup)
+
+
+def test_arrays_round_trip(graph):
+    copy = SubgroupGraph.from_arrays(graph.arrays())
+    assert copy.relations == graph.relations
+
+
+def test_klassengleiche():
+    """ C222_1 (20.31) has P222_1 (17.7) as a subgroup with the centering removed """
+
+    relations = subgroup_relations([spglib_group(number) for number in (129, 105)])
+
+    assert len(relations) == 1
+    assert relations[0].group == 129 and relations[0].subgroup == 105
+    assert relations[0].index == 2
+    assert not relations[0].translationengleiche
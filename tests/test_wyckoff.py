@@ -0,0 +1,244 @@
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from conftest import spglib_group
+from msg.groups import WyckoffSite, WyckoffPosition, Group
+
+
+def site(name: str, multiplicity: int, position, coordinates: str | None = None, moment: str | None = None) -> WyckoffSite:
+    """ Site with just the first position filled in, which is all the expansion uses """
+    return WyckoffSite(
+        name=name, unicode_name=name, latex_name=name, multiplicity=multiplicity,
+        positions=[WyckoffPosition(
+            position=tuple(Fraction(x) for x in position), xyz=(0, 0, 0), mag=(0, 0, 0),
+            coordinates=coordinates, moment=moment)])
+
+
+def with_sites(group: Group, sites: list[WyckoffSite]) -> Group:
+    bns = group.bns.model_copy(update={"wyckoff_sites": sites})
+    return group.model_copy(update={"bns": bns})
+
+
+@pytest.fixture(scope="module")
+def pnma() -> Group:
+    """ Pnma (62.441) with its 4a, 4c and 8d sites """
+    return with_sites(spglib_group(539), [
+        site("a", 4, (0, 0, 0)),
+        site("c", 4, (0, Fraction(1, 4), 0)),
+        site("d", 8, (0, 0, 0))])
+
+
+@pytest.fixture(scope="module")
+def pmmm() -> Group:
+    """ Pmmm (47.249), where the 2i, 2k and 2m sites all start at (0,0,0) """
+    return with_sites(spglib_group(347), [
+        site("i", 2, (0, 0, 0), "x,0,0", "0,0,0"),
+        site("k", 2, (0, 0, 0), "0,y,0", "0,0,0"),
+        site("m", 2, (0, 0, 0), "0,0,z", "0,0,0")])
+
+
+def sorted_rows(array: np.ndarray) -> np.ndarray:
+    return array[np.lexsort(np.round(array, 6).T[::-1])]
+
+
+def test_positions(pnma):
+    expansions = pnma.bns.wyckoff_expansions
+    free_parameters = np.array([[0.1, 0.3, 0.2]])
+
+    for name, expected in [("a", (0, 0, 0)), ("c", (0.1, 0.25, 0.2)), ("d", (0.1, 0.3, 0.2))]:
+        positions = expansions[name].positions(free_parameters)[0]
+
+        assert positions.shape == (expansions[name].multiplicity, 3)
+        assert np.allclose(positions[0], expected)
+
+        # The orbit of the first position is the same set
+        orbit = pnma.bns.apply(np.concatenate((positions[:1], np.zeros((1, 3))), axis=1))[:, 0, :3]
+        orbit = np.unique(np.round(orbit, 6) % 1, axis=0)
+
+        assert np.allclose(sorted_rows(positions), sorted_rows(orbit))
+
+
+def test_moments(pnma):
+    """ A mirror perpendicular to y only allows moments along y """
+
+    moments = pnma.bns.wyckoff_expansions["c"].moments([[1.0, 2.0, 3.0]])[0]
+
+    assert np.allclose(moments[0], (0, 2, 0))
+    assert np.allclose(np.abs(moments), (0, 2, 0))
+
+    # Inversion at 4a doesn't change axial vectors
+    assert np.allclose(pnma.bns.wyckoff_expansions["a"].moments([[1.0, 2.0, 3.0]])[0][0], (1, 2, 3))
+
+
+def test_expand_many(pnma):
+    names = ["d", "c", "a", "c"]
+    free_parameters = np.random.default_rng(17).random((4, 3))
+    moments = np.random.default_rng(18).random((4, 3))
+
+    positions, expanded_moments, atoms = pnma.bns.expand_wyckoff_sites(names, free_parameters, moments)
+
+    assert positions.shape == (20, 3)
+    assert list(np.bincount(atoms)) == [8, 4, 4, 4]
+
+    for i, name in enumerate(names):
+        expansion = pnma.bns.wyckoff_expansions[name]
+        assert np.allclose(positions[atoms == i], expansion.positions(free_parameters[i])[0])
+        assert np.allclose(expanded_moments[atoms == i], expansion.moments(moments[i])[0])
+
+
+def test_inconsistent_site(pnma):
+    bad = with_sites(pnma, [site("x", 2, (0, Fraction(1, 4), 0))])
+    with pytest.raises(ValueError):
+        _ = bad.bns.wyckoff_expansions["x"]
+
+
+def test_inconsistent_site_doesnt_affect_others(pnma):
+    """ Expansions are only worked out for the sites that are used """
+
+    group = with_sites(pnma, pnma.bns.wyckoff_sites + [site("x", 2, (0, Fraction(1, 4), 0))])
+
+    positions, _, _ = group.bns.expand_wyckoff_sites(["c"], [[0.1, 0.3, 0.2]])
+    assert positions.shape == (4, 3)
+
+    moments = group.bns.constrain_moments(["a"], [[1.0, 2.0, 3.0]])
+    assert np.allclose(moments, [[1, 2, 3]])
+
+    # Atoms on the bad site just don't get assigned to it
+    assignment = group.bns.assign_wyckoff_sites([[0.1, 0.25, 0.2], [0.1, 0.3, 0.2]])
+    assert list(assignment.site_names) == ["c", "d"]
+
+    with pytest.raises(ValueError):
+        _ = group.bns.moment_projectors["x"]
+
+
+def test_general_position(sample_groups):
+    """ Every group has a general position, with an orbit of all its operations (ignoring time reversal) """
+
+    for group in sample_groups:
+        n = len({(op.point_operation, op.translation) for op in group.bns.operators})
+        group = with_sites(group, [site("g", n, (0, 0, 0))])
+
+        expansion = group.bns.wyckoff_expansions["g"]
+        point = np.array([0.11, 0.23, 0.37])
+
+        assert len(expansion) == n
+        assert np.allclose(expansion.positions(point)[0, 0], point)
+
+        # Grey groups contain 1', so don't allow any moment
+        assert np.allclose(expansion.moment_matrices[0], np.eye(3) if group.group_type != 2 else 0)
+
+
+def test_assign_sites(pnma):
+    rng = np.random.default_rng(18)
+    expansions = pnma.bns.wyckoff_expansions
+
+    names = rng.choice(["a", "c", "d"], size=200)
+    free_parameters = rng.random((200, 3))
+    copies = rng.integers(0, 4, size=200)
+
+    points = np.array([expansions[name].positions(p)[0, copy] for name, p, copy in zip(names, free_parameters, copies)])
+    points += rng.normal(scale=1e-6, size=points.shape)
+
+    assignment = pnma.bns.assign_wyckoff_sites(points)
+
+    assert list(assignment.site_names) == list(names)
+    assert list(assignment.multiplicities) == [expansions[name].multiplicity for name in names]
+
+    for name, point, parameters in zip(names, points, assignment.free_parameters):
+        # The free parameters describe an atom at the site, which is equivalent to this one
+        assert np.allclose(expansions[name].projection_matrix @ parameters + expansions[name].projection_offset,
+                           parameters, atol=1e-4)
+
+        differences = expansions[name].positions(parameters)[0] - point
+        assert np.any(np.all(np.abs(differences - np.rint(differences)) < 1e-4, axis=1))
+
+
+def test_assign_chunks(pnma):
+    points = np.random.default_rng(19).random((50, 3))
+
+    whole = pnma.bns.assign_wyckoff_sites(points)
+    chunked = pnma.bns.wyckoff_classifier.classify(points, chunk_size=7)
+
+    assert np.all(whole.site_names == "d")
+    assert np.array_equal(whole.site_indices, chunked.site_indices)
+    assert np.allclose(whole.free_parameters, chunked.free_parameters)
+
+
+def test_unknown_site(pnma):
+    """ Atoms on sites that aren't in the list """
+
+    group = with_sites(pnma, [site("c", 4, (0, Fraction(1, 4), 0))])
+    assignment = group.bns.assign_wyckoff_sites([[0.1, 0.2, 0.3], [0.1, 0.25, 0.3]])
+
+    assert list(assignment.site_names) == ["", "c"]
+    assert list(assignment.site_indices) == [-1, 0]
+    assert list(assignment.multiplicities) == [8, 4]
+    assert np.all(np.isnan(assignment.free_parameters[0]))
+
+
+def test_sites_with_the_same_origin(pmmm):
+    """ Sites that only differ by their coordinates are each expanded along their own line """
+
+    expansions = pmmm.bns.wyckoff_expansions
+    free_parameters = [[0.1, 0.2, 0.3]]
+
+    for name, expected in [("i", [(0.1, 0, 0), (0.9, 0, 0)]),
+                           ("k", [(0, 0.2, 0), (0, 0.8, 0)]),
+                           ("m", [(0, 0, 0.3), (0, 0, 0.7)])]:
+
+        assert np.allclose(sorted_rows(expansions[name].positions(free_parameters)[0]), sorted_rows(np.array(expected)))
+
+
+def test_ambiguous_site(pmmm):
+    """ Without its coordinates, there's no telling which of the sites at (0,0,0) is meant """
+
+    ambiguous = with_sites(pmmm, [site("i", 2, (0, 0, 0))])
+    with pytest.raises(ValueError):
+        _ = ambiguous.bns.wyckoff_expansions["i"]
+
+
+def test_assign_sites_with_the_same_origin(pmmm):
+    assignment = pmmm.bns.assign_wyckoff_sites([[0.1, 0, 0], [0, 0.2, 0], [0, 0, 0.3]])
+
+    assert list(assignment.site_names) == ["i", "k", "m"]
+    assert np.allclose(assignment.free_parameters[[0, 1, 2], [0, 1, 2]], [0.1, 0.2, 0.3])
+
+
+def test_conventional_free_parameters():
+    """ The free parameters of a site given by its coordinates are the x, y and z in them """
+
+    p4mmm = with_sites(spglib_group(999), [site("j", 4, (0, 0, 0), "x,-x,0", "0,0,0")])
+    expansion = p4mmm.bns.wyckoff_expansions["j"]
+
+    assert np.allclose(expansion.positions([[0.1, 0.7, 0.3]])[0, 0], (0.1, 0.9, 0))
+    assert expansion.multiplicity == len(expansion) == 4
+
+    assignment = p4mmm.bns.assign_wyckoff_sites([[0.2, 0.8, 0], [0.8, 0.8, 0]])
+
+    assert list(assignment.site_names) == ["j", "j"]
+    assert np.isclose(assignment.free_parameters[0, 0], 0.2)
+
+    for point, parameters in zip([[0.2, 0.8, 0], [0.8, 0.8, 0]], assignment.free_parameters):
+        orbit = expansion.positions(parameters)[0]
+        assert np.any(np.all(np.abs(orbit - point) < 1e-6, axis=1))
+
+
+def test_assign_non_orthogonal_site():
+    """ A site whose free parameter isn't one of its coordinates, (2x,x,0) in P6/mmm """
+
+    p6mmm = with_sites(spglib_group(1463), [site("l", 6, (0, 0, 0), "2x,x,0", "0,0,0")])
+
+    assignment = p6mmm.bns.assign_wyckoff_sites([[0.4, 0.2, 0], [0.3, 0.3, 0]])
+
+    assert list(assignment.site_names) == ["l", ""]
+    assert np.isclose(assignment.free_parameters[0, 0], 0.2)
+
+
+def test_inconsistent_coordinates(pmmm):
+    with pytest.raises(ValueError):
+        _ = with_sites(pmmm, [site("i", 4, (0, 0, 0), "x,0,0")]).bns.wyckoff_expansions["i"]
+
+    with pytest.raises(ValueError):
+        _ = with_sites(pmmm, [site("i", 2, (0, 0, 0), "x,0,0", "mx,0,0")]).bns.wyckoff_expansions["i"]
@@ -1,7 +1,6 @@
 import numpy as np
 
 from msg import spacegroups
-from msg.grouptheory.closures import closure
 
 from builddatabase.spglib_data import spglib_generators
 
@@ -15,8 +14,7 @@ for i in range(1, 1652):
 fml_sizes = []
 for group in spacegroups:
     print(group.bns.number)
-    closed = closure(group.bns.operators)
-    fml_sizes.append(len(closed))
+    fml_sizes.append(len(group.bns.cell_operators))
 
 bin_edges = np.linspace(-0.5, 400.5, 401)
 